@@ -0,0 +1,79 @@
+/// Times the Buhlmann model updates in isolation. Prints a json object of measurements keyed by
+/// case name, in the format read by `python -m bench --cpp`.
+
+#include <bungee/Mix.h>
+#include <bungee/deco/buhlmann/Buhlmann.h>
+
+#include <fmt/format.h>
+
+#include <algorithm>
+#include <chrono>
+#include <limits>
+#include <string>
+#include <vector>
+
+using namespace bungee;
+using namespace bungee::deco::buhlmann;
+using namespace units::literals;
+
+namespace {
+
+/// \return best time per call [s] over several repeats of `count` calls.
+template <typename Func> double Measure(Func func, const size_t count)
+{
+    double best = std::numeric_limits<double>::infinity();
+    for (size_t repeat = 0; repeat < 5; ++repeat) {
+        const auto start = std::chrono::steady_clock::now();
+        for (size_t i = 0; i < count; ++i) {
+            func();
+        }
+        const std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+        best = std::min(best, elapsed.count() / count);
+    }
+    return best;
+}
+
+} // namespace
+
+int main()
+{
+    Buhlmann model(Buhlmann::Params{.water = Water::FRESH, .model = Model::ZHL_16A});
+    model.equilibrium(SURFACE_AIR_PP);
+    const Mix mix(0.32);
+    const Mix::PartialPressure shallow = mix.partialPressure(10_m, Water::FRESH);
+    const Mix::PartialPressure deep = mix.partialPressure(30_m, Water::FRESH);
+    Eigen::VectorXd out(model.compartmentCount());
+    // accumulate something from every call so the optimizer can't drop them
+    double sink = 0;
+
+    const size_t count = 1000000;
+    std::vector<std::pair<std::string, double>> results = {
+        {"buhlmann/constant_update",
+         Measure([&]() { model.constantPressureUpdate(deep, 1_s); }, count)},
+        {"buhlmann/variable_update",
+         Measure([&]() { model.variablePressureUpdate(deep, shallow, 1_s); }, count)},
+        {"buhlmann/ceiling", Measure([&]() { sink += model.ceiling(0.8)(); }, count)},
+        {"buhlmann/gradients",
+         Measure(
+             [&]() {
+                 model.gradientsAtDepth(20_m, out);
+                 sink += out[0];
+             },
+             count)},
+        {"buhlmann/clear_time",
+         Measure(
+             [&]() {
+                 const auto clearTime = model.clearTime(deep, shallow, 1_min, 10_m, 0.8);
+                 sink += clearTime.has_value() ? clearTime.value()() : 0;
+             },
+             count)},
+    };
+
+    fmt::print("{{");
+    for (size_t i = 0; i < results.size(); ++i) {
+        fmt::print(
+            "{}\"{}\": {{\"time\": {}}}", i ? ", " : "", results[i].first, results[i].second);
+    }
+    fmt::print("}}\n");
+    return sink == 0.123456789;
+}
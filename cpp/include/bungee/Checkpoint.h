@@ -0,0 +1,70 @@
+#pragma once
+
+#include "Plan.h"
+
+#include "custom_units.h"
+#include <Eigen/Dense>
+
+#include <cstdint>
+#include <list>
+#include <mutex>
+#include <optional>
+#include <unordered_map>
+#include <vector>
+
+namespace bungee {
+
+/// Tissue state at a point in a plan's profile, enough to pick the simulation back up from there
+/// instead of from the start of the dive.
+struct Checkpoint {
+    /// Hash of everything that determines the tissue state at the point, see `PrefixHashes`.
+    uint64_t hash;
+    /// Time of the point.
+    Time time;
+    /// Inert gas pressure of each compartment [bar], for `Buhlmann::setCompartmentPressures`.
+    Eigen::VectorXd pressures;
+};
+
+/// \brief Hash the tissue state at each point of a plan without simulating it. The state at a point
+/// only depends on the water and on the times, depths and mixes of the profile up to that point, so
+/// two plans that agree on those up to a point hash the same there, no matter what comes after or
+/// what tanks and SCR they use.
+///
+/// \return One hash per profile point.
+std::vector<uint64_t> PrefixHashes(const Plan& plan);
+
+/// \brief Bounded store of checkpoints by hash, shared between plans that start the same way so
+/// that only the part of a plan that changed needs to be simulated again. Least recently used
+/// entries are evicted first.
+///
+/// Safe to share between threads.
+class CheckpointCache {
+public:
+    CheckpointCache(size_t capacity = 4096);
+
+    /// \brief Find the checkpoint for the latest point of a plan that is in the cache.
+    ///
+    /// \param[in] hashes `PrefixHashes` of the plan.
+    ///
+    /// \return Index of the point and its checkpoint, or nullopt if no point is cached.
+    std::optional<std::pair<size_t, Checkpoint>> find(const std::vector<uint64_t>& hashes);
+
+    /// Insert or replace the checkpoint with the same hash.
+    void insert(const Checkpoint& checkpoint);
+
+    size_t size() const;
+    size_t capacity() const { return _capacity; }
+    size_t hits() const;
+    size_t misses() const;
+
+private:
+    size_t _capacity;
+    mutable std::mutex _mutex;
+    /// most recently used first
+    std::list<Checkpoint> _entries;
+    std::unordered_map<uint64_t, std::list<Checkpoint>::iterator> _index;
+    size_t _hits = 0;
+    size_t _misses = 0;
+};
+
+} // namespace bungee
@@ -43,10 +43,9 @@ static constexpr Depth STOP_DEPTH_INC = units::length::foot_t(10);
 /// each stop time will be rounded up to the nearest STOP_TIME_INC.
 static constexpr auto ASCENT_RATE = units::velocity::feet_per_minute_t(20);
 
-/// When running tissue computations, the model iterates at a smaller increment than the planner.
-/// The model currently uses constant average depth instead of integrating over a variable depth, so
-/// this value should be as small as possible to maintain accuracy. If the planner is slow, increase
-/// this? Must be clean divisor of 60 to get an even number of sampling points each minute.
+/// Sampling increment of the output arrays in `Result`. The model integrates variable depth
+/// segments exactly, so this only sets the resolution of the output, not its accuracy. Must be
+/// clean divisor of 60 to get an even number of sampling points each minute.
 static constexpr Time MODEL_TIME_INC = units::time::second_t(1);
 
 /// Best mix computations will rule out any gas whose PPO2 is greater than this for a needed stop
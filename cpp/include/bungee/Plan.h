@@ -1,5 +1,6 @@
 #pragma once
 
+#include "Constants.h"
 #include "Mix.h"
 #include "Tank.h"
 #include "Water.h"
@@ -80,6 +81,25 @@ public:
 
     void addSegment(Time duration, Depth depth);
 
+    /// \brief Add many segments at once, same as calling setTank (if a tank is given) then
+    /// addSegment for each one.
+    ///
+    /// \param[in] durations Segment durations [min]
+    ///
+    /// \param[in] depths Depth at the end of each segment [m]
+    ///
+    /// \param[in] tanks Tank to switch to at the start of each segment, or an empty string to keep
+    /// the current one. Pass an empty vector to never switch.
+    void addSegments(Eigen::Ref<const Eigen::VectorXd> durations,
+                     Eigen::Ref<const Eigen::VectorXd> depths,
+                     const std::vector<std::string>& tanks = {});
+
+    /// \brief Mark where the final ascent starts, which is where the deco SCR takes over from the
+    /// working SCR. Set by Replan. Plans without a mark use the working SCR throughout.
+    ///
+    /// \param[in] point Index of the profile point the final ascent starts at.
+    void setDecoStart(size_t point);
+
     void finalize();
     bool finalized() const { return _finalized; }
 
@@ -93,19 +113,45 @@ public:
     const TankLoadout& tanks() const { return _tanks; }
     const Profile& profile() const { return _profile; }
 
-    /// FIXME: use Eigen::Map to avoid creating new array, but will have to fix the size of the
-    /// tank member in Point and switch to a different type
+    /// Index of the profile point the final ascent starts at, or profile().size() if there is none.
+    size_t decoStart() const { return _decoStart.value_or(_profile.size()); }
+    /// SCR on the segment [profile()[seg], profile()[seg + 1]].
+    VolumeRate scrOnSegment(size_t seg) const { return seg < decoStart() ? _scr.work : _scr.deco; }
+
+    /// Times of each profile point. Saved on finalize.
+    const Eigen::VectorXd& time() const;
+    /// Depths of each profile point. Saved on finalize.
+    const Eigen::VectorXd& depth() const;
+
+    /*
+     * Tank ids. Tank names are interned to dense integer ids in [0, tankCount()) on finalize, in
+     * the order of the tank loadout, so that hot loops can index arrays instead of looking up
+     * strings. Names should only be needed at the edges of the API.
+     */
+
+    size_t tankCount() const { return _tanks.size(); }
+    /// \return id of the tank with this name. This is a lookup by name, so don't use it in loops.
+    size_t tankId(const std::string& name) const;
+    const std::string& tankName(size_t id) const;
+    const TankConfig& tankConfig(size_t id) const;
+    /// Id of the tank in use beginning at each profile point. Same length as profile().
+    const std::vector<size_t>& tankIds() const;
+
+    /// \brief Find the segment [profile()[i], profile()[i + 1]] in use at `time`. At a point
+    /// shared by two segments, the later one is returned, since that's where the point's tank
+    /// starts being used.
+    ///
+    /// \param[in] hint Segment to start searching from. When looking up increasing times, pass the
+    /// previous return value to walk the profile with a cursor instead of searching it again.
     ///
-    /// FIXME: save these as members on finalize?
-    Eigen::VectorXd time() const;
-    Eigen::VectorXd depth() const;
+    /// \return Index of the segment's first point, in [0, profile().size() - 2].
+    size_t segmentAtTime(Time time, size_t hint = 0) const;
 
-    /// FIXME: this is an O(N) lookup. That's dogshit. Figure out a way to do O(1) lookup. Will
-    /// have to index tanks in an array or something other than using strings.
+    /// \return name of the tank in use at `time`. See segmentAtTime.
     const std::string& getTankAtTime(Time time) const;
 
     /// \return tank name within the tank loadout
-    std::string bestMix(const Depth depth) const;
+    const std::string& bestMix(const Depth depth, Pressure maxPpO2 = MAX_DECO_PPO2) const;
 
 private:
     const Water _water;
@@ -118,8 +164,18 @@ private:
     Profile _profile;
 
     std::optional<std::string> _currentTank;
+    std::optional<size_t> _decoStart;
 
     bool _finalized;
+
+    // saved on finalize
+    Eigen::VectorXd _time;
+    Eigen::VectorXd _depth;
+    /// Tank names and configs by id.
+    std::vector<std::string> _tankNames;
+    std::vector<TankConfig> _tankConfigs;
+    /// Tank id of each profile point.
+    std::vector<size_t> _tankIds;
 };
 
 } // namespace bungee
\ No newline at end of file
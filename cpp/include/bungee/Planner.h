@@ -1,10 +1,82 @@
 #pragma once
 
+#include "Checkpoint.h"
+#include "Constants.h"
 #include "Plan.h"
 
+#include <map>
+#include <string>
+#include <vector>
+
 namespace bungee {
 
+/// Choices `Replan` makes about the ascent it adds. The defaults are the constants it has always
+/// used.
+struct ReplanOptions {
+    /// Highest ppO2 a tank can be breathed at during the ascent. Lowering it moves the switches to
+    /// richer mixes shallower.
+    Pressure maxDecoPpO2 = MAX_DECO_PPO2;
+    /// Spacing of the stops.
+    Depth stopDepthInc = STOP_DEPTH_INC;
+
+    void validate() const;
+};
+
 /// TODO: fix gradient factor setting. be more evolved.
-Plan Replan(const Plan& input);
+///
+/// \param[in] input Finalized plan to add the ascent to.
+///
+/// \param[in,out] cache If given, the tissue state at each point of the user's profile is stored
+/// here, and the simulation of the profile resumes from the latest point already in it.
+///
+/// \param[in] options How to plan the ascent. They don't affect the user's profile, so plans
+/// replanned with different options share checkpoints.
+Plan Replan(const Plan& input, CheckpointCache* cache = nullptr, const ReplanOptions& options = {});
+
+/// Compact description of a replanned dive, small enough to keep around for thousands of variants.
+struct Summary {
+    /// A stop added by the planner during the final ascent.
+    struct Stop {
+        Depth depth;
+        Time duration;
+        /// Tank breathed during the stop.
+        std::string tank;
+    };
+
+    /// Total dive time.
+    Time runtime;
+    /// Stops in the order they are made.
+    std::vector<Stop> stops;
+    /// Pressure drop in each tank over the whole dive, by tank name.
+    std::map<std::string, Pressure> gasUsed;
+    /// Largest gradient (0-1) reached at any point in the dive.
+    double maxGradient;
+};
+
+/// \brief Summarize a plan that was produced by `Replan`.
+///
+/// \param[in] input The plan that was given to `Replan`. Only its profile length is used, to tell
+/// the user's points apart from the ones the planner added.
+///
+/// \param[in] output The plan returned by `Replan`.
+Summary Summarize(const Plan& input, const Plan& output);
+
+/// \brief Replan and summarize many plans at once, spread across a pool of threads. Plans are
+/// independent of each other so there is nothing shared between threads.
+///
+/// \param[in] inputs Finalized plans to replan.
+///
+/// \param[in] threadCount Number of threads to use. 0 uses one per hardware thread.
+///
+/// \param[in,out] cache Passed to every `Replan`. Variants of one plan share most of their profile,
+/// so they mostly start from each other's checkpoints.
+///
+/// \param[in] options Passed to every `Replan`.
+///
+/// \return One summary per input, in the same order. If any plan fails, the first failure is
+/// rethrown once all threads are done.
+std::vector<Summary> ReplanMany(const std::vector<Plan>& inputs, size_t threadCount = 0,
+                                CheckpointCache* cache = nullptr,
+                                const ReplanOptions& options = {});
 
 } // namespace bungee
@@ -1,5 +1,7 @@
 #pragma once
 
+#include "Checkpoint.h"
+#include "Constants.h"
 #include "Plan.h"
 
 #include "custom_units.h"
@@ -9,9 +11,35 @@ namespace bungee {
 
 /// FIXME: make this AoS instead of SoA
 struct Result {
+    /// Output fields that can be requested from the result. Combine with bitwise or. Time and depth
+    /// are always computed since everything else is derived from them. Fields that are not
+    /// requested are left empty.
+    enum Field : unsigned {
+        AMBIENT_PRESSURE = 1 << 0,
+        TANK_PRESSURE = 1 << 1,
+        CEILING = 1 << 2,
+        GRADIENT = 1 << 3,
+        M0S = 1 << 4,
+        TISSUE_PRESSURES = 1 << 5,
+        CEILINGS = 1 << 6,
+        GRADIENTS = 1 << 7,
+        DECO = CEILING | GRADIENT | M0S | TISSUE_PRESSURES | CEILINGS | GRADIENTS,
+        ALL = AMBIENT_PRESSURE | TANK_PRESSURE | DECO,
+    };
+
+    struct Config {
+        /// Spacing of the output samples. The last sample is always at the end of the plan, so the
+        /// final interval may be shorter.
+        Time interval = MODEL_TIME_INC;
+        /// Bitwise or of `Field` values to compute.
+        unsigned fields = ALL;
+
+        void validate() const;
+    };
+
     struct Deco {
         /// FIXME this is trashy
-        void resize(size_t timeCount, size_t compartmentCount);
+        void resize(size_t timeCount, size_t compartmentCount, unsigned fields = ALL);
 
         /// Minimum depth for decompression model
         Eigen::VectorXd ceiling;
@@ -24,21 +52,73 @@ struct Result {
         Eigen::MatrixXd gradients;
     };
 
-    /// \param[in} N number of points to allocate for all arrays (will be same sized)
+    /// \brief Compute every field at `MODEL_TIME_INC` resolution.
     Result(const Plan& plan);
 
+    /// \brief Compute the requested fields at the requested resolution.
+    Result(const Plan& plan, const Config& config);
+
+    /// \brief Compute the requested fields at the requested resolution, reusing what can be reused
+    /// from the result of an earlier version of the plan.
+    ///
+    /// \param[in] previous Result of a plan that starts the same way as `plan`, e.g. before the
+    /// user changed the last segment. Deco samples up to the last profile point the two plans share
+    /// are copied from it, and the model picks up from its checkpoint there. Ignored if null or if
+    /// it doesn't have all the deco fields requested in `config`.
+    Result(const Plan& plan, const Config& config, const Result* previous);
+
+    /// \brief Compute the requested fields at the given sample times only, picking the deco model
+    /// up from a known tissue state instead of running it from the start of the dive. Used to
+    /// compute a long result a piece at a time, see `ResultStream`. `config.interval` is ignored.
+    ///
+    /// \param[in] time Sample times [min], increasing and within the plan.
+    ///
+    /// \param[in,out] state Tissue state at or before `time[0]`. Updated to the state at the last
+    /// sample. Only used if a deco field is requested.
+    Result(const Plan& plan, const Config& config, Eigen::Ref<const Eigen::VectorXd> time,
+           Checkpoint& state);
+
     Eigen::VectorXd GetAmbientPressure(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> depth);
 
-    /// FIXME: need to select working vs deco scr.
+    /// Gas use is integrated exactly between plan points (see `SegmentUsage`), so the pressures
+    /// don't depend on how coarse `time` is.
+    ///
+    /// \return Pressure in each tank at each time [bar], by tank name.
     static std::map<std::string, Eigen::VectorXd>
-    GetTankPressure(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
-                    Eigen::Ref<const Eigen::VectorXd> depth);
+    GetTankPressure(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time);
 
+    /// Tissue state is integrated exactly between the requested sample times (see
+    /// `Compartment::variablePressureUpdate`), so `time` may be as coarse as the caller likes and
+    /// the model is only evaluated there. `depth` must be the plan depth at each time, and is only
+    /// used for gradients. Only the deco members of `fields` are filled in.
+    ///
     /// FIXME: this assumes that the model units are the same as the units in the rest of bungee,
     /// whereas the model stuff was left explicit instead of typedef'd explicitly to allow them
     /// to potentially be different in the future.
     static Deco GetDeco(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
-                        Eigen::Ref<const Eigen::VectorXd> depth);
+                        Eigen::Ref<const Eigen::VectorXd> depth, unsigned fields = ALL);
+
+    /// \brief Same as above, and also save the tissue state at every profile point.
+    ///
+    /// \param[out] checkpoints One per profile point.
+    ///
+    /// \param[in] previous See the constructor. `time` must be spaced the same way as its time for
+    /// anything to be reused.
+    static Deco GetDeco(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
+                        Eigen::Ref<const Eigen::VectorXd> depth, unsigned fields,
+                        std::vector<Checkpoint>& checkpoints, const Result* previous = nullptr);
+
+    /// \brief Same as above, but start the model from `state` instead of the surface, and don't
+    /// save any checkpoints.
+    ///
+    /// \param[in,out] state Tissue state at or before `time[0]`. Updated to the state at the last
+    /// sample, with a hash of 0 since that isn't generally at a profile point.
+    static Deco GetDeco(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
+                        Eigen::Ref<const Eigen::VectorXd> depth, unsigned fields,
+                        Checkpoint& state);
+
+    /// Which fields were computed, bitwise or of `Field` values.
+    unsigned fields;
 
     /// time in minutes
     ///
@@ -52,8 +132,46 @@ struct Result {
     std::map<std::string, Eigen::VectorXd> tankPressure;
 
     Deco deco;
+    /// Tissue state at each profile point. Only filled in when a deco field was computed.
+    std::vector<Checkpoint> checkpoints;
+};
+
+/// \brief Computes the result of a plan a fixed number of samples at a time, carrying the tissue
+/// state from one chunk to the next. Memory use is bounded by the chunk size no matter how long the
+/// plan is. The chunks put together are the same as the `Result` computed in one go with the same
+/// config.
+class ResultStream {
+public:
+    /// \param[in] chunkSize Number of samples in each chunk. The last one may be shorter.
+    ResultStream(const Plan& plan, const Result::Config& config, size_t chunkSize);
+
+    bool done() const { return _nextSample == _sampleCount; }
+
+    /// \brief Compute the next chunk. Throws if `done()`.
+    Result next();
+
+    /// Total number of samples over all chunks.
+    size_t sampleCount() const { return _sampleCount; }
+    size_t chunkSize() const { return _chunkSize; }
+    /// Tissue state at the end of the last chunk returned.
+    const Checkpoint& state() const { return _state; }
+
+private:
+    Plan _plan;
+    Result::Config _config;
+    size_t _chunkSize;
+    size_t _sampleCount;
+    size_t _nextSample = 0;
+    Checkpoint _state;
 };
 
+/// \brief Gas used on each segment of a plan, from the tank in use on it. The working SCR is used
+/// until `Plan::decoStart` and the deco SCR from there on. Consumption is linear in depth, so the
+/// average depth is exact for the straight line between two plan points.
+///
+/// \return Surface volume used on each segment [L], one per segment.
+Eigen::VectorXd SegmentUsage(const Plan& plan);
+
 /// \brief Gas consumption between 2 plan points. Assume that the scr in point 0 applies throughout
 /// and ignore the scr in point 1. Allows times to be equal. For changes in depth, compute at the
 /// average of the two depths.
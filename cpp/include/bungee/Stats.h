@@ -0,0 +1,137 @@
+#pragma once
+
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <map>
+#include <string>
+
+namespace bungee {
+
+/// \brief Counters and timers for the hot paths, to see where the time goes.
+///
+/// Off by default. While off, counting or timing is a relaxed load of a flag and a branch, so the
+/// instrumentation can stay in the hot paths. The counters are global and shared by every thread.
+struct Stats {
+    /// Events that are counted.
+    enum Counter : size_t {
+        /// Schreiner updates of a whole deco model, constant or variable pressure.
+        MODEL_UPDATES,
+        /// Deco models copied by the planner to try out an ascent.
+        MODEL_COPIES,
+        /// Stops solved for in closed form by the planner.
+        STOP_SOLVES,
+        /// `Plan::segmentAtTime` lookups.
+        SEGMENT_LOOKUPS,
+        /// Samples computed by `Result`.
+        RESULT_SAMPLES,
+        COUNTER_COUNT,
+    };
+
+    /// Phases that are timed. A phase nested in another is also included in the outer one's time.
+    enum Phase : size_t {
+        /// Turning a plan file or dict into a `Plan`, timed by cenote.
+        PARSE,
+        /// `Plan::finalize`.
+        FINALIZE,
+        /// All of `Replan`.
+        REPLAN,
+        /// Catching the deco model up with the user's profile in `Replan`.
+        REPLAN_FORWARD,
+        /// Planning the ascent in `Replan`.
+        REPLAN_ASCENT,
+        /// `Summarize`.
+        SUMMARIZE,
+        /// All of a `Result`.
+        RESULT,
+        /// `Result::GetTankPressure`.
+        RESULT_TANK_PRESSURE,
+        /// `Result::GetDeco`.
+        RESULT_DECO,
+        /// Attaching units to result fields, timed by cenote.
+        CONVERT,
+        PHASE_COUNT,
+    };
+
+    struct Timing {
+        uint64_t calls = 0;
+        double seconds = 0;
+    };
+
+    /// Count of each counter, by lowercase name.
+    std::map<std::string, uint64_t> counters;
+    /// Time spent in each phase, by lowercase name.
+    std::map<std::string, Timing> phases;
+};
+
+namespace detail {
+// defined once in Stats.cpp, and exported from it. inline variables would get a copy in every
+// binary that includes this header whenever symbols are hidden, e.g. in a python module, and then
+// turning stats on in one binary wouldn't turn them on in the others. the flag is still read inline,
+// so checking it costs a load and not a call into bungee_core.
+[[gnu::visibility("default")]] extern std::atomic<bool> statsEnabled;
+[[gnu::visibility("default")]] extern std::array<std::atomic<uint64_t>, Stats::COUNTER_COUNT>
+    statsCounts;
+[[gnu::visibility("default")]] extern std::array<std::atomic<uint64_t>, Stats::PHASE_COUNT>
+    statsCalls;
+[[gnu::visibility("default")]] extern std::array<std::atomic<uint64_t>, Stats::PHASE_COUNT>
+    statsNanoseconds;
+} // namespace detail
+
+/// \brief Turn the instrumentation on or off. Counts so far are kept either way.
+void EnableStats(bool enabled = true);
+
+inline bool StatsEnabled() { return detail::statsEnabled.load(std::memory_order_relaxed); }
+
+/// \brief Zero every counter and timer.
+void ResetStats();
+
+/// \return Everything counted and timed since the last reset.
+Stats GetStats();
+
+/// \brief Count `count` events, if enabled.
+inline void Count(const Stats::Counter counter, const uint64_t count = 1)
+{
+    if (StatsEnabled()) {
+        detail::statsCounts[counter].fetch_add(count, std::memory_order_relaxed);
+    }
+}
+
+/// \brief Add a call that took `seconds` to a phase, if enabled. For phases timed outside of
+/// bungee.
+void AddTiming(Stats::Phase phase, double seconds);
+
+/// \brief Times its own lifetime as one call of a phase, if enabled when it's created.
+class ScopedTimer {
+public:
+    ScopedTimer(const Stats::Phase phase) : _phase(phase), _enabled(StatsEnabled())
+    {
+        if (_enabled) {
+            _start = std::chrono::steady_clock::now();
+        }
+    }
+    ~ScopedTimer()
+    {
+        if (_enabled) {
+            const auto elapsed = std::chrono::steady_clock::now() - _start;
+            detail::statsCalls[_phase].fetch_add(1, std::memory_order_relaxed);
+            detail::statsNanoseconds[_phase].fetch_add(
+                std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed).count(),
+                std::memory_order_relaxed);
+        }
+    }
+    ScopedTimer(const ScopedTimer&) = delete;
+    ScopedTimer& operator=(const ScopedTimer&) = delete;
+
+private:
+    Stats::Phase _phase;
+    bool _enabled;
+    std::chrono::steady_clock::time_point _start;
+};
+
+/// \return Lowercase name of a counter or phase, as used in `Stats`.
+const char* StatsName(Stats::Counter counter);
+const char* StatsName(Stats::Phase phase);
+
+} // namespace bungee
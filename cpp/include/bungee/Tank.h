@@ -1,6 +1,7 @@
 #pragma once
 
 #include "custom_units.h"
+#include <Eigen/Dense>
 
 #include <memory>
 
@@ -44,6 +45,14 @@ public:
     /// \brief compute gas pressure for a given volume
     static Pressure PressureAtVolume(const Params& params, Volume volume);
 
+    /// \brief compute gas pressure for many volumes at once
+    ///
+    /// \param[in] volume [L]
+    ///
+    /// \return pressure [bar]
+    static Eigen::VectorXd PressureAtVolume(const Params& params,
+                                            Eigen::Ref<const Eigen::VectorXd> volume);
+
     Pressure servicePressure() const { return _params.servicePressure; }
     Volume serviceVolume() const;
 
@@ -73,6 +82,7 @@ private:
     Volume _volume;
 };
 
+const Tank::Params& GetTankParams(Tank::Type type);
 Tank GetEmptyTank(Tank::Type type);
 Tank GetFullTank(Tank::Type type);
 Tank GetTankAtPressure(Tank::Type type, Pressure pressure);
@@ -1,15 +1,18 @@
 #pragma once
 
+#include <bungee/Checkpoint.h>
 #include <bungee/Constants.h>
 #include <bungee/Mix.h>
 #include <bungee/Plan.h>
 #include <bungee/Planner.h>
 #include <bungee/Result.h>
 #include <bungee/Scr.h>
+#include <bungee/Stats.h>
 #include <bungee/Tank.h>
 #include <bungee/Water.h>
 #include <bungee/custom_units.h>
 #include <bungee/deco/buhlmann/Buhlmann.h>
 #include <bungee/deco/buhlmann/Compartment.h>
 #include <bungee/deco/buhlmann/Models.h>
-#include <bungee/ensure.h>
\ No newline at end of file
+#include <bungee/ensure.h>
+#include <bungee/utils.h>
\ No newline at end of file
@@ -5,8 +5,25 @@
 #include <bungee/Mix.h>
 #include <bungee/Water.h>
 
+#include <Eigen/Dense>
+
+#include <optional>
+
 namespace bungee::deco::buhlmann {
 
+/// Upper bound on the number of compartments in any model. Compartment state is stored in arrays
+/// of this fixed capacity so that models can be copied and updated without touching the heap.
+static constexpr int MAX_COMPARTMENT_COUNT = 32;
+
+/// One value per compartment.
+using CompartmentVector =
+    Eigen::Matrix<double, Eigen::Dynamic, 1, Eigen::ColMajor, MAX_COMPARTMENT_COUNT, 1>;
+
+/// Structure of arrays version of a list of `Compartment`s. Every update and query runs over all
+/// compartments at once, and queries write into caller-provided storage (e.g. a column of a result
+/// matrix) instead of allocating.
+///
+/// Units follow `Compartment`: bar and minutes.
 class Buhlmann {
 public:
     struct Params {
@@ -15,7 +32,7 @@ public:
     };
     Buhlmann(const Params& params);
 
-    size_t compartmentCount() const { return _compartments.size(); }
+    size_t compartmentCount() const { return _pressures.size(); }
 
     /// \brief Initialize compartment to equilibrium with a given mixture + pressure.
     /// This is most often used to initialize compartments to an effective infinite surface
@@ -23,22 +40,48 @@ public:
     void equilibrium(const Mix::PartialPressure& partialPressure);
 
     void setCompartmentPressures(const std::vector<Pressure> compartmentPressures);
+    void setCompartmentPressures(Eigen::Ref<const Eigen::VectorXd> compartmentPressures);
 
     /// TODO: temperature consideration
     void constantPressureUpdate(const Mix::PartialPressure& partialPressure, Time duration);
+    /// Exact for a linear change in pressure, see `Compartment::variablePressureUpdate`.
     void variablePressureUpdate(const Mix::PartialPressure& partialPressureStart,
                                 const Mix::PartialPressure& partialPressureEnd, Time duration);
 
+    /// \brief Solve for how long to stay at a constant pressure before a linear ascent can be made
+    /// without arriving over a given gradient. Each compartment is solved in closed form, since
+    /// both the stay and the ascent are linear in the starting compartment pressure.
+    ///
+    /// \param[in] partialPressureStop Partial pressures during the stay, and at the start of the
+    /// ascent.
+    ///
+    /// \param[in] partialPressureEnd Partial pressures at the end of the ascent.
+    ///
+    /// \param[in] ascentDuration Duration of the ascent.
+    ///
+    /// \param[in] depthEnd Depth at the end of the ascent.
+    ///
+    /// \param[in] gf Largest gradient allowed at `depthEnd` on arrival.
+    ///
+    /// \return Time to stay, which is 0 if the ascent can be made right away, or nullopt if no
+    /// amount of time will allow the ascent.
+    std::optional<Time> clearTime(const Mix::PartialPressure& partialPressureStop,
+                                  const Mix::PartialPressure& partialPressureEnd,
+                                  Time ascentDuration, Depth depthEnd, double gf) const;
+
     /// \param[in] gf Gradient factor, [0.0, 1.0]. Pass 1 to get the depth at the M value. Pass 0
     /// to get the current pressure. But don't do either of those things because there's more
     /// efficient ways.
     Depth ceiling(double gf) const;
-    std::vector<Depth> ceilings(double gf) const;
+    /// \param[out] out Ceiling of each compartment [m].
+    void ceilings(double gf, Eigen::Ref<Eigen::VectorXd> out) const;
 
-    std::vector<Pressure> M0s() const;
+    /// \param[out] out M0 of each compartment [bar].
+    void M0s(Eigen::Ref<Eigen::VectorXd> out) const;
     Pressure M0() const;
 
-    std::vector<Pressure> pressures() const;
+    /// \return Inert gas pressure of each compartment [bar].
+    const CompartmentVector& pressures() const { return _pressures; }
 
     /// Get the gradient factor if the diver were instantaneously placed into an environment
     /// with the given ambient absolute pressure. A return value of 1.0 means the controlling
@@ -46,15 +89,28 @@ public:
     /// be on-gassing or at equilibrium. while on-gassing, GF's may reach very large negative
     /// values, so 0 is the lowest return value.
     Scalar gradientAtDepth(Depth depth) const;
-    std::vector<Scalar> gradientsAtDepth(Depth depth) const;
+    /// \param[out] out Gradient of each compartment.
+    void gradientsAtDepth(Depth depth, Eigen::Ref<Eigen::VectorXd> out) const;
 
 private:
-    const Params _params;
+    auto m0s() const { return (_pressures.array() - _a.array()) * _b.array(); }
 
-    /// Nitrogen compartments.
+    Params _params;
+
+    /// Decay constant of each compartment, ln(2) / half life [1/min].
+    CompartmentVector _k;
+    /// Coefficient `a` of each compartment [bar], see `Compartment::Params`.
+    CompartmentVector _a;
+    /// Coefficient `b` of each compartment, see `Compartment::Params`.
+    CompartmentVector _b;
+
+    /// Nitrogen pressure of each compartment [bar]. NaN until initialized.
     ///
     /// TODO: make a nested array for each type of gas once helium is supported.
-    std::vector<Compartment> _compartments;
+    CompartmentVector _pressures;
+
+    /// Converts pressure relative to the surface to depth [m/bar].
+    double _depthPerPressure;
 };
 
 } // namespace bungee::deco::buhlmann
@@ -62,7 +62,8 @@ public:
     void constantPressureUpdate(units::pressure::bar_t ambientPressure,
                                 units::time::minute_t duration);
 
-    /// Assume ambient pressure changes linearly from start to end.
+    /// Assume ambient pressure changes linearly from start to end. This is solved exactly with the
+    /// Schreiner equation, so the result does not depend on how the duration is subdivided.
     void variablePressureUpdate(units::pressure::bar_t ambientPressureStart,
                                 units::pressure::bar_t ambientPressureEnd,
                                 units::time::minute_t duration);
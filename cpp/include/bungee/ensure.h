@@ -1,6 +1,7 @@
 #pragma once
 
 #include <stdexcept>
+#include <string>
 
 namespace {
 
@@ -11,4 +12,12 @@ inline void ensure(const bool cond, const std::string& msg)
     }
 }
 
+/// Literal messages don't build a string unless they're thrown, which matters in hot loops.
+inline void ensure(const bool cond, const char* msg)
+{
+    if (!cond) {
+        throw std::logic_error(msg);
+    }
+}
+
 } // namespace
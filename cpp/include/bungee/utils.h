@@ -1,13 +1,26 @@
+#pragma once
+
 #include "Constants.h"
 
 #include <Eigen/Dense>
 
 namespace bungee {
 
-size_t GetNumPoints(Time duration);
+/// \return Number of samples needed to cover `duration` with spacing no larger than `increment`,
+/// including both ends.
+size_t GetNumPoints(Time duration, Time increment = MODEL_TIME_INC);
+
+/// \brief Sample times from 0 to `duration` inclusive, spaced by `increment`. The final interval is
+/// shorter when `duration` is not a multiple of `increment`.
+///
+/// \return times [min]
+Eigen::VectorXd GetSampleTimes(Time duration, Time increment = MODEL_TIME_INC);
 
 /// \brief 1d interpolation
 ///
+/// Linear in the size of the inputs when `x` is sorted, since the search for each sample picks up
+/// where the previous one left off. Unsorted samples fall back to a binary search.
+///
 /// \param[in] data
 ///    [ x1, x2, ..., xM ]
 ///    [ y1, y2, ..., yM ]
@@ -15,6 +28,10 @@ size_t GetNumPoints(Time duration);
 /// \param[in] x
 ///    [ x1, x2, ..., xN ]
 ///
+/// \param[out] y interpolated y data corresponding to x. Must be the same size as x.
+void Interpolate(Eigen::Ref<const Eigen::VectorXd> xp, Eigen::Ref<const Eigen::VectorXd> yp,
+                 Eigen::Ref<const Eigen::VectorXd> x, Eigen::Ref<Eigen::VectorXd> y);
+
 /// \return interpolated y data corresponding to x
 Eigen::VectorXd Interpolate(Eigen::Ref<const Eigen::VectorXd> xp,
                             Eigen::Ref<const Eigen::VectorXd> yp,
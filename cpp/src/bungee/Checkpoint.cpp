@@ -0,0 +1,106 @@
+#include <bungee/Checkpoint.h>
+#include <bungee/ensure.h>
+
+#include <bit>
+
+namespace bungee {
+
+namespace {
+
+/// splitmix64 finalizer, so that nearby inputs end up far apart.
+uint64_t Scramble(uint64_t x)
+{
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ull;
+    x = (x ^ (x >> 27)) * 0x94d049bb133111ebull;
+    return x ^ (x >> 31);
+}
+
+uint64_t Combine(const uint64_t seed, const uint64_t value)
+{
+    return Scramble(seed ^ (Scramble(value) + 0x9e3779b97f4a7c15ull + (seed << 6) + (seed >> 2)));
+}
+
+uint64_t Combine(const uint64_t seed, const double value)
+{
+    return Combine(seed, std::bit_cast<uint64_t>(value));
+}
+
+} // namespace
+
+std::vector<uint64_t> PrefixHashes(const Plan& plan)
+{
+    ensure(plan.finalized(), "PrefixHashes: plan not finalized");
+    const Plan::Profile& profile = plan.profile();
+    std::vector<uint64_t> hashes(profile.size());
+    // every plan starts from surface equilibrium with the deco model, so the water is all there is
+    // to the initial state
+    uint64_t hash = Combine(uint64_t(0), uint64_t(plan.water()));
+    for (size_t i = 0; i < profile.size(); ++i) {
+        if (i > 0) {
+            // the mix breathed on the way to this point
+            hash = Combine(hash, plan.tankConfig(plan.tankIds()[i - 1]).mix.fO2());
+        }
+        hash = Combine(hash, profile[i].time());
+        hash = Combine(hash, profile[i].depth());
+        hashes[i] = hash;
+    }
+    return hashes;
+}
+
+CheckpointCache::CheckpointCache(const size_t capacity) : _capacity(capacity)
+{
+    ensure(capacity > 0, "CheckpointCache: capacity must be positive");
+}
+
+std::optional<std::pair<size_t, Checkpoint>>
+CheckpointCache::find(const std::vector<uint64_t>& hashes)
+{
+    std::lock_guard<std::mutex> lock(_mutex);
+    for (size_t i = hashes.size(); i-- > 0;) {
+        const auto it = _index.find(hashes[i]);
+        if (it != _index.end()) {
+            _entries.splice(_entries.begin(), _entries, it->second);
+            ++_hits;
+            return std::make_pair(i, *it->second);
+        }
+    }
+    ++_misses;
+    return std::nullopt;
+}
+
+void CheckpointCache::insert(const Checkpoint& checkpoint)
+{
+    std::lock_guard<std::mutex> lock(_mutex);
+    const auto it = _index.find(checkpoint.hash);
+    if (it != _index.end()) {
+        *it->second = checkpoint;
+        _entries.splice(_entries.begin(), _entries, it->second);
+        return;
+    }
+    _entries.push_front(checkpoint);
+    _index.emplace(checkpoint.hash, _entries.begin());
+    if (_entries.size() > _capacity) {
+        _index.erase(_entries.back().hash);
+        _entries.pop_back();
+    }
+}
+
+size_t CheckpointCache::size() const
+{
+    std::lock_guard<std::mutex> lock(_mutex);
+    return _entries.size();
+}
+
+size_t CheckpointCache::hits() const
+{
+    std::lock_guard<std::mutex> lock(_mutex);
+    return _hits;
+}
+
+size_t CheckpointCache::misses() const
+{
+    std::lock_guard<std::mutex> lock(_mutex);
+    return _misses;
+}
+
+} // namespace bungee
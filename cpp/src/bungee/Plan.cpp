@@ -1,8 +1,12 @@
 #include <bungee/Constants.h>
 #include <bungee/Plan.h>
 #include <bungee/Scr.h>
+#include <bungee/Stats.h>
 #include <bungee/ensure.h>
 
+#include <algorithm>
+#include <iterator>
+
 using namespace units::literals;
 
 namespace bungee {
@@ -64,63 +68,144 @@ void Plan::addSegment(Time duration, Depth endDepth)
     _profile.emplace_back(time, endDepth, _currentTank.value());
 }
 
+void Plan::addSegments(Eigen::Ref<const Eigen::VectorXd> durations,
+                       Eigen::Ref<const Eigen::VectorXd> depths,
+                       const std::vector<std::string>& tanks)
+{
+    ensure(durations.size() == depths.size(),
+           "addSegments: durations and depths must be same size");
+    ensure(tanks.empty() || (tanks.size() == durations.size()),
+           "addSegments: tanks must be empty or the same size as durations");
+    _profile.reserve(_profile.size() + durations.size());
+    for (size_t i = 0; i < durations.size(); ++i) {
+        if (!tanks.empty() && !tanks[i].empty()) {
+            setTank(tanks[i]);
+        }
+        addSegment(Time(durations[i]), Depth(depths[i]));
+    }
+}
+
+void Plan::setDecoStart(const size_t point)
+{
+    ensure(!_finalized, "finalized already");
+    ensure(point < _profile.size(), "setDecoStart: no such point");
+    _decoStart = point;
+}
+
 void Plan::finalize()
 {
+    ScopedTimer timer(Stats::FINALIZE);
     // water doesn't need validation
     // scr/tank already validated
     // points were validated as they were added
     ensure(_profile.size() > 1, "need at least 2 poins");
+
+    _time.resize(_profile.size());
+    _depth.resize(_profile.size());
+    for (size_t i = 0; i < _profile.size(); ++i) {
+        _time[i] = _profile[i].time();
+        _depth[i] = _profile[i].depth();
+    }
+
+    _tankNames.clear();
+    _tankConfigs.clear();
+    for (const auto& [name, config] : _tanks) {
+        _tankNames.push_back(name);
+        _tankConfigs.push_back(config);
+    }
+    _tankIds.clear();
+    _tankIds.reserve(_profile.size());
+    for (const Point& point : _profile) {
+        // consecutive points almost always share a tank
+        _tankIds.push_back((!_tankIds.empty() && (point.tank == _profile[_tankIds.size() - 1].tank))
+                               ? _tankIds.back()
+                               : tankId(point.tank));
+    }
+
     _finalized = true;
 }
 
-Eigen::VectorXd Plan::time() const
+const Eigen::VectorXd& Plan::time() const
 {
-    Eigen::VectorXd data(_profile.size());
-    for (size_t i = 0; i < _profile.size(); ++i) {
-        data(i) = _profile[i].time();
-    }
-    return data;
+    ensure(_finalized, "Plan::time: not finalized");
+    return _time;
 }
 
-Eigen::VectorXd Plan::depth() const
+const Eigen::VectorXd& Plan::depth() const
 {
-    Eigen::VectorXd data(_profile.size());
-    for (size_t i = 0; i < _profile.size(); ++i) {
-        data(i) = _profile[i].depth();
-    }
-    return data;
+    ensure(_finalized, "Plan::depth: not finalized");
+    return _depth;
 }
 
-const std::string& Plan::getTankAtTime(const Time time) const
+size_t Plan::tankId(const std::string& name) const
+{
+    const auto it = _tanks.find(name);
+    ensure(it != _tanks.end(), "tankId: unknown tank");
+    // ids are in the order of the loadout
+    return std::distance(_tanks.begin(), it);
+}
+
+const std::string& Plan::tankName(const size_t id) const
+{
+    ensure(id < _tankNames.size(), "tankName: unknown tank id");
+    return _tankNames[id];
+}
+
+const Plan::TankConfig& Plan::tankConfig(const size_t id) const
+{
+    ensure(id < _tankConfigs.size(), "tankConfig: unknown tank id");
+    return _tankConfigs[id];
+}
+
+const std::vector<size_t>& Plan::tankIds() const
 {
-    ensure(_profile.front().time <= time, "getTankAtTime: time is before beginning of dive");
-    ensure(time <= _profile.back().time, "getTankAtTime: time is after end of dive");
-    for (size_t i = 0; i < _profile.size() - 1; ++i) {
-        if ((_profile[i].time <= time) && (time <= _profile[i + 1].time)) {
-            return _profile[i].tank;
+    ensure(_finalized, "tankIds: not finalized");
+    return _tankIds;
+}
+
+size_t Plan::segmentAtTime(const Time time, const size_t hint) const
+{
+    ensure(_finalized, "segmentAtTime: not finalized");
+    Count(Stats::SEGMENT_LOOKUPS);
+    ensure(_time[0] <= time(), "segmentAtTime: time is before beginning of dive");
+    ensure(time() <= _time[_time.size() - 1], "segmentAtTime: time is after end of dive");
+    const size_t last = _time.size() - 2;
+    if ((hint <= last) && (_time[hint] <= time())) {
+        // walk forward from the hint
+        size_t seg = hint;
+        while ((seg < last) && (_time[seg + 1] <= time())) {
+            ++seg;
         }
+        return seg;
     }
-    ensure(false, "couldn't find tank");
+    // first point after time is the end of the segment
+    const double* end = std::upper_bound(_time.data(), _time.data() + _time.size(), time());
+    return std::min(static_cast<size_t>(end - _time.data()) - 1, last);
+}
+
+const std::string& Plan::getTankAtTime(const Time time) const
+{
+    return tankName(_tankIds[segmentAtTime(time)]);
 }
 
-std::string Plan::bestMix(const Depth depth) const
+const std::string& Plan::bestMix(const Depth depth, const Pressure maxPpO2) const
 {
-    // select tanks with ppo2 below the threshold
-    std::vector<std::string> safeNames;
-    std::vector<Pressure> safePpN2s;
+    // among tanks with ppo2 below the threshold, pick the one with the lowest nitrogen content
+    const std::string* bestName = nullptr;
+    Pressure bestPpN2;
     for (const auto& [name, config] : _tanks) {
         Mix::PartialPressure partialPressure = config.mix.partialPressure(depth, _water);
-        if (partialPressure.O2 <= MAX_DECO_PPO2) {
-            safeNames.push_back(name);
-            safePpN2s.push_back(partialPressure.N2);
-        }
         // todo: check for hypoxia here also
+        if ((partialPressure.O2 <= maxPpO2) &&
+            ((bestName == nullptr) || (partialPressure.N2 < bestPpN2))) {
+            bestName = &name;
+            bestPpN2 = partialPressure.N2;
+        }
     }
-    // pick the remaining tank with the lowest nitrogen content
-    const auto it = std::min_element(safePpN2s.begin(), safePpN2s.end());
     // todo: pick one with the most remaining pressure to solve for multiple cylinders with the
     // same mixes
-    return safeNames[size_t(it - safePpN2s.begin())];
+    ensure(bestName != nullptr, "bestMix: no breathable tank at this depth");
+    return *bestName;
 }
 
 } // namespace bungee
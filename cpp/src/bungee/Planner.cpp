@@ -6,20 +6,58 @@ yes the whole repo is prototype code that's god awful, but this is like, real ba
 */
 
 #include <bungee/Planner.h>
-#include <bungee/Result.h> // for Interpolate. move that
+#include <bungee/Result.h>
+#include <bungee/Stats.h>
 #include <bungee/deco/buhlmann/Buhlmann.h>
 #include <bungee/ensure.h>
 #include <bungee/utils.h>
 
 #include <fmt/format.h>
 
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <exception>
+#include <optional>
+#include <thread>
+
 using namespace units::literals;
 using namespace bungee::deco::buhlmann;
 
 namespace bungee {
 
-Plan Replan(const Plan& input)
+namespace {
+
+/// Stop times within this many increments above a whole increment are rounded down. See Replan.
+constexpr double STOP_TIME_SLACK = 1e-9;
+
+/// \return The next stop above `depth` with stops every `increment`, never above the surface.
+Depth NextStop(const Depth depth, const Depth increment)
+{
+    const Depth stop = units::math::round((depth - increment) / increment) * increment;
+    return units::math::max(stop, 0_m);
+}
+
+/// \return Time to ascend `distance`, rounded up to the nearest STOP_TIME_INC.
+Time AscentDuration(const Depth distance)
+{
+    return units::math::ceil(distance / ASCENT_RATE / STOP_TIME_INC) * STOP_TIME_INC;
+}
+
+} // namespace
+
+void ReplanOptions::validate() const
 {
+    ensure(maxDecoPpO2 > 0_bar, "ReplanOptions: max deco ppO2 must be positive");
+    ensure(stopDepthInc > 0_m, "ReplanOptions: stop depth increment must be positive");
+}
+
+Plan Replan(const Plan& input, CheckpointCache* cache, const ReplanOptions& options)
+{
+    ensure(input.finalized(), "Replan: plan not finalized");
+    options.validate();
+    ScopedTimer timer(Stats::REPLAN);
+
     // start plan with the same configuration
     Plan output(input.water(), input.gf(), input.scr(), input.tanks());
     output.setProfile(input.profile());
@@ -33,19 +71,34 @@ Plan Replan(const Plan& input)
         return output;
     }
 
+    // everything from the last point the user gave us is the final ascent
+    output.setDecoStart(output.profile().size() - 1);
+
     // get the deco model caught up to the last point the user gave us so we know where to start
     // with the ascent
     Buhlmann model(Buhlmann::Params{.water = output.water(), .model = Model::ZHL_16A});
     // assume infinite surface interval preceding this dive.
     model.equilibrium(SURFACE_AIR_PP);
 
-    for (size_t i = 1; i < output.profile().size(); ++i) {
+    // skip ahead to the latest point that's been simulated before
+    size_t resume = 0;
+    std::vector<uint64_t> hashes;
+    if (cache != nullptr) {
+        hashes = PrefixHashes(input);
+        if (const auto found = cache->find(hashes)) {
+            resume = found->first;
+            model.setCompartmentPressures(found->second.pressures);
+        }
+    }
+
+    std::optional<ScopedTimer> phaseTimer(Stats::REPLAN_FORWARD);
+    for (size_t i = resume + 1; i < output.profile().size(); ++i) {
         const Plan::Point& start = output.profile()[i - 1];
         const Plan::Point& end = output.profile()[i];
         const Time duration = end.time - start.time;
         // use the same mix throughout. if the mix changes at the end point that is only
         // actually used *after* this interval.
-        const Mix& mix = output.tanks().at(start.tank).mix;
+        const Mix& mix = input.tankConfig(input.tankIds()[i - 1]).mix;
         const Mix::PartialPressure partialPressureStart =
             mix.partialPressure(start.depth, output.water());
         if (start.depth == end.depth) {
@@ -56,86 +109,93 @@ Plan Replan(const Plan& input)
                 mix.partialPressure(end.depth, output.water());
             model.variablePressureUpdate(partialPressureStart, partialPressureEnd, duration);
         }
+        if (cache != nullptr) {
+            cache->insert(Checkpoint{hashes[i], end.time, model.pressures()});
+        }
     }
 
     // do the ascent
+    phaseTimer.emplace(Stats::REPLAN_ASCENT);
     std::optional<double> gfSlope;
     Time stopDuration = 0_min;
+    // determine the desired gradient at a depth
+    auto desiredGradientAt = [&](const Depth depth) {
+        if (!gfSlope.has_value()) {
+            // if gf slope is not set, it has not been initialized and we need to start at the
+            // gf low.
+            return output.gf().low;
+        }
+        return gfSlope.value() * depth() + output.gf().high;
+    };
     while (output.profile().back().depth > 0_m) {
         ensure(output.profile().back().depth >= 0_m, "why are you planning negative depths?");
+        const Depth depth = output.profile().back().depth;
 
         // find the best mix for this depth
         // this doesn't need to be done every loop but whatever, it's not hurting anything right
         // now to do it unnecessarily?
-        output.setTank(output.bestMix(output.profile().back().depth));
+        output.setTank(output.bestMix(depth, options.maxDecoPpO2));
+        // FIXME: this won't work for hypoxic mixes
+        // assume the current gas is fine to use for the ascent.
+        const Mix& mix = output.tanks().at(output.profile().back().tank).mix;
+        const Mix::PartialPressure partialPressureCurrentDepth =
+            mix.partialPressure(depth, output.water());
 
         // figure out what the ceiling is by "visiting" it with a test model copied from the current
         // model, and seeing if we're over the desired gradient factor when the hypothetical model
-        // arrives there.
-        Depth ceiling = output.profile().back().depth;
+        // arrives there. the model that arrives at the accepted ceiling is kept so that it doesn't
+        // need to be recomputed when we commit to the ascent.
+        Depth ceiling = depth;
+        Buhlmann arrivalModel(model);
         while (ceiling > 0_m) {
             // This loop will really only run more than twice during the ascent from the bottom
             // to the first stop. When an ascent can be made between successive stops, it will run
             // twice. When no ascent can be made, it will run once.
 
             // see what the ceiling would be if we ascended one step above the current ceiling.
-            const Depth testCeiling =
-                units::math::round((ceiling - STOP_DEPTH_INC) / STOP_DEPTH_INC) * STOP_DEPTH_INC;
-            // see how much time it would take to ascend, round up to nearest minute
-            const Depth ascentDistance = output.profile().back().depth - testCeiling;
-            // round ascent time up to the nearest minute
-            const Time ascentDuration =
-                units::math::ceil(ascentDistance / ASCENT_RATE / STOP_TIME_INC) * STOP_TIME_INC;
+            const Depth testCeiling = NextStop(ceiling, options.stopDepthInc);
 
             // create hypothetical model and ascend it to the next stop
             Buhlmann testModel(model);
-            // FIXME: this won't work for hypoxic mixes
-            // assume the current gas is fine to use for the ascent.
-            const Mix& mix = output.tanks().at(output.profile().back().tank).mix;
-            const Mix::PartialPressure partialPressureCurrentDepth =
-                mix.partialPressure(output.profile().back().depth, output.water());
-            const Mix::PartialPressure partialPressureTestCeiling =
-                mix.partialPressure(testCeiling, output.water());
-            testModel.variablePressureUpdate(
-                partialPressureCurrentDepth, partialPressureTestCeiling, ascentDuration);
+            Count(Stats::MODEL_COPIES);
+            testModel.variablePressureUpdate(partialPressureCurrentDepth,
+                                             mix.partialPressure(testCeiling, output.water()),
+                                             AscentDuration(depth - testCeiling));
 
             // find the resultant gradient at this depth upon arrival
-            const double gfAtTestCeiling = testModel.gradientAtDepth(testCeiling);
-
-            // determine the desired gradient at this depth
-            double desiredGradient;
-            if (!gfSlope.has_value()) {
-                // if gf slope is not set, it has not been initialized and we need to start at the
-                // gf low.
-                desiredGradient = output.gf().low;
-            }
-            else {
-                desiredGradient = gfSlope.value() * testCeiling() + output.gf().high;
-            }
-
-            if (gfAtTestCeiling <= desiredGradient) {
+            if (testModel.gradientAtDepth(testCeiling) <= desiredGradientAt(testCeiling)) {
                 // once we get there it will be safe to get there.
-                // addition floating point errors require rounding.
                 ceiling = testCeiling;
+                arrivalModel = testModel;
             }
             else {
                 // we will cross the ceiling line getting to this stop. don't save the test
                 // ceiling and abort this loop so that the previous ceiling will be used.
                 break;
             }
-            // FIXME: could just copy values from testCeiling over to ceiling? have a bunch of shit
-            // calculated here and we just discard it to recompute it again below
         }
 
-        // if ceiling is not less than current depth, stay for another minute
-        if (ceiling >= output.profile().back().depth) {
-            const std::string& activeTank = output.profile().back().tank;
-            const Mix::PartialPressure partialPressure =
-                output.tanks()
-                    .at(activeTank)
-                    .mix.partialPressure(output.profile().back().depth, output.water());
-            model.constantPressureUpdate(partialPressure, STOP_TIME_INC);
-            stopDuration += STOP_TIME_INC;
+        // if ceiling is not less than current depth, stay until the next stop up is reachable
+        if (ceiling >= depth) {
+            // solve for the stop length directly instead of stepping the model through it
+            const Depth nextStop = NextStop(depth, options.stopDepthInc);
+            const std::optional<Time> clearTime =
+                model.clearTime(partialPressureCurrentDepth,
+                                mix.partialPressure(nextStop, output.water()),
+                                AscentDuration(depth - nextStop),
+                                nextStop,
+                                desiredGradientAt(nextStop));
+            Count(Stats::STOP_SOLVES);
+            ensure(clearTime.has_value(),
+                   fmt::format("Replan: the stop at {} can never be cleared\n", str(depth)));
+            // round up to the stop increment. we already know we can't leave right now, so stay at
+            // least one increment. a little slack keeps floating point error from adding a whole
+            // increment; if it was actually needed, the next loop will come back here for it.
+            const double stayIncrements =
+                std::ceil((clearTime.value() / STOP_TIME_INC)() - STOP_TIME_SLACK);
+            const Time stayDuration = std::max(stayIncrements, 1.0) * STOP_TIME_INC;
+            model.constantPressureUpdate(partialPressureCurrentDepth, stayDuration);
+            stopDuration += stayDuration;
             // but don't record it yet because we don't know how long we'll be here and there's no
             // reason to have a ton of plan points
             continue;
@@ -144,7 +204,7 @@ Plan Replan(const Plan& input)
 
         // add a point to the profile for the end of this stop
         if (stopDuration > 0_s) {
-            output.addSegment(stopDuration, output.profile().back().depth);
+            output.addSegment(stopDuration, depth);
             // reset the stop duration so we can start fresh next loop
             stopDuration = 0_min;
         }
@@ -154,26 +214,12 @@ Plan Replan(const Plan& input)
         if (!gfSlope.has_value()) {
             gfSlope = (output.gf().low - output.gf().high) / ceiling();
         }
-        // now figure out how long it will take to get to the stop
-        const Depth ascentDistance = output.profile().back().depth - ceiling;
-        // round ascent time up to the nearest minute
-        const Time ascentDuration =
-            units::math::ceil(ascentDistance / ASCENT_RATE / STOP_TIME_INC) * STOP_TIME_INC;
-
-        // TODO: swap to deco SCR from working SCR here.
-
-        // ascend the model
-        {
-            const Mix& mix = output.tanks().at(output.profile().back().tank).mix;
-            const Mix::PartialPressure partialPressureStart =
-                mix.partialPressure(output.profile().back().depth, output.water());
-            const Mix::PartialPressure partialPressureEnd =
-                mix.partialPressure(ceiling, output.water());
-            model.variablePressureUpdate(partialPressureStart, partialPressureEnd, ascentDuration);
-        }
+
+        // the test model already made this ascent
+        model = arrivalModel;
 
         // add a point to the profile for the ascent destination
-        output.addSegment(ascentDuration, ceiling);
+        output.addSegment(AscentDuration(depth - ceiling), ceiling);
     }
     ensure(output.profile().back().depth == 0_m,
            fmt::format("Replan: stopped somewhere other than the surface {}\n",
@@ -187,4 +233,79 @@ Plan Replan(const Plan& input)
     return output;
 }
 
-} // namespace bungee
\ No newline at end of file
+Summary Summarize(const Plan& input, const Plan& output)
+{
+    ensure(output.finalized(), "Summarize: plan not finalized");
+    ScopedTimer timer(Stats::SUMMARIZE);
+    const Plan::Profile& profile = output.profile();
+    ensure(input.profile().size() <= profile.size(), "Summarize: output is shorter than input");
+
+    Summary summary;
+    summary.runtime = profile.back().time;
+
+    // the planner only ever adds stops and ascents to the end of the user's profile, so any
+    // segment that stays at depth after that is a stop.
+    for (size_t i = input.profile().size(); i < profile.size(); ++i) {
+        const Plan::Point& start = profile[i - 1];
+        const Plan::Point& end = profile[i];
+        if ((start.depth == end.depth) && (start.depth > 0_m)) {
+            summary.stops.push_back({start.depth, end.time - start.time, start.tank});
+        }
+    }
+
+    // consumption is integrated exactly between samples, so the two ends are all that's needed.
+    Eigen::Vector2d time(profile.front().time(), profile.back().time());
+    for (const auto& [name, pressure] : Result::GetTankPressure(output, time)) {
+        summary.gasUsed.emplace(name, Pressure(pressure[0] - pressure[1]));
+    }
+
+    const Result result(output, Result::Config{.fields = Result::GRADIENT});
+    summary.maxGradient = result.deco.gradient.maxCoeff();
+
+    return summary;
+}
+
+std::vector<Summary> ReplanMany(const std::vector<Plan>& inputs, size_t threadCount,
+                                CheckpointCache* cache, const ReplanOptions& options)
+{
+    if (threadCount == 0) {
+        threadCount = std::max(std::thread::hardware_concurrency(), 1u);
+    }
+    threadCount = std::min(threadCount, inputs.size());
+
+    std::vector<std::optional<Summary>> summaries(inputs.size());
+    std::vector<std::exception_ptr> errors(inputs.size());
+    // each thread grabs the next plan nobody has claimed yet until there are none left. plans vary
+    // a lot in how long they take, so this balances better than handing out fixed chunks.
+    std::atomic<size_t> next = 0;
+    auto work = [&]() {
+        for (size_t i = next++; i < inputs.size(); i = next++) {
+            try {
+                summaries[i] = Summarize(inputs[i], Replan(inputs[i], cache, options));
+            }
+            catch (...) {
+                errors[i] = std::current_exception();
+            }
+        }
+    };
+
+    std::vector<std::thread> threads;
+    for (size_t i = 0; i < threadCount; ++i) {
+        threads.emplace_back(work);
+    }
+    for (auto& thread : threads) {
+        thread.join();
+    }
+
+    std::vector<Summary> ret;
+    ret.reserve(inputs.size());
+    for (size_t i = 0; i < inputs.size(); ++i) {
+        if (errors[i]) {
+            std::rethrow_exception(errors[i]);
+        }
+        ret.push_back(std::move(summaries[i].value()));
+    }
+    return ret;
+}
+
+} // namespace bungee
@@ -1,6 +1,7 @@
 #include <bungee/Constants.h>
 #include <bungee/Result.h>
 #include <bungee/Scr.h>
+#include <bungee/Stats.h>
 #include <bungee/deco/buhlmann/Buhlmann.h>
 #include <bungee/ensure.h>
 #include <bungee/utils.h>
@@ -16,42 +17,191 @@ namespace {
 /// STL abs is not constexpr
 template <typename T> constexpr auto Abs(T const& x) noexcept { return x < 0 ? -x : x; }
 
-template <typename Unit> Eigen::VectorXd UnitsVecToEigen(const std::vector<Unit>& vec)
+/// Depth at `time` on the straight line between two plan points.
+Depth DepthInSegment(const Plan::Point& start, const Plan::Point& end, const Time time)
 {
-    Eigen::VectorXd eigen(vec.size());
-    for (size_t i = 0; i < vec.size(); ++i) {
-        eigen(i) = vec[i]();
+    const Scalar fraction = (time - start.time) / (end.time - start.time);
+    return start.depth + (end.depth - start.depth) * fraction();
+}
+
+/// \brief Split the interval [start, end] wherever it crosses a plan point, so that depth is linear
+/// and the tank is constant over every piece.
+///
+/// \param[in,out] seg Index of the plan segment [profile[seg], profile[seg + 1]] reached so far.
+/// Pass the same cursor for successive increasing intervals to walk the plan once.
+///
+/// \param[in] func Called for each piece with the index of the segment it's in, the depth at the
+/// start and end of the piece, and its duration.
+///
+/// \param[in] onPoint Called with the index of a profile point after each piece that ends on it.
+template <typename Func, typename OnPoint>
+void ForEachPiece(const Plan& plan, size_t& seg, Time start, const Time end, Func func,
+                  OnPoint onPoint)
+{
+    ensure(end >= start, "ForEachPiece: time must be increasing");
+    const Plan::Profile& profile = plan.profile();
+    while (start < end) {
+        seg = plan.segmentAtTime(start, seg);
+        const Time stop = units::math::min(end, profile[seg + 1].time);
+        func(seg,
+             DepthInSegment(profile[seg], profile[seg + 1], start),
+             DepthInSegment(profile[seg], profile[seg + 1], stop),
+             stop - start);
+        if (stop == profile[seg + 1].time) {
+            onPoint(seg + 1);
+        }
+        start = stop;
+    }
+}
+
+/// Save the deco fields of the model's current state as sample `i` of `data`.
+void Record(const deco::buhlmann::Buhlmann& model, const unsigned fields, const Depth depth,
+            Result::Deco& data, const size_t i)
+{
+    if (fields & Result::CEILING) {
+        data.ceiling[i] = model.ceiling(1.0)();
+    }
+    if (fields & Result::GRADIENT) {
+        data.gradient[i] = model.gradientAtDepth(depth);
+    }
+    if (fields & Result::M0S) {
+        model.M0s(data.M0s.col(i));
+    }
+    if (fields & Result::TISSUE_PRESSURES) {
+        data.tissuePressures.col(i) = model.pressures();
     }
-    return eigen;
+    if (fields & Result::CEILINGS) {
+        model.ceilings(1.0, data.ceilings.col(i));
+    }
+    if (fields & Result::GRADIENTS) {
+        model.gradientsAtDepth(depth, data.gradients.col(i));
+    }
+}
+
+/// \brief Integrate the model along the plan from `start` to `end`, exactly, with one Schreiner
+/// update per plan segment crossed. See `ForEachPiece` for `seg` and `onPoint`.
+template <typename OnPoint>
+void Advance(deco::buhlmann::Buhlmann& model, const Plan& plan, size_t& seg, const Time start,
+             const Time end, OnPoint onPoint)
+{
+    ForEachPiece(
+        plan,
+        seg,
+        start,
+        end,
+        [&](const size_t seg, Depth depthStart, Depth depthEnd, Time duration) {
+            // tank at the beginning of the segment is the tank for the duration of the segment.
+            const Mix& mix = plan.tankConfig(plan.tankIds()[seg]).mix;
+            model.variablePressureUpdate(mix.partialPressure(depthStart, plan.water()),
+                                         mix.partialPressure(depthEnd, plan.water()),
+                                         duration);
+        },
+        onPoint);
+}
+
+/// Model used for every result, at equilibrium with air at the surface.
+deco::buhlmann::Buhlmann SurfaceModel(const Water water)
+{
+    using namespace deco::buhlmann;
+    Buhlmann model(Buhlmann::Params{.water = water, .model = Model::ZHL_16A});
+    // assume infinite surface interval preceding this dive.
+    model.equilibrium(SURFACE_AIR_PP);
+    return model;
+}
+
+/// Rate of gas use at the start and end of each segment of a plan [L/min].
+struct SegmentRates {
+    Eigen::VectorXd start;
+    Eigen::VectorXd end;
+};
+
+SegmentRates GetSegmentRates(const Plan& plan)
+{
+    const Plan::Profile& profile = plan.profile();
+    const size_t segCount = profile.size() - 1;
+    SegmentRates rates{Eigen::VectorXd(segCount), Eigen::VectorXd(segCount)};
+    for (size_t seg = 0; seg < segCount; ++seg) {
+        const VolumeRate scr = plan.scrOnSegment(seg);
+        rates.start[seg] = ScrAtDepth(scr, profile[seg].depth, plan.water())();
+        rates.end[seg] = ScrAtDepth(scr, profile[seg + 1].depth, plan.water())();
+    }
+    return rates;
 }
 
 } // namespace
 
-void Result::Deco::resize(size_t timeCount, size_t compartmentCount)
+void Result::Config::validate() const
+{
+    ensure(interval > 0_s, "Result::Config: interval must be positive");
+    ensure((fields & ~ALL) == 0, "Result::Config: unknown field");
+}
+
+void Result::Deco::resize(size_t timeCount, size_t compartmentCount, unsigned fields)
 {
-    ceiling = Eigen::VectorXd::Zero(timeCount);
-    gradient = Eigen::VectorXd::Zero(timeCount);
+    auto vector = [&](Field field) {
+        return Eigen::VectorXd::Zero((fields & field) ? timeCount : 0);
+    };
+    auto matrix = [&](Field field) {
+        return (fields & field) ? Eigen::MatrixXd::Zero(compartmentCount, timeCount)
+                                : Eigen::MatrixXd();
+    };
+
+    ceiling = vector(CEILING);
+    gradient = vector(GRADIENT);
 
-    M0s = Eigen::MatrixXd::Zero(compartmentCount, timeCount);
-    tissuePressures = Eigen::MatrixXd::Zero(compartmentCount, timeCount);
-    ceilings = Eigen::MatrixXd::Zero(compartmentCount, timeCount);
-    gradients = Eigen::MatrixXd::Zero(compartmentCount, timeCount);
+    M0s = matrix(M0S);
+    tissuePressures = matrix(TISSUE_PRESSURES);
+    ceilings = matrix(CEILINGS);
+    gradients = matrix(GRADIENTS);
 }
 
-Result::Result(const Plan& plan)
+Result::Result(const Plan& plan) : Result(plan, Config{}) {}
+
+Result::Result(const Plan& plan, const Config& config) : Result(plan, config, nullptr) {}
+
+Result::Result(const Plan& plan, const Config& config, const Result* previous)
+    : fields(config.fields)
 {
     ensure(plan.finalized(), "plan not finalized");
+    config.validate();
+    ScopedTimer timer(Stats::RESULT);
 
-    // start by figuring out the number of points
-    const size_t N = GetNumPoints(plan.profile().back().time);
+    // space time points evenly at the requested resolution
+    time = GetSampleTimes(plan.profile().back().time, config.interval);
+    // linearly interpolate from plan to get depths at the sample times
+    depth = Interpolate(plan.time(), plan.depth(), time);
+    Count(Stats::RESULT_SAMPLES, time.size());
+    if (fields & AMBIENT_PRESSURE) {
+        ambientPressure = GetAmbientPressure(plan, depth);
+    }
+    if (fields & TANK_PRESSURE) {
+        tankPressure = GetTankPressure(plan, time);
+    }
+    if (fields & DECO) {
+        deco = GetDeco(plan, time, depth, fields, checkpoints, previous);
+    }
+}
+
+Result::Result(const Plan& plan, const Config& config, Eigen::Ref<const Eigen::VectorXd> time,
+               Checkpoint& state)
+    : fields(config.fields), time(time)
+{
+    ensure(plan.finalized(), "plan not finalized");
+    config.validate();
+    ScopedTimer timer(Stats::RESULT);
+    ensure(time.size() > 0, "Result: no sample times");
 
-    // linearly space time points
-    time = Eigen::VectorXd::LinSpaced(N, 0, plan.profile().back().time());
-    // linearly interpolate from plan to get depths at high resolution
     depth = Interpolate(plan.time(), plan.depth(), time);
-    ambientPressure = GetAmbientPressure(plan, depth);
-    tankPressure = GetTankPressure(plan, time, depth);
-    deco = GetDeco(plan, time, depth);
+    Count(Stats::RESULT_SAMPLES, time.size());
+    if (fields & AMBIENT_PRESSURE) {
+        ambientPressure = GetAmbientPressure(plan, depth);
+    }
+    if (fields & TANK_PRESSURE) {
+        tankPressure = GetTankPressure(plan, time);
+    }
+    if (fields & DECO) {
+        deco = GetDeco(plan, time, depth, fields, state);
+    }
 }
 
 Eigen::VectorXd Result::GetAmbientPressure(const Plan& plan,
@@ -65,97 +215,222 @@ Eigen::VectorXd Result::GetAmbientPressure(const Plan& plan,
 }
 
 std::map<std::string, Eigen::VectorXd>
-Result::GetTankPressure(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
-                        Eigen::Ref<const Eigen::VectorXd> depth)
-{
-    std::map<std::string, Eigen::VectorXd> pressure;
-    // get tank pressures
-    // first initialize tanks
-    std::map<std::string, Tank> tanks;
-    for (auto const& [name, tankConfig] : plan.tanks()) {
-        tanks.emplace(name, GetTankAtPressure(tankConfig.type, tankConfig.pressure));
-    }
-    // initialize pressure arrays to zero and copy starting pressures into the 0th slot
-    for (auto const& [name, tank] : tanks) {
-        pressure.emplace(name, Eigen::VectorXd::Zero(time.size()));
-        pressure[name][0] = tank.pressure()();
-    }
-    // iterate through time decreasing pressure in whatever tank is active
-    for (size_t i = 1; i < time.size(); ++i) {
-        // compute the average depth and treat it as constant. smaller time increments work better
-        // here.
-        const Time duration(time[i] - time[i - 1]);
-        const Depth avgDepth((depth[i - 1] + depth[i]) * 0.5);
-        // get the amount consumed at this depth
-        // FIXME: need to select working vs deco scr.
-        const Volume volumeConsumed = Usage(duration, avgDepth, plan.scr().work, plan.water());
-        // tank at the beginning of the increment is the tank for the duration of the increment.
-        // same principle as for the broad segments in the plan.
-        const std::string& activeTank = plan.getTankAtTime(Time(time[i - 1]));
-        // iterate over all tanks
-        for (auto& [name, tank] : tanks) {
-            // if tank is active, reduce the volume by the amount consumed this increment and
-            if (name == activeTank) {
-                tank.decreaseVolume(volumeConsumed);
-            }
-            // record the new pressure at the end of the increment
-            pressure[name][i] = tank.pressure()();
+Result::GetTankPressure(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time)
+{
+    ensure(plan.finalized(), "GetTankPressure: plan not finalized");
+    ScopedTimer timer(Stats::RESULT_TANK_PRESSURE);
+    const SegmentRates rates = GetSegmentRates(plan);
+    const Eigen::VectorXd& pointTime = plan.time();
+    const std::vector<size_t>& tankIds = plan.tankIds();
+
+    // volume used from each tank by each profile point, one column per tank
+    const Eigen::VectorXd usage = SegmentUsage(plan);
+    Eigen::MatrixXd usedAtPoint = Eigen::MatrixXd::Zero(usage.size() + 1, plan.tankCount());
+    for (size_t seg = 0; seg < usage.size(); ++seg) {
+        usedAtPoint.row(seg + 1) = usedAtPoint.row(seg);
+        usedAtPoint(seg + 1, tankIds[seg]) += usage[seg];
+    }
+
+    // volume used from each tank by each sample. the rate is linear in time over a segment, so the
+    // volume used since the start of the segment is quadratic.
+    Eigen::MatrixXd used(time.size(), plan.tankCount());
+    size_t seg = 0;
+    for (size_t i = 0; i < time.size(); ++i) {
+        seg = plan.segmentAtTime(Time(time[i]), seg);
+        const double elapsed = time[i] - pointTime[seg];
+        const double duration = pointTime[seg + 1] - pointTime[seg];
+        used.row(i) = usedAtPoint.row(seg);
+        if (elapsed > 0) {
+            const double slope = (rates.end[seg] - rates.start[seg]) / duration;
+            used(i, tankIds[seg]) += (rates.start[seg] + 0.5 * slope * elapsed) * elapsed;
         }
     }
-    return pressure;
+
+    // then convert to pressure one whole tank at a time
+    std::map<std::string, Eigen::VectorXd> ret;
+    for (size_t id = 0; id < plan.tankCount(); ++id) {
+        const Plan::TankConfig& tankConfig = plan.tankConfig(id);
+        const Tank::Params& params = GetTankParams(tankConfig.type);
+        const double initial = Tank::VolumeAtPressure(params, tankConfig.pressure)();
+        ret.emplace(plan.tankName(id),
+                    Tank::PressureAtVolume(params, initial - used.col(id).array()));
+    }
+    return ret;
 }
 
 Result::Deco Result::GetDeco(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
-                             Eigen::Ref<const Eigen::VectorXd> depth)
+                             Eigen::Ref<const Eigen::VectorXd> depth, const unsigned fields)
 {
-    using namespace deco::buhlmann;
-    Buhlmann model(Buhlmann::Params{.water = plan.water(), .model = Model::ZHL_16A});
-    // assume infinite surface interval preceding this dive.
-    model.equilibrium(SURFACE_AIR_PP);
+    std::vector<Checkpoint> checkpoints;
+    return GetDeco(plan, time, depth, fields, checkpoints);
+}
+
+Result::Deco Result::GetDeco(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
+                             Eigen::Ref<const Eigen::VectorXd> depth, const unsigned fields,
+                             std::vector<Checkpoint>& checkpoints, const Result* previous)
+{
+    ScopedTimer timer(Stats::RESULT_DECO);
+    deco::buhlmann::Buhlmann model = SurfaceModel(plan.water());
 
     Deco data;
-    data.resize(time.size(), model.compartmentCount());
+    data.resize(time.size(), model.compartmentCount(), fields);
 
     //
     // TODO: use GF stored in plan point and interpolate
     //
 
-    // set initial value in the 0th position
-    data.ceiling[0] = model.ceiling(1.0)();
-    data.gradient[0] = model.gradientAtDepth(Depth(depth[0]));
+    auto record = [&](size_t i) { Record(model, fields, Depth(depth[i]), data, i); };
 
-    data.M0s.col(0) = UnitsVecToEigen(model.M0s());
-    data.tissuePressures.col(0) = UnitsVecToEigen(model.pressures());
-    data.ceilings.col(0) = UnitsVecToEigen(model.ceilings(1.0));
-    data.gradients.col(0) = UnitsVecToEigen(model.gradientsAtDepth(Depth(depth[0])));
+    const Plan::Profile& profile = plan.profile();
+    const std::vector<uint64_t> hashes = PrefixHashes(plan);
+    checkpoints.resize(profile.size());
+    // points before this one have a checkpoint
+    size_t nextPoint = 0;
+    auto checkpoint = [&](const size_t point) {
+        // the only points that pieces skip over are the ones at the same time as the previous
+        // point, so they have the same state
+        for (; nextPoint <= point; ++nextPoint) {
+            checkpoints[nextPoint] =
+                Checkpoint{hashes[nextPoint], profile[nextPoint].time, model.pressures()};
+        }
+    };
 
-    // iterate over increments
-    //
-    // TODO: find a way to use the vartiable pressure update in the model instead of re-implementing
-    //       it here simply to capture the state everywhere along the way.
-    for (size_t i = 1; i < time.size(); ++i) {
-        const Time duration(time[i] - time[i - 1]);
-        // This computes pressure at the average depth.
-        // dipplanner uses Schreiner equation for segments with non-constant depth, which would
-        // allow using large increments
-        const Depth avgDepth((depth[i - 1] + depth[i]) * 0.5);
-        const std::string& activeTank = plan.getTankAtTime(Time(time[i - 1]));
-        const Mix& mix = plan.tanks().at(activeTank).mix;
-        const Mix::PartialPressure partialPressure = mix.partialPressure(avgDepth, plan.water());
-
-        model.constantPressureUpdate(partialPressure, duration);
+    ensure(profile.front().time() <= time[0], "GetDeco: time starts before the plan");
+    // first sample to compute, and the time the model is at
+    size_t first = 1;
+    Time start(time[0]);
 
-        data.ceiling[i] = model.ceiling(1.0)();
-        data.gradient[i] = model.gradientAtDepth(Depth(depth[i]));
-        data.M0s.col(i) = UnitsVecToEigen(model.M0s());
-        data.tissuePressures.col(i) = UnitsVecToEigen(model.pressures());
-        data.ceilings.col(i) = UnitsVecToEigen(model.ceilings(1.0));
-        data.gradients.col(i) = UnitsVecToEigen(model.gradientsAtDepth(Depth(depth[i])));
+    // the last point shared with the previous plan, and the number of samples up to there, which
+    // are the same in both
+    size_t shared = 0;
+    size_t reused = 0;
+    if (previous != nullptr && (fields & DECO & ~previous->fields) == 0) {
+        const size_t pointCount = std::min(hashes.size(), previous->checkpoints.size());
+        while (shared + 1 < pointCount &&
+               previous->checkpoints[shared + 1].hash == hashes[shared + 1]) {
+            ++shared;
+        }
+        const size_t sampleCount = std::min<size_t>(time.size(), previous->time.size());
+        while (reused < sampleCount && time[reused] == previous->time[reused] &&
+               time[reused] <= profile[shared].time()) {
+            ++reused;
+        }
+        // every sample before the shared point has to be reusable, which it won't be if the
+        // results are spaced differently
+        if (reused < time.size() && time[reused] <= profile[shared].time()) {
+            shared = 0;
+        }
+    }
+    if (shared > 0) {
+        auto copyVector = [&](Eigen::VectorXd& to, const Eigen::VectorXd& from) {
+            if (to.size() > 0) {
+                to.head(reused) = from.head(reused);
+            }
+        };
+        auto copyMatrix = [&](Eigen::MatrixXd& to, const Eigen::MatrixXd& from) {
+            if (to.size() > 0) {
+                to.leftCols(reused) = from.leftCols(reused);
+            }
+        };
+        copyVector(data.ceiling, previous->deco.ceiling);
+        copyVector(data.gradient, previous->deco.gradient);
+        copyMatrix(data.M0s, previous->deco.M0s);
+        copyMatrix(data.tissuePressures, previous->deco.tissuePressures);
+        copyMatrix(data.ceilings, previous->deco.ceilings);
+        copyMatrix(data.gradients, previous->deco.gradients);
+        std::copy(previous->checkpoints.begin(),
+                  previous->checkpoints.begin() + shared + 1,
+                  checkpoints.begin());
+        nextPoint = shared + 1;
+        model.setCompartmentPressures(previous->checkpoints[shared].pressures);
+        first = reused;
+        start = profile[shared].time;
+    }
+    else {
+        // set initial value in the 0th position
+        checkpoint(0);
+        record(0);
     }
 
+    // iterate over increments. each increment is integrated exactly with the Schreiner equation,
+    // one piece per plan segment it crosses. the cost scales with the number of samples plus the
+    // number of plan segments, and the samples can be as sparse as the caller wants without
+    // losing accuracy.
+    size_t seg = 0;
+    for (size_t i = first; i < time.size(); ++i) {
+        Advance(model, plan, seg, start, Time(time[i]), checkpoint);
+        record(i);
+        start = Time(time[i]);
+    }
+    // points after the last sample, if it doesn't reach the end of the plan, weren't simulated
+    checkpoints.resize(nextPoint);
+
+    return data;
+}
+
+Result::Deco Result::GetDeco(const Plan& plan, Eigen::Ref<const Eigen::VectorXd> time,
+                             Eigen::Ref<const Eigen::VectorXd> depth, const unsigned fields,
+                             Checkpoint& state)
+{
+    ensure(time.size() > 0 && state.time() <= time[0], "GetDeco: time starts before the state");
+    ScopedTimer timer(Stats::RESULT_DECO);
+    deco::buhlmann::Buhlmann model = SurfaceModel(plan.water());
+    model.setCompartmentPressures(state.pressures);
+
+    Deco data;
+    data.resize(time.size(), model.compartmentCount(), fields);
+
+    size_t seg = 0;
+    Time start = state.time;
+    for (size_t i = 0; i < time.size(); ++i) {
+        Advance(model, plan, seg, start, Time(time[i]), [](size_t) {});
+        Record(model, fields, Depth(depth[i]), data, i);
+        start = Time(time[i]);
+    }
+    // the state is generally between profile points now, so it has no prefix hash
+    state = Checkpoint{0, start, model.pressures()};
+
     return data;
 }
 
+ResultStream::ResultStream(const Plan& plan, const Result::Config& config, const size_t chunkSize)
+    : _plan(plan), _config(config), _chunkSize(chunkSize)
+{
+    ensure(plan.finalized(), "ResultStream: plan not finalized");
+    config.validate();
+    ensure(chunkSize > 0, "ResultStream: chunk size must be positive");
+    _sampleCount = GetNumPoints(plan.profile().back().time, config.interval);
+    _state = Checkpoint{PrefixHashes(plan).front(),
+                        plan.profile().front().time,
+                        SurfaceModel(plan.water()).pressures()};
+}
+
+Result ResultStream::next()
+{
+    ensure(!done(), "ResultStream: no samples left");
+    const size_t count = std::min(_chunkSize, _sampleCount - _nextSample);
+    // same times as `GetSampleTimes`, without ever holding all of them
+    Eigen::VectorXd time(count);
+    for (size_t i = 0; i < count; ++i) {
+        time[i] = (_config.interval * double(_nextSample + i))();
+    }
+    _nextSample += count;
+    if (done()) {
+        time[count - 1] = _plan.profile().back().time();
+    }
+    return Result(_plan, _config, time, _state);
+}
+
+Eigen::VectorXd SegmentUsage(const Plan& plan)
+{
+    ensure(plan.finalized(), "SegmentUsage: plan not finalized");
+    const SegmentRates rates = GetSegmentRates(plan);
+    const Eigen::VectorXd& time = plan.time();
+    const size_t segCount = rates.start.size();
+    return 0.5 * (rates.start + rates.end).array() *
+           (time.tail(segCount) - time.head(segCount)).array();
+}
+
 Volume Usage(const Time duration, const Depth depth, const VolumeRate scr, const Water water)
 {
     ensure(duration() > 0, "Usage: negative or zero time duration");
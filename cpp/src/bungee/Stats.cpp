@@ -0,0 +1,105 @@
+#include <bungee/Stats.h>
+#include <bungee/ensure.h>
+
+namespace bungee {
+
+namespace detail {
+std::atomic<bool> statsEnabled = false;
+std::array<std::atomic<uint64_t>, Stats::COUNTER_COUNT> statsCounts = {};
+std::array<std::atomic<uint64_t>, Stats::PHASE_COUNT> statsCalls = {};
+std::array<std::atomic<uint64_t>, Stats::PHASE_COUNT> statsNanoseconds = {};
+} // namespace detail
+
+void EnableStats(const bool enabled)
+{
+    detail::statsEnabled.store(enabled, std::memory_order_relaxed);
+}
+
+void ResetStats()
+{
+    for (auto& count : detail::statsCounts) {
+        count.store(0, std::memory_order_relaxed);
+    }
+    for (auto& calls : detail::statsCalls) {
+        calls.store(0, std::memory_order_relaxed);
+    }
+    for (auto& nanoseconds : detail::statsNanoseconds) {
+        nanoseconds.store(0, std::memory_order_relaxed);
+    }
+}
+
+Stats GetStats()
+{
+    Stats stats;
+    for (size_t i = 0; i < Stats::COUNTER_COUNT; ++i) {
+        stats.counters[StatsName(Stats::Counter(i))] =
+            detail::statsCounts[i].load(std::memory_order_relaxed);
+    }
+    for (size_t i = 0; i < Stats::PHASE_COUNT; ++i) {
+        stats.phases[StatsName(Stats::Phase(i))] = Stats::Timing{
+            .calls = detail::statsCalls[i].load(std::memory_order_relaxed),
+            .seconds = detail::statsNanoseconds[i].load(std::memory_order_relaxed) * 1e-9,
+        };
+    }
+    return stats;
+}
+
+void AddTiming(const Stats::Phase phase, const double seconds)
+{
+    ensure(phase < Stats::PHASE_COUNT, "AddTiming: unknown phase");
+    if (StatsEnabled()) {
+        detail::statsCalls[phase].fetch_add(1, std::memory_order_relaxed);
+        detail::statsNanoseconds[phase].fetch_add(uint64_t(seconds * 1e9),
+                                                  std::memory_order_relaxed);
+    }
+}
+
+const char* StatsName(const Stats::Counter counter)
+{
+    switch (counter) {
+    case Stats::MODEL_UPDATES:
+        return "model_updates";
+    case Stats::MODEL_COPIES:
+        return "model_copies";
+    case Stats::STOP_SOLVES:
+        return "stop_solves";
+    case Stats::SEGMENT_LOOKUPS:
+        return "segment_lookups";
+    case Stats::RESULT_SAMPLES:
+        return "result_samples";
+    default:
+        ensure(false, "StatsName: unknown counter");
+        return "";
+    }
+}
+
+const char* StatsName(const Stats::Phase phase)
+{
+    switch (phase) {
+    case Stats::PARSE:
+        return "parse";
+    case Stats::FINALIZE:
+        return "finalize";
+    case Stats::REPLAN:
+        return "replan";
+    case Stats::REPLAN_FORWARD:
+        return "replan_forward";
+    case Stats::REPLAN_ASCENT:
+        return "replan_ascent";
+    case Stats::SUMMARIZE:
+        return "summarize";
+    case Stats::RESULT:
+        return "result";
+    case Stats::RESULT_TANK_PRESSURE:
+        return "result_tank_pressure";
+    case Stats::RESULT_DECO:
+        return "result_deco";
+    case Stats::CONVERT:
+        return "convert";
+    default:
+        ensure(false, "StatsName: unknown phase");
+        return "";
+    }
+}
+
+} // namespace bungee
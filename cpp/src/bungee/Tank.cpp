@@ -20,6 +20,13 @@ Pressure Tank::PressureAtVolume(const Params& params, const Volume volume)
     return volume * params.z * 1_atm / params.size;
 }
 
+Eigen::VectorXd Tank::PressureAtVolume(const Params& params,
+                                       Eigen::Ref<const Eigen::VectorXd> volume)
+{
+    // pressure is proportional to volume
+    return volume * PressureAtVolume(params, Volume(1.0))();
+}
+
 void Tank::setPressure(Pressure pressure)
 {
     _pressure = pressure;
@@ -50,6 +57,8 @@ static const std::map<Tank::Type, Tank::Params> TANK_PARAMS{
  * Tank generators for each type
  */
 
+const Tank::Params& GetTankParams(const Tank::Type type) { return TANK_PARAMS.at(type); }
+
 Tank GetEmptyTank(const Tank::Type type) { return Tank(TANK_PARAMS.at(type), 0_bar); }
 
 Tank GetFullTank(const Tank::Type type)
@@ -1,10 +1,14 @@
 #include <bungee/Constants.h>
 #include <bungee/Mix.h>
+#include <bungee/Stats.h>
 #include <bungee/deco/buhlmann/Buhlmann.h>
 #include <bungee/ensure.h>
 
 #include <fmt/format.h>
 
+#include <cmath>
+#include <limits>
+
 using namespace units::literals;
 
 namespace bungee::deco::buhlmann {
@@ -12,18 +16,24 @@ namespace bungee::deco::buhlmann {
 Buhlmann::Buhlmann(const Params& params) : _params(params)
 {
     const CompartmentList* compartmentList = GetCompartmentList(_params.model);
-    _compartments.reserve(compartmentList->size());
-    for (const units::time::minute_t halfLife : *compartmentList) {
-        _compartments.emplace_back(Compartment::Params(halfLife));
+    const Eigen::Index count = compartmentList->size();
+    ensure(count <= MAX_COMPARTMENT_COUNT, "Buhlmann: too many compartments");
+    _k.resize(count);
+    _a.resize(count);
+    _b.resize(count);
+    for (Eigen::Index i = 0; i < count; ++i) {
+        const Compartment::Params compartment((*compartmentList)[i]);
+        _k[i] = std::log(2.0) / compartment.halfLife();
+        _a[i] = compartment.a();
+        _b[i] = compartment.b();
     }
-    ensure(_compartments.size() == compartmentList->size(), "mismatch");
+    _pressures.setConstant(count, std::numeric_limits<double>::quiet_NaN());
+    _depthPerPressure = DepthFromWaterPressure(1_bar, _params.water)();
 }
 
 void Buhlmann::equilibrium(const Mix::PartialPressure& partialPressure)
 {
-    for (auto& compartment : _compartments) {
-        compartment.set(partialPressure.N2);
-    }
+    _pressures.setConstant(partialPressure.N2());
 }
 
 void Buhlmann::setCompartmentPressures(const std::vector<Pressure> compartmentPressures)
@@ -31,86 +41,133 @@ void Buhlmann::setCompartmentPressures(const std::vector<Pressure> compartmentPr
     ensure(compartmentPressures.size() == compartmentCount(),
            "Buhlmann::setCompartmentPressures: wrong size");
     for (size_t i = 0; i < compartmentPressures.size(); ++i) {
-        _compartments[i].set(compartmentPressures[i]);
+        _pressures[i] = compartmentPressures[i]();
     }
 }
 
+void Buhlmann::setCompartmentPressures(Eigen::Ref<const Eigen::VectorXd> compartmentPressures)
+{
+    ensure(compartmentPressures.size() == compartmentCount(),
+           "Buhlmann::setCompartmentPressures: wrong size");
+    _pressures = compartmentPressures;
+}
+
 void Buhlmann::constantPressureUpdate(const Mix::PartialPressure& partialPressure, Time duration)
 {
-    for (auto& compartment : _compartments) {
-        compartment.constantPressureUpdate(partialPressure.N2, duration);
-    }
+    Count(Stats::MODEL_UPDATES);
+    const double inspired = (partialPressure.N2 - WATER_VAPOR_PRESSURE)();
+    _pressures.array() +=
+        (inspired - _pressures.array()) * (1.0 - (-_k.array() * duration()).exp());
 }
 
 void Buhlmann::variablePressureUpdate(const Mix::PartialPressure& partialPressureStart,
                                       const Mix::PartialPressure& partialPressureEnd, Time duration)
 {
-    for (auto& compartment : _compartments) {
-        compartment.variablePressureUpdate(
-            partialPressureStart.N2, partialPressureEnd.N2, duration);
+    // Schreiner equation for every compartment at once. see Compartment::variablePressureUpdate.
+    Count(Stats::MODEL_UPDATES);
+    ensure(duration() > 0, "Buhlmann::variablePressureUpdate: non-positive duration");
+    const double inspiredStart = (partialPressureStart.N2 - WATER_VAPOR_PRESSURE)();
+    const double rate = (partialPressureEnd.N2 - partialPressureStart.N2)() / duration();
+    const double t = duration();
+    const auto rateOverK = rate / _k.array();
+    _pressures.array() = inspiredStart + rate * t - rateOverK -
+                         (inspiredStart - _pressures.array() - rateOverK) * (-_k.array() * t).exp();
+}
+
+std::optional<Time> Buhlmann::clearTime(const Mix::PartialPressure& partialPressureStop,
+                                        const Mix::PartialPressure& partialPressureEnd,
+                                        const Time ascentDuration, const Depth depthEnd,
+                                        const double gf) const
+{
+    /*
+    The ascent is the Schreiner equation, which is linear in the compartment pressure P it starts
+    from:
+
+        P_end = alpha + beta * P,  beta = e^(-k*T)
+
+    Staying for time t at inspired pressure Pi gives P = Pi + (P0 - Pi) * e^(-k*t). The gradient on
+    arrival is at most G when
+
+        (P_end - P_amb) / (P_end - M0(P_end)) <= G
+        P_end <= (P_amb + G*a*b) / (1 - G*(1 - b)) = P_max
+
+    So each compartment needs beta * (P0 - Pi) * e^(-k*t) <= P_max - alpha - beta * Pi = S.
+    Off-gassing compartments (P0 > Pi) are satisfied after some time, on-gassing ones are only
+    satisfied until some time.
+    */
+    ensure(ascentDuration() > 0, "Buhlmann::clearTime: non-positive ascent duration");
+    const double inspiredStop = (partialPressureStop.N2 - WATER_VAPOR_PRESSURE)();
+    const double rate = (partialPressureEnd.N2 - partialPressureStop.N2)() / ascentDuration();
+    const double ambientEnd = PressureFromDepth(depthEnd, _params.water)();
+    const double T = ascentDuration();
+
+    const CompartmentVector beta = (-_k.array() * T).exp();
+    const CompartmentVector alpha = inspiredStop + rate * (T - 1.0 / _k.array()) -
+                                    (inspiredStop - rate / _k.array()) * beta.array();
+    const CompartmentVector maxPressure =
+        (ambientEnd + gf * _a.array() * _b.array()) / (1.0 - gf * (1.0 - _b.array()));
+    const CompartmentVector slack =
+        maxPressure.array() - alpha.array() - beta.array() * inspiredStop;
+    const CompartmentVector excess = beta.array() * (_pressures.array() - inspiredStop);
+
+    double earliest = 0;
+    double latest = std::numeric_limits<double>::infinity();
+    for (Eigen::Index i = 0; i < _pressures.size(); ++i) {
+        if (excess[i] <= slack[i]) {
+            // fine right now. on-gassing compartments may stop being fine later
+            if ((excess[i] < 0) && (slack[i] < 0)) {
+                latest = std::min(latest, -std::log(slack[i] / excess[i]) / _k[i]);
+            }
+        }
+        else if ((excess[i] > 0) && (slack[i] > 0)) {
+            earliest = std::max(earliest, -std::log(slack[i] / excess[i]) / _k[i]);
+        }
+        else {
+            // on-gassing and already over, or would be over even at equilibrium with the stop
+            return std::nullopt;
+        }
+    }
+    if (earliest > latest) {
+        return std::nullopt;
     }
+    return Time(earliest);
 }
 
 Depth Buhlmann::ceiling(const double gf) const
 {
-    const std::vector<Depth> vec = ceilings(gf);
-    return *std::max_element(vec.begin(), vec.end());
+    ensure(gf >= 0.0, "Buhlmann::ceiling: gf must be at least 0");
+    ensure(gf <= 1.0, "Buhlmann::ceiling: gf must be at most 1");
+    ensure((_pressures.array() > m0s()).all(), "what the absolute fuck");
+    // depth is affine in pressure, so the deepest ceiling belongs to the highest tolerable pressure
+    const double tolerable = (_pressures.array() - (_pressures.array() - m0s()) * gf).maxCoeff();
+    return Depth((tolerable - Pressure(SURFACE_PRESSURE)()) * _depthPerPressure);
 }
 
-std::vector<Depth> Buhlmann::ceilings(const double gf) const
+void Buhlmann::ceilings(const double gf, Eigen::Ref<Eigen::VectorXd> out) const
 {
     ensure(gf >= 0.0, "Buhlmann::ceilings: gf must be at least 0");
     ensure(gf <= 1.0, "Buhlmann::ceilings: gf must be at most 1");
-    const std::vector<Pressure> m0s = M0s();
-    const std::vector<Pressure> ps = pressures();
-    std::vector<Depth> ret(m0s.size());
-    for (size_t i = 0; i < ret.size(); ++i) {
-        const Depth tolerableDepth = DepthFromPressure(m0s[i], _params.water);
-        const Depth tissueDepth = DepthFromPressure(ps[i], _params.water);
-        ensure(tissueDepth > tolerableDepth, "what the absolute fuck");
-        ret[i] = tissueDepth - (tissueDepth - tolerableDepth) * gf;
-    }
-    return ret;
+    ensure((_pressures.array() > m0s()).all(), "what the absolute fuck");
+    out.array() =
+        (_pressures.array() - (_pressures.array() - m0s()) * gf - Pressure(SURFACE_PRESSURE)()) *
+        _depthPerPressure;
 }
 
 Scalar Buhlmann::gradientAtDepth(const Depth depth) const
 {
-    const std::vector<Scalar> vec = gradientsAtDepth(depth);
-    return *std::max_element(vec.begin(), vec.end());
+    const double ambientPressure = PressureFromDepth(depth, _params.water)();
+    return ((_pressures.array() - ambientPressure) / (_pressures.array() - m0s())).maxCoeff();
 }
 
-std::vector<Scalar> Buhlmann::gradientsAtDepth(const Depth depth) const
+void Buhlmann::gradientsAtDepth(const Depth depth, Eigen::Ref<Eigen::VectorXd> out) const
 {
-    std::vector<Scalar> vec(compartmentCount());
-    const Pressure ambientPressure = PressureFromDepth(depth, _params.water);
-    for (size_t i = 0; i < vec.size(); ++i) {
-        vec[i] = _compartments[i].gradientAtAmbientPressure(ambientPressure);
-    }
-    return vec;
+    // http://scubatechphilippines.com/scuba_blog/gradient-factors-dummies/
+    const double ambientPressure = PressureFromDepth(depth, _params.water)();
+    out.array() = (_pressures.array() - ambientPressure) / (_pressures.array() - m0s());
 }
 
-std::vector<Pressure> Buhlmann::M0s() const
-{
-    std::vector<Pressure> vec(compartmentCount());
-    for (size_t i = 0; i < vec.size(); ++i) {
-        vec[i] = _compartments[i].M0();
-    }
-    return vec;
-}
+void Buhlmann::M0s(Eigen::Ref<Eigen::VectorXd> out) const { out.array() = m0s(); }
 
-Pressure Buhlmann::M0() const
-{
-    const std::vector<Pressure> vec = M0s();
-    return *std::max_element(vec.begin(), vec.end());
-}
-
-std::vector<Pressure> Buhlmann::pressures() const
-{
-    std::vector<Pressure> vec(compartmentCount());
-    for (size_t i = 0; i < vec.size(); ++i) {
-        vec[i] = _compartments[i].pressure();
-    }
-    return vec;
-}
+Pressure Buhlmann::M0() const { return Pressure(m0s().maxCoeff()); }
 
 } // namespace bungee::deco::buhlmann
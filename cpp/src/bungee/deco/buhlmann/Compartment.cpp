@@ -1,7 +1,6 @@
 #include <bungee/Constants.h>
 #include <bungee/deco/buhlmann/Compartment.h>
 #include <bungee/ensure.h>
-#include <bungee/utils.h>
 
 #include <fmt/format.h>
 
@@ -34,17 +33,28 @@ void Compartment::variablePressureUpdate(units::pressure::bar_t ambientPressureS
                                          units::pressure::bar_t ambientPressureEnd,
                                          units::time::minute_t duration)
 {
-    const size_t N = GetNumPoints(duration);
-    const Eigen::VectorXd timeVec = Eigen::VectorXd::LinSpaced(N, 0, duration());
-    const double ambientPressureSlope = (ambientPressureEnd - ambientPressureStart)() / duration();
-    const Eigen::VectorXd ambientPressureVec =
-        ambientPressureSlope * timeVec.array() + ambientPressureStart();
-    for (size_t i = 1; i < N; ++i) {
-        const units::time::minute_t thisDuration(timeVec[i] - timeVec[i - 1]);
-        const units::pressure::bar_t ambientPressureAvg(
-            (ambientPressureVec[i] + ambientPressureVec[i - 1]) * 0.5);
-        constantPressureUpdate(ambientPressureAvg, thisDuration);
-    }
+    /*
+    Schreiner equation, the closed form solution to the compartment ODE when the inspired pressure
+    changes linearly with time:
+
+    P(t) = Pi0 + R * (t - 1/k) - (Pi0 - P0 - R/k) * e^(-k*t)
+
+    Pi0: inspired pressure at the start
+    R: rate of change of the inspired pressure
+    k: decay constant, ln(2) / half life
+
+    With R = 0 this is identical to `constantPressureUpdate`, so no time stepping is needed
+    regardless of the duration.
+    */
+    ensure(_pressure.has_value(), "Compartment::variablePressureUpdate: pressure not initialized.");
+    ensure(duration() > 0, "Compartment::variablePressureUpdate: non-positive duration");
+    const double k = std::log(2.0) / _params.halfLife();
+    const double inspiredStart = (ambientPressureStart - WATER_VAPOR_PRESSURE)();
+    const double rate = (ambientPressureEnd - ambientPressureStart)() / duration();
+    const double t = duration();
+    const double p0 = _pressure.value()();
+    _pressure = units::pressure::bar_t(inspiredStart + rate * (t - 1.0 / k) -
+                                       (inspiredStart - p0 - rate / k) * std::exp(-k * t));
 }
 
 units::pressure::bar_t Compartment::M0() const
@@ -2,54 +2,82 @@
 #include <bungee/ensure.h>
 #include <bungee/utils.h>
 
+#include <algorithm>
+#include <cmath>
+
 using namespace units::literals;
 
 namespace bungee {
 
-size_t GetNumPoints(Time duration)
+// the default output resolution should divide the plan cleanly in time, since plans are in
+// integer minutes.
+static_assert((1_min / MODEL_TIME_INC)() == double(int64_t((1_min / MODEL_TIME_INC)())),
+              "pick a time increment that's a clean factor of 1 minute");
+
+size_t GetNumPoints(const Time duration, const Time increment)
 {
-    // check that the time increment is such that we can divide the plan cleanly in time
-    // TODO: make this a static assert
-    // FIXME: make this generic, instead of hardcoding 1s increments. This assumes this function
-    // is only used for ascending.
-    static constexpr double POINTS_PER_MINUTE = (1_min / MODEL_TIME_INC)();
-    static_assert(POINTS_PER_MINUTE == double(int64_t(POINTS_PER_MINUTE)),
-                  "GetNumPoints: pick a time increment that's a clean factor of 1 minute");
     ensure(duration > 0_s, "GetNumPoints: negative duration");
-    return units::unit_cast<int64_t>(duration * POINTS_PER_MINUTE);
+    ensure(increment > 0_s, "GetNumPoints: non-positive increment");
+    // allow for floating point error in durations that are a multiple of the increment
+    const double intervals = (duration / increment)();
+    return size_t(std::ceil(intervals - 1e-9)) + 1;
 }
 
-Eigen::VectorXd Interpolate(Eigen::Ref<const Eigen::VectorXd> xp,
-                            Eigen::Ref<const Eigen::VectorXd> yp,
-                            Eigen::Ref<const Eigen::VectorXd> x)
+Eigen::VectorXd GetSampleTimes(const Time duration, const Time increment)
+{
+    const size_t N = GetNumPoints(duration, increment);
+    Eigen::VectorXd time(N);
+    for (size_t i = 0; i < N - 1; ++i) {
+        time[i] = (increment * double(i))();
+    }
+    time[N - 1] = duration();
+    return time;
+}
+
+void Interpolate(Eigen::Ref<const Eigen::VectorXd> xp, Eigen::Ref<const Eigen::VectorXd> yp,
+                 Eigen::Ref<const Eigen::VectorXd> x, Eigen::Ref<Eigen::VectorXd> y)
 {
     ensure(xp.size() == yp.size(), "xp and yp must be same size");
+    ensure(xp.size() > 1, "Interpolate: need at least 2 points");
+    ensure(x.size() == y.size(), "Interpolate: x and y must be same size");
     // check that xp is increasing
     for (size_t i = 1; i < xp.size(); ++i) {
         ensure(xp[i] > xp[i - 1], "Interpolate: xp must be increasing");
     }
+
     // check range of x
-    ensure((xp[0] <= x.array()).all(), "cannot interpolate before beginning");
-    ensure((x.array() <= xp.tail(1)[0]).all(), "cannot interpolate after end");
-
-    auto FindIdx = [&](const double val) {
-        for (size_t i = 0; i < x.size() - 1; ++i) {
-            if ((xp[i] <= val) && (val <= xp[i + 1])) {
-                return i;
-            }
-        }
-        ensure(false, "didn't find it");
-    };
+    if (x.size() > 0) {
+        ensure(xp[0] <= x.minCoeff(), "cannot interpolate before beginning");
+        ensure(x.maxCoeff() <= xp[xp.size() - 1], "cannot interpolate after end");
+    }
 
-    // interpolate works on value between 0.0 and 1.0
-    // create normalized value
-    Eigen::VectorXd y(x.size());
+    const double* const xpBegin = xp.data();
+    const double* const xpEnd = xp.data() + xp.size();
+    const size_t last = xp.size() - 2;
+    // index of the segment [xp[j], xp[j + 1]] containing the previous x. x is almost always
+    // increasing, in which case this just walks forward and the whole thing is one merged sweep
+    // over x and xp. otherwise fall back to a binary search.
+    size_t j = 0;
     for (size_t i = 0; i < x.size(); ++i) {
-        const size_t j = FindIdx(x[i]);
+        const double val = x[i];
+        if (val < xp[j]) {
+            j = std::min(static_cast<size_t>(std::upper_bound(xpBegin, xpEnd, val) - xpBegin) - 1,
+                         last);
+        }
+        while ((j < last) && (xp[j + 1] < val)) {
+            ++j;
+        }
         const double slope = (yp[j + 1] - yp[j]) / (xp[j + 1] - xp[j]);
-        const double diff = x[i] - xp[j];
-        y[i] = yp[j] + slope * diff;
+        y[i] = yp[j] + slope * (val - xp[j]);
     }
+}
+
+Eigen::VectorXd Interpolate(Eigen::Ref<const Eigen::VectorXd> xp,
+                            Eigen::Ref<const Eigen::VectorXd> yp,
+                            Eigen::Ref<const Eigen::VectorXd> x)
+{
+    Eigen::VectorXd y(x.size());
+    Interpolate(xp, yp, x, y);
     return y;
 }
 
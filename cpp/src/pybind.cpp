@@ -5,6 +5,7 @@
 #include <pybind11/complex.h>
 #include <pybind11/eigen.h>
 #include <pybind11/functional.h>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
@@ -30,6 +31,35 @@ void Replace(std::string& str, const std::string& from, const std::string& to)
     }
 }
 
+/// \brief Read-only NumPy view of an Eigen array, sharing its buffer. `owner` is kept alive as
+/// long as the view is.
+py::array ReadOnlyView(const Eigen::VectorXd& data, py::handle owner)
+{
+    py::array view(py::dtype::of<double>(), {data.size()}, {sizeof(double)}, data.data(), owner);
+    py::detail::array_proxy(view.ptr())->flags &= ~py::detail::npy_api::NPY_ARRAY_WRITEABLE_;
+    return view;
+}
+
+/// Eigen matrices are column major, so the view is Fortran ordered.
+py::array ReadOnlyView(const Eigen::MatrixXd& data, py::handle owner)
+{
+    py::array view(py::dtype::of<double>(),
+                   {data.rows(), data.cols()},
+                   {sizeof(double), sizeof(double) * data.rows()},
+                   data.data(),
+                   owner);
+    py::detail::array_proxy(view.ptr())->flags &= ~py::detail::npy_api::NPY_ARRAY_WRITEABLE_;
+    return view;
+}
+
+/// \brief Expose an Eigen member of `Class` as a read-only view instead of a copy.
+template <typename Class, typename Data> auto ViewOf(Data Class::*member)
+{
+    return [member](py::object self) {
+        return ReadOnlyView(self.cast<const Class&>().*member, self);
+    };
+}
+
 template <typename Unit> std::string GetUnitStr()
 {
     using namespace units::literals;
@@ -46,11 +76,20 @@ PYBIND11_MODULE(bungee, mod) {
     WRAP_UNIT(mod, Depth)
     WRAP_UNIT(mod, Pressure)
     WRAP_UNIT(mod, Time)
+    WRAP_UNIT(mod, Volume)
     WRAP_UNIT(mod, VolumeRate)
     mod.def("get_depth_unit_str", &GetUnitStr<Depth>);
     mod.def("get_pressure_unit_str", &GetUnitStr<Pressure>);
     mod.def("get_time_unit_str", &GetUnitStr<Time>);
+    mod.def("get_volume_unit_str", &GetUnitStr<Volume>);
     mod.def("get_volume_rate_unit_str", &GetUnitStr<VolumeRate>);
+    // Constants.h
+    mod.attr("WATER_VAPOR_PRESSURE") = WATER_VAPOR_PRESSURE;
+    mod.attr("SURFACE_PRESSURE") = SURFACE_PRESSURE;
+    mod.attr("STOP_TIME_INC") = STOP_TIME_INC;
+    mod.attr("STOP_DEPTH_INC") = STOP_DEPTH_INC;
+    mod.attr("MODEL_TIME_INC") = MODEL_TIME_INC;
+    mod.attr("MAX_DECO_PPO2") = MAX_DECO_PPO2;
     // Tank.h
     py::enum_<Tank::Type>(mod, "Tank")
         .value("AL40", Tank::AL40)
@@ -60,10 +99,19 @@ PYBIND11_MODULE(bungee, mod) {
         /// TODO: make test that iterates up to COUNT and ensures all values are wrapped
         .value("COUNT", Tank::COUNT)
     ;
+    py::class_<Tank::Params>(mod, "TankParams")
+        .def_readonly("size", &Tank::Params::size)
+        .def_readonly("service_pressure", &Tank::Params::servicePressure)
+        .def_property_readonly("z", [](const Tank::Params& params) { return params.z(); })
+    ;
+    mod.def("get_tank_params", &GetTankParams, py::return_value_policy::copy);
     // Mix.h
     py::class_<Mix>(mod, "Mix")
         .def(py::init<double>())
+        .def_property_readonly("fO2", &Mix::fO2)
+        .def_property_readonly("fN2", &Mix::fN2)
     ;
+    mod.attr("AIR") = AIR;
     // Plan.h
     py::class_<Plan::GradientFactor>(mod, "GradientFactor")
         .def(py::init<double, double>())
@@ -91,11 +139,23 @@ PYBIND11_MODULE(bungee, mod) {
         .def(py::init<Water, const Plan::GradientFactor&, const Plan::Scr&, const Plan::TankLoadout&>())
         .def("set_tank", &Plan::setTank)
         .def("add_segment", &Plan::addSegment)
+        .def("add_segments", &Plan::addSegments, py::arg("durations"), py::arg("depths"), py::arg("tanks") = std::vector<std::string>())
         .def("finalize", &Plan::finalize)
         .def("water", &Plan::water)
+        .def("gf", &Plan::gf)
+        .def("scr", &Plan::scr)
         .def("time", &Plan::time)
         .def("depth", &Plan::depth)
         .def("profile", &Plan::profile)
+        .def("tank_count", &Plan::tankCount)
+        .def("tank_id", &Plan::tankId)
+        .def("tank_name", &Plan::tankName)
+        .def("tank_ids", &Plan::tankIds)
+        .def("tank_config", &Plan::tankConfig)
+        .def("segment_at_time", &Plan::segmentAtTime, py::arg("time"), py::arg("hint") = 0)
+        .def("set_deco_start", &Plan::setDecoStart)
+        .def("deco_start", &Plan::decoStart)
+        .def("best_mix", &Plan::bestMix, py::arg("depth"), py::arg("max_ppO2") = MAX_DECO_PPO2)
     ;
     // Water.h
     py::enum_<Water>(mod, "Water")
@@ -104,25 +164,155 @@ PYBIND11_MODULE(bungee, mod) {
         /// TODO: make test that iterates up to COUNT and ensures all values are wrapped
         .value("COUNT", Water::COUNT)
     ;
+    mod.def("pressure_from_depth", &PressureFromDepth, py::arg("depth"), py::arg("water"));
+    mod.def("depth_from_pressure", &DepthFromPressure, py::arg("pressure"), py::arg("water"));
+    // deco/buhlmann
+    py::enum_<deco::buhlmann::Model>(mod, "Model")
+        .value("ZHL_16A", deco::buhlmann::Model::ZHL_16A)
+    ;
+    py::class_<deco::buhlmann::Compartment::Params>(mod, "CompartmentParams")
+        .def(py::init<Time>(), py::arg("half_life"))
+        .def_readonly("half_life", &deco::buhlmann::Compartment::Params::halfLife)
+        .def_readonly("a", &deco::buhlmann::Compartment::Params::a)
+        .def_property_readonly("b", [](const deco::buhlmann::Compartment::Params& params) { return params.b(); })
+    ;
+    // half lives of each compartment
+    mod.def("get_compartment_list", [](deco::buhlmann::Model model) { return *deco::buhlmann::GetCompartmentList(model); });
     // Result.h
+    py::enum_<Result::Field>(mod, "ResultField", py::arithmetic())
+        .value("AMBIENT_PRESSURE", Result::AMBIENT_PRESSURE)
+        .value("TANK_PRESSURE", Result::TANK_PRESSURE)
+        .value("CEILING", Result::CEILING)
+        .value("GRADIENT", Result::GRADIENT)
+        .value("M0S", Result::M0S)
+        .value("TISSUE_PRESSURES", Result::TISSUE_PRESSURES)
+        .value("CEILINGS", Result::CEILINGS)
+        .value("GRADIENTS", Result::GRADIENTS)
+        .value("DECO", Result::DECO)
+        .value("ALL", Result::ALL)
+    ;
+    py::class_<Result::Config>(mod, "ResultConfig")
+        .def(py::init<>())
+        .def(py::init<Time, unsigned>())
+        .def_readwrite("interval", &Result::Config::interval)
+        .def_readwrite("fields", &Result::Config::fields)
+    ;
+    // arrays are exposed as read-only views into the result, never copied
     py::class_<Result::Deco>(mod, "Deco")
-        .def_readonly("ceiling", &Result::Deco::ceiling)
-        .def_readonly("gradient", &Result::Deco::gradient)
-        .def_readonly("M0s", &Result::Deco::M0s)
-        .def_readonly("tissue_pressures", &Result::Deco::tissuePressures)
-        .def_readonly("ceilings", &Result::Deco::ceilings)
-        .def_readonly("gradients", &Result::Deco::gradients)
+        .def_property_readonly("ceiling", ViewOf(&Result::Deco::ceiling))
+        .def_property_readonly("gradient", ViewOf(&Result::Deco::gradient))
+        .def_property_readonly("M0s", ViewOf(&Result::Deco::M0s))
+        .def_property_readonly("tissue_pressures", ViewOf(&Result::Deco::tissuePressures))
+        .def_property_readonly("ceilings", ViewOf(&Result::Deco::ceilings))
+        .def_property_readonly("gradients", ViewOf(&Result::Deco::gradients))
     ;
     py::class_<Result>(mod, "Result")
         .def(py::init<const Plan&>())
-        .def_readonly("time", &Result::time)
-        .def_readonly("depth", &Result::depth)
-        .def_readonly("ambient_pressure", &Result::ambientPressure)
-        .def_readonly("tank_pressure", &Result::tankPressure)
+        .def(py::init<const Plan&, const Result::Config&>())
+        // `previous` has to outlive the constructor only, nothing is kept from it
+        .def(py::init<const Plan&, const Result::Config&, const Result*>(), py::arg("plan"), py::arg("config"), py::arg("previous"))
+        .def_readonly("fields", &Result::fields)
+        .def_property_readonly("time", ViewOf(&Result::time))
+        .def_property_readonly("depth", ViewOf(&Result::depth))
+        .def_property_readonly("ambient_pressure", ViewOf(&Result::ambientPressure))
+        .def_property_readonly("tank_pressure", [](py::object self) {
+            py::dict views;
+            for (const auto& [name, pressure] : self.cast<const Result&>().tankPressure) {
+                views[py::str(name)] = ReadOnlyView(pressure, self);
+            }
+            return views;
+        })
         .def_readonly("deco", &Result::deco)
     ;
+    py::class_<ResultStream>(mod, "ResultStream")
+        .def(py::init<const Plan&, const Result::Config&, size_t>(), py::arg("plan"), py::arg("config"), py::arg("chunk_size"))
+        .def("__iter__", [](ResultStream& self) -> ResultStream& { return self; })
+        .def("__next__", [](ResultStream& self) {
+            if (self.done()) {
+                throw py::stop_iteration();
+            }
+            return self.next();
+        })
+        .def("done", &ResultStream::done)
+        .def_property_readonly("sample_count", &ResultStream::sampleCount)
+        .def_property_readonly("chunk_size", &ResultStream::chunkSize)
+        .def_property_readonly("state", &ResultStream::state)
+    ;
+    mod.def("segment_usage", &SegmentUsage);
+    // utils.h
+    // the interpolation Result samples the depth profile with, so python can put other data on the
+    // same time grid and get the same numbers. the web plots don't use it: their downsampling keeps
+    // a subset of the actual samples instead of resampling (see `downsample` in web/plot.py)
+    mod.def("interpolate",
+        py::overload_cast<Eigen::Ref<const Eigen::VectorXd>, Eigen::Ref<const Eigen::VectorXd>, Eigen::Ref<const Eigen::VectorXd>>(&Interpolate),
+        py::arg("xp"), py::arg("yp"), py::arg("x"));
+    // writes into `out` in place, which must be a contiguous float64 array
+    mod.def("interpolate",
+        py::overload_cast<Eigen::Ref<const Eigen::VectorXd>, Eigen::Ref<const Eigen::VectorXd>, Eigen::Ref<const Eigen::VectorXd>, Eigen::Ref<Eigen::VectorXd>>(&Interpolate),
+        py::arg("xp"), py::arg("yp"), py::arg("x"), py::arg("out").noconvert());
+    // Checkpoint.h
+    py::class_<Checkpoint>(mod, "Checkpoint")
+        .def_readonly("hash", &Checkpoint::hash)
+        .def_readonly("time", &Checkpoint::time)
+        .def_property_readonly("pressures", ViewOf(&Checkpoint::pressures))
+    ;
+    py::class_<CheckpointCache>(mod, "CheckpointCache")
+        .def(py::init<size_t>(), py::arg("capacity") = 4096)
+        .def("__len__", &CheckpointCache::size)
+        .def_property_readonly("capacity", &CheckpointCache::capacity)
+        .def_property_readonly("hits", &CheckpointCache::hits)
+        .def_property_readonly("misses", &CheckpointCache::misses)
+    ;
+    // Stats.h
+    py::enum_<Stats::Phase>(mod, "StatsPhase")
+        .value("PARSE", Stats::PARSE)
+        .value("FINALIZE", Stats::FINALIZE)
+        .value("REPLAN", Stats::REPLAN)
+        .value("REPLAN_FORWARD", Stats::REPLAN_FORWARD)
+        .value("REPLAN_ASCENT", Stats::REPLAN_ASCENT)
+        .value("SUMMARIZE", Stats::SUMMARIZE)
+        .value("RESULT", Stats::RESULT)
+        .value("RESULT_TANK_PRESSURE", Stats::RESULT_TANK_PRESSURE)
+        .value("RESULT_DECO", Stats::RESULT_DECO)
+        .value("CONVERT", Stats::CONVERT)
+    ;
+    mod.def("enable_stats", &EnableStats, py::arg("enabled") = true);
+    mod.def("stats_enabled", &StatsEnabled);
+    mod.def("reset_stats", &ResetStats);
+    mod.def("add_timing", &AddTiming, py::arg("phase"), py::arg("seconds"));
+    // plain dicts, ready for json
+    mod.def("stats", []() {
+        const Stats stats = GetStats();
+        py::dict phases;
+        for (const auto& [name, timing] : stats.phases) {
+            phases[py::str(name)] = py::dict(py::arg("calls") = timing.calls, py::arg("seconds") = timing.seconds);
+        }
+        return py::dict(py::arg("counters") = stats.counters, py::arg("phases") = phases);
+    });
     // Planner.h
-    mod.def("replan", &Replan);
+    py::class_<ReplanOptions>(mod, "ReplanOptions")
+        .def(py::init<>())
+        .def(py::init<Pressure, Depth>(), py::arg("max_deco_ppO2"), py::arg("stop_depth_inc"))
+        .def_readwrite("max_deco_ppO2", &ReplanOptions::maxDecoPpO2)
+        .def_readwrite("stop_depth_inc", &ReplanOptions::stopDepthInc)
+    ;
+    mod.def("replan", &Replan, py::arg("input"), py::arg("cache") = nullptr, py::arg("options") = ReplanOptions{});
+    py::class_<Summary::Stop>(mod, "Stop")
+        .def_readonly("depth", &Summary::Stop::depth)
+        .def_readonly("duration", &Summary::Stop::duration)
+        .def_readonly("tank", &Summary::Stop::tank)
+    ;
+    py::class_<Summary>(mod, "Summary")
+        .def_readonly("runtime", &Summary::runtime)
+        .def_readonly("stops", &Summary::stops)
+        .def_readonly("gas_used", &Summary::gasUsed)
+        .def_readonly("max_gradient", &Summary::maxGradient)
+    ;
+    mod.def("summarize", &Summarize);
+    // plans are copied out of python before the gil is released, so python is free to run while
+    // the pool works
+    mod.def("replan_many", &ReplanMany, py::arg("inputs"), py::arg("thread_count") = 0, py::arg("cache") = nullptr,
+            py::arg("options") = ReplanOptions{}, py::call_guard<py::gil_scoped_release>());
 
 }
 // clang-format on
@@ -3,6 +3,7 @@
 
 using namespace bungee;
 using namespace bungee::deco::buhlmann;
+using namespace units::literals;
 
 class TestGetters : public ::testing::Test {
 public:
@@ -21,19 +22,106 @@ public:
 
 TEST_F(TestGetters, M0s)
 {
-    const std::vector<Pressure> m0s = buhlmann->M0s();
-    ASSERT_EQ(m0s.size(), buhlmann->compartmentCount());
+    Eigen::VectorXd m0s(buhlmann->compartmentCount());
+    buhlmann->M0s(m0s);
     for (size_t i = 0; i < buhlmann->compartmentCount(); ++i) {
         const Compartment::Params params(GetCompartmentList(Model::ZHL_16A)->at(i));
         const Pressure expectedM0 = (Pressure(i) - params.a) * params.b;
-        EXPECT_EQ(m0s[i], expectedM0);
+        EXPECT_NEAR(m0s[i], expectedM0(), 1e-12);
     }
 }
 
 TEST_F(TestGetters, M0)
 {
-    const std::vector<Pressure> m0s = buhlmann->M0s();
-    EXPECT_EQ(buhlmann->M0(), m0s.back());
+    Eigen::VectorXd m0s(buhlmann->compartmentCount());
+    buhlmann->M0s(m0s);
+    EXPECT_EQ(buhlmann->M0()(), m0s[m0s.size() - 1]);
+}
+
+TEST_F(TestGetters, MatrixColumn)
+{
+    // queries write straight into a column of a result matrix
+    Eigen::MatrixXd pressures = Eigen::MatrixXd::Zero(buhlmann->compartmentCount(), 3);
+    pressures.col(1) = buhlmann->pressures();
+    buhlmann->gradientsAtDepth(0_m, pressures.col(2));
+    for (size_t i = 0; i < buhlmann->compartmentCount(); ++i) {
+        EXPECT_EQ(pressures(i, 0), 0);
+        EXPECT_EQ(pressures(i, 1), i);
+    }
+    EXPECT_EQ(pressures.col(2).maxCoeff(), buhlmann->gradientAtDepth(0_m)());
 }
 
 TEST_F(TestGetters, gfs) {}
+
+TEST(Buhlmann, CeilingInvalidState)
+{
+    // tissue pressures this far below zero are below their own M0, which no ceiling makes sense for
+    Buhlmann buhlmann(Buhlmann::Params{Water::FRESH, Model::ZHL_16A});
+    const std::vector<Pressure> pressures(buhlmann.compartmentCount(), Pressure(-100.0));
+    buhlmann.setCompartmentPressures(pressures);
+    Eigen::VectorXd ceilings(buhlmann.compartmentCount());
+    EXPECT_THROW(buhlmann.ceilings(1.0, ceilings), std::logic_error);
+    EXPECT_THROW(buhlmann.ceiling(1.0), std::logic_error);
+}
+
+TEST(Buhlmann, MatchesCompartment)
+{
+    // the vectorized model must agree with the scalar reference implementation
+    Buhlmann buhlmann(Buhlmann::Params{Water::FRESH, Model::ZHL_16A});
+    buhlmann.equilibrium(SURFACE_AIR_PP);
+    std::vector<Compartment> compartments;
+    for (const Time halfLife : *GetCompartmentList(Model::ZHL_16A)) {
+        compartments.emplace_back(Compartment::Params(halfLife));
+        compartments.back().set(SURFACE_AIR_PP.N2);
+    }
+
+    const Mix mix(0.32);
+    const auto surface = mix.partialPressure(0_m, Water::FRESH);
+    const auto bottom = mix.partialPressure(30_m, Water::FRESH);
+    buhlmann.variablePressureUpdate(surface, bottom, 3_min);
+    buhlmann.constantPressureUpdate(bottom, 25_min);
+    buhlmann.variablePressureUpdate(bottom, surface, 10_min);
+    for (auto& compartment : compartments) {
+        compartment.variablePressureUpdate(surface.N2, bottom.N2, 3_min);
+        compartment.constantPressureUpdate(bottom.N2, 25_min);
+        compartment.variablePressureUpdate(bottom.N2, surface.N2, 10_min);
+    }
+
+    Eigen::VectorXd m0s(buhlmann.compartmentCount());
+    buhlmann.M0s(m0s);
+    for (size_t i = 0; i < compartments.size(); ++i) {
+        EXPECT_NEAR(buhlmann.pressures()[i], compartments[i].pressure()(), 1e-12);
+        EXPECT_NEAR(m0s[i], compartments[i].M0()(), 1e-12);
+    }
+}
+
+TEST(Buhlmann, ClearTime)
+{
+    // the solved stop time must agree with stepping through the stop
+    Buhlmann buhlmann(Buhlmann::Params{Water::FRESH, Model::ZHL_16A});
+    buhlmann.equilibrium(SURFACE_AIR_PP);
+    const Mix mix(0.21);
+    const auto surface = mix.partialPressure(0_m, Water::FRESH);
+    const auto bottom = mix.partialPressure(40_m, Water::FRESH);
+    buhlmann.variablePressureUpdate(surface, bottom, 2_min);
+    buhlmann.constantPressureUpdate(bottom, 30_min);
+    const auto stop = mix.partialPressure(9_m, Water::FRESH);
+    buhlmann.variablePressureUpdate(bottom, stop, 4_min);
+
+    const Depth next = 6_m;
+    const auto end = mix.partialPressure(next, Water::FRESH);
+    const double gf = 0.7;
+    const std::optional<Time> clearTime = buhlmann.clearTime(stop, end, 1_min, next, gf);
+    ASSERT_TRUE(clearTime.has_value());
+    ASSERT_GT(clearTime.value(), 0_s);
+
+    auto gradientAfter = [&](const Time stay) {
+        Buhlmann test(buhlmann);
+        test.constantPressureUpdate(stop, stay);
+        test.variablePressureUpdate(stop, end, 1_min);
+        return test.gradientAtDepth(next);
+    };
+    EXPECT_NEAR(gradientAfter(clearTime.value()), gf, 1e-9);
+    EXPECT_GT(gradientAfter(clearTime.value() - 1_s), gf);
+    EXPECT_LT(gradientAfter(clearTime.value() + 1_s), gf);
+}
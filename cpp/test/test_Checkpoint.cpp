@@ -0,0 +1,89 @@
+#include "utils.h"
+#include <bungee/Checkpoint.h>
+#include <bungee/Planner.h>
+
+using namespace bungee;
+using namespace units::literals;
+
+namespace {
+
+Plan MakePlan(Time bottomTime, double fO2 = 0.21, VolumeRate scr = 20_L_per_min)
+{
+    Plan plan(
+        Water::SALT,
+        {.low = 0.5, .high = 0.8},
+        {.work = scr, .deco = 15_L_per_min},
+        {{"back", {Tank::AL80, 200_bar, Mix(fO2)}}, {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+    plan.setTank("back");
+    plan.addSegment(3_min, 40_m);
+    plan.addSegment(10_min, 40_m);
+    plan.addSegment(2_min, 30_m);
+    plan.addSegment(bottomTime, 30_m);
+    plan.finalize();
+    return plan;
+}
+
+} // namespace
+
+TEST(PrefixHashes, SharedPrefix)
+{
+    const std::vector<uint64_t> a = PrefixHashes(MakePlan(10_min));
+    const std::vector<uint64_t> b = PrefixHashes(MakePlan(15_min));
+    ASSERT_EQ(a.size(), 5);
+    ASSERT_EQ(b.size(), 5);
+    for (size_t i = 0; i < 4; ++i) {
+        EXPECT_EQ(a[i], b[i]);
+    }
+    EXPECT_NE(a[4], b[4]);
+    // the mix changes everything after the start
+    const std::vector<uint64_t> c = PrefixHashes(MakePlan(10_min, 0.32));
+    EXPECT_EQ(a[0], c[0]);
+    EXPECT_NE(a[1], c[1]);
+    // gas consumption doesn't matter to the tissues
+    EXPECT_EQ(a, PrefixHashes(MakePlan(10_min, 0.21, 25_L_per_min)));
+}
+
+TEST(CheckpointCache, FindLatest)
+{
+    const Plan plan = MakePlan(10_min);
+    const std::vector<uint64_t> hashes = PrefixHashes(plan);
+    CheckpointCache cache(2);
+    EXPECT_FALSE(cache.find(hashes).has_value());
+    EXPECT_EQ(cache.misses(), 1);
+
+    cache.insert({hashes[1], 3_min, Eigen::VectorXd::Constant(16, 1.0)});
+    cache.insert({hashes[3], 15_min, Eigen::VectorXd::Constant(16, 3.0)});
+    const auto found = cache.find(hashes);
+    ASSERT_TRUE(found.has_value());
+    EXPECT_EQ(found->first, 3);
+    EXPECT_EQ(found->second.pressures[0], 3.0);
+    EXPECT_EQ(cache.hits(), 1);
+
+    // the least recently used entry goes first
+    cache.find({hashes[1]});
+    cache.insert({hashes[2], 13_min, Eigen::VectorXd::Constant(16, 2.0)});
+    EXPECT_EQ(cache.size(), 2);
+    EXPECT_EQ(cache.find(hashes)->first, 2);
+    EXPECT_EQ(cache.find({hashes[0], hashes[1]})->first, 1);
+}
+
+TEST(Replan, Cache)
+{
+    CheckpointCache cache;
+    for (const Time bottomTime : {10_min, 20_min, 10_min}) {
+        const Plan input = MakePlan(bottomTime);
+        const Plan expected = Replan(input);
+        const Plan output = Replan(input, &cache);
+        ASSERT_EQ(output.profile().size(), expected.profile().size());
+        for (size_t i = 0; i < output.profile().size(); ++i) {
+            EXPECT_EQ(output.profile()[i].time, expected.profile()[i].time);
+            EXPECT_EQ(output.profile()[i].depth, expected.profile()[i].depth);
+            EXPECT_EQ(output.profile()[i].tank, expected.profile()[i].tank);
+        }
+    }
+    // the second plan picks up from the first at the end of the 40 m segment, and the third finds
+    // all of its points
+    EXPECT_EQ(cache.misses(), 1);
+    EXPECT_EQ(cache.hits(), 2);
+    EXPECT_EQ(cache.size(), 5);
+}
@@ -12,3 +12,43 @@ TEST(Params, HalfLife)
     compartment.constantPressureUpdate(10_bar, 10_min);
     EXPECT_UNIT_NEAR(compartment.pressure(), 5_bar, 0.05_bar);
 }
+
+TEST(Compartment, VariablePressureUpdateConstant)
+{
+    const Compartment::Params params(10_min);
+    Compartment variable(params), constant(params);
+    variable.set(1_bar);
+    constant.set(1_bar);
+    variable.variablePressureUpdate(3_bar, 3_bar, 7_min);
+    constant.constantPressureUpdate(3_bar, 7_min);
+    EXPECT_UNIT_NEAR(variable.pressure(), constant.pressure(), 1e-12_bar);
+}
+
+TEST(Compartment, VariablePressureUpdateSplit)
+{
+    // the closed form must not depend on how a linear ramp is subdivided
+    const Compartment::Params params(5_min);
+    Compartment whole(params), split(params);
+    whole.set(1_bar);
+    split.set(1_bar);
+    whole.variablePressureUpdate(4_bar, 1_bar, 6_min);
+    split.variablePressureUpdate(4_bar, 3_bar, 2_min);
+    split.variablePressureUpdate(3_bar, 1_bar, 4_min);
+    EXPECT_UNIT_NEAR(whole.pressure(), split.pressure(), 1e-12_bar);
+}
+
+TEST(Compartment, VariablePressureUpdateStepping)
+{
+    // small constant pressure steps at the average pressure converge on the exact solution
+    const Compartment::Params params(4_min);
+    Compartment exact(params), stepped(params);
+    exact.set(1_bar);
+    stepped.set(1_bar);
+    exact.variablePressureUpdate(1_bar, 5_bar, 4_min);
+    constexpr size_t STEPS = 2400;
+    for (size_t i = 0; i < STEPS; ++i) {
+        const units::pressure::bar_t pressure(1. + 4. * (i + 0.5) / STEPS);
+        stepped.constantPressureUpdate(pressure, 4_min / double(STEPS));
+    }
+    EXPECT_UNIT_NEAR(exact.pressure(), stepped.pressure(), 1e-6_bar);
+}
@@ -10,3 +10,99 @@ TEST(PlanPoint, validate)
     EXPECT_ANY_THROW(Plan::Point(-1_s, 0_m, "").validate());
     EXPECT_ANY_THROW(Plan::Point(0_s, -1_m, "").validate());
 }
+
+class TestTanks : public ::testing::Test {
+public:
+    void SetUp()
+    {
+        plan = std::make_shared<Plan>(Water::SALT,
+                                      Plan::GradientFactor{.low = 0.5, .high = 0.8},
+                                      Plan::Scr{.work = 20_L_per_min, .deco = 15_L_per_min},
+                                      Plan::TankLoadout{{"back", {Tank::AL80, 200_bar, Mix(0.21)}},
+                                                        {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+        plan->setTank("back");
+        plan->addSegment(3_min, 30_m);
+        plan->addSegment(20_min, 30_m);
+        plan->addSegment(3_min, 21_m);
+        plan->setTank("deco");
+        plan->addSegment(5_min, 21_m);
+        plan->addSegment(3_min, 0_m);
+        plan->finalize();
+    }
+
+    std::shared_ptr<Plan> plan;
+};
+
+TEST_F(TestTanks, Ids)
+{
+    ASSERT_EQ(plan->tankCount(), 2);
+    for (size_t id = 0; id < plan->tankCount(); ++id) {
+        EXPECT_EQ(plan->tankId(plan->tankName(id)), id);
+    }
+    EXPECT_EQ(plan->tankConfig(plan->tankId("deco")).type, Tank::AL40);
+    EXPECT_ANY_THROW(plan->tankId("stage"));
+    EXPECT_ANY_THROW(plan->tankName(2));
+
+    ASSERT_EQ(plan->tankIds().size(), plan->profile().size());
+    for (size_t i = 0; i < plan->profile().size(); ++i) {
+        EXPECT_EQ(plan->tankName(plan->tankIds()[i]), plan->profile()[i].tank);
+    }
+}
+
+TEST_F(TestTanks, SegmentAtTime)
+{
+    EXPECT_EQ(plan->segmentAtTime(0_min), 0);
+    EXPECT_EQ(plan->segmentAtTime(2_min), 0);
+    // points shared by 2 segments belong to the later one
+    EXPECT_EQ(plan->segmentAtTime(3_min), 1);
+    EXPECT_EQ(plan->segmentAtTime(26_min), 3);
+    // except at the end
+    EXPECT_EQ(plan->segmentAtTime(34_min), 4);
+    EXPECT_ANY_THROW(plan->segmentAtTime(-1_min));
+    EXPECT_ANY_THROW(plan->segmentAtTime(35_min));
+
+    // walking with a cursor agrees with searching, including when the hint is ahead
+    size_t seg = 0;
+    for (Time time = 0_min; time <= 34_min; time += 30_s) {
+        const size_t expected = plan->segmentAtTime(time);
+        seg = plan->segmentAtTime(time, seg);
+        EXPECT_EQ(seg, expected);
+        EXPECT_EQ(plan->segmentAtTime(time, 4), expected);
+    }
+
+    EXPECT_EQ(plan->getTankAtTime(25_min), "back");
+    EXPECT_EQ(plan->getTankAtTime(26_min), "deco");
+}
+
+TEST(Plan, AddSegments)
+{
+    const Plan::TankLoadout tanks{{"back", {Tank::AL80, 200_bar, Mix(0.21)}},
+                                  {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}};
+    Plan expected(Water::SALT, {.low = 0.5, .high = 0.8}, {20_L_per_min, 15_L_per_min}, tanks);
+    expected.setTank("back");
+    expected.addSegment(3_min, 30_m);
+    expected.addSegment(20_min, 30_m);
+    expected.setTank("deco");
+    expected.addSegment(3_min, 21_m);
+    expected.finalize();
+
+    Plan plan(Water::SALT, {.low = 0.5, .high = 0.8}, {20_L_per_min, 15_L_per_min}, tanks);
+    Eigen::VectorXd durations(3), depths(3);
+    durations << 3, 20, 3;
+    depths << 30, 30, 21;
+    plan.addSegments(durations, depths, {"back", "", "deco"});
+    plan.finalize();
+
+    ASSERT_EQ(plan.profile().size(), expected.profile().size());
+    for (size_t i = 0; i < plan.profile().size(); ++i) {
+        EXPECT_EQ(plan.profile()[i].time, expected.profile()[i].time);
+        EXPECT_EQ(plan.profile()[i].depth, expected.profile()[i].depth);
+        EXPECT_EQ(plan.profile()[i].tank, expected.profile()[i].tank);
+    }
+
+    // sizes must match, and the first segment needs a tank
+    Plan bad(Water::SALT, {.low = 0.5, .high = 0.8}, {20_L_per_min, 15_L_per_min}, tanks);
+    EXPECT_ANY_THROW(bad.addSegments(durations, depths, {"back"}));
+    EXPECT_ANY_THROW(bad.addSegments(durations, depths.head(2)));
+    EXPECT_ANY_THROW(bad.addSegments(durations, depths));
+}
@@ -0,0 +1,114 @@
+#include "utils.h"
+#include <bungee/Planner.h>
+
+using namespace bungee;
+using namespace units::literals;
+
+namespace {
+
+Plan MakePlan(Time bottomTime, Depth depth)
+{
+    Plan plan(
+        Water::SALT,
+        {.low = 0.5, .high = 0.8},
+        {.work = 20_L_per_min, .deco = 15_L_per_min},
+        {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}, {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+    plan.setTank("back");
+    plan.addSegment(3_min, depth);
+    plan.addSegment(bottomTime, depth);
+    plan.finalize();
+    return plan;
+}
+
+} // namespace
+
+TEST(Summarize, Stops)
+{
+    const Plan input = MakePlan(25_min, 40_m);
+    const Plan output = Replan(input);
+    const Summary summary = Summarize(input, output);
+    // the ascent starts at the end of the user's profile
+    EXPECT_EQ(output.decoStart(), input.profile().size() - 1);
+
+    EXPECT_EQ(summary.runtime, output.profile().back().time);
+    ASSERT_FALSE(summary.stops.empty());
+    Time stopTime = 0_min;
+    for (const Summary::Stop& stop : summary.stops) {
+        EXPECT_GT(stop.depth, 0_m);
+        EXPECT_GT(stop.duration, 0_min);
+        stopTime += stop.duration;
+    }
+    EXPECT_LT(stopTime, summary.runtime - 28_min);
+    // shallowest stops are on the deco gas
+    EXPECT_EQ(summary.stops.back().tank, "deco");
+    EXPECT_GT(summary.gasUsed.at("back"), 0_bar);
+    EXPECT_GT(summary.gasUsed.at("deco"), 0_bar);
+    // gf high is only reached at the surface
+    EXPECT_LE(summary.maxGradient, 0.8 + 1e-9);
+}
+
+TEST(ReplanMany, MatchesReplan)
+{
+    std::vector<Plan> inputs;
+    for (const Time bottomTime : {10_min, 20_min, 30_min}) {
+        for (const Depth depth : {30_m, 45_m}) {
+            inputs.push_back(MakePlan(bottomTime, depth));
+        }
+    }
+    const std::vector<Summary> summaries = ReplanMany(inputs, 4);
+    ASSERT_EQ(summaries.size(), inputs.size());
+    for (size_t i = 0; i < inputs.size(); ++i) {
+        const Summary expected = Summarize(inputs[i], Replan(inputs[i]));
+        EXPECT_EQ(summaries[i].runtime, expected.runtime);
+        EXPECT_EQ(summaries[i].stops.size(), expected.stops.size());
+        EXPECT_EQ(summaries[i].maxGradient, expected.maxGradient);
+    }
+}
+
+TEST(ReplanMany, Empty) { EXPECT_TRUE(ReplanMany({}).empty()); }
+
+TEST(ReplanMany, Error)
+{
+    // nothing is breathable at the bottom
+    Plan plan(Water::SALT,
+              {.low = 0.5, .high = 0.8},
+              {.work = 20_L_per_min, .deco = 15_L_per_min},
+              {{"oxygen", {Tank::AL40, 200_bar, Mix(1.0)}}});
+    plan.setTank("oxygen");
+    plan.addSegment(3_min, 30_m);
+    plan.finalize();
+    EXPECT_ANY_THROW(ReplanMany({MakePlan(10_min, 30_m), plan}));
+}
+
+TEST(Replan, Options)
+{
+    const Plan input = MakePlan(40_min, 50_m);
+    const Summary standard = Summarize(input, Replan(input));
+
+    // 50% can't be breathed until 16 m at 1.3 bar instead of 22 m at 1.6 bar
+    auto deepestOnDeco = [](const Summary& summary) {
+        Depth deepest = 0_m;
+        for (const Summary::Stop& stop : summary.stops) {
+            if (stop.tank == "deco") {
+                deepest = units::math::max(deepest, stop.depth);
+            }
+        }
+        return deepest;
+    };
+    const Summary lean =
+        Summarize(input, Replan(input, nullptr, ReplanOptions{.maxDecoPpO2 = 1.3_bar}));
+    EXPECT_LT(deepestOnDeco(lean), deepestOnDeco(standard));
+    EXPECT_LE(deepestOnDeco(lean), 16_m);
+    EXPECT_GE(lean.runtime, standard.runtime);
+
+    const Summary metric =
+        Summarize(input, Replan(input, nullptr, ReplanOptions{.stopDepthInc = 3_m}));
+    for (const Summary::Stop& stop : metric.stops) {
+        const double multiple = (stop.depth / 3_m)();
+        EXPECT_NEAR(multiple, std::round(multiple), 1e-9);
+    }
+
+    EXPECT_ANY_THROW(Replan(input, nullptr, ReplanOptions{.stopDepthInc = 0_m}));
+    // nothing can be breathed at the bottom
+    EXPECT_ANY_THROW(Replan(input, nullptr, ReplanOptions{.maxDecoPpO2 = 1.2_bar}));
+}
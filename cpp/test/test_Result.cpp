@@ -1,5 +1,7 @@
 #include "utils.h"
+#include <bungee/Planner.h>
 #include <bungee/Result.h>
+#include <bungee/Scr.h>
 #include <bungee/utils.h>
 
 using namespace bungee;
@@ -19,9 +21,109 @@ TEST(Interpolate, Basic)
     }
 }
 
-TEST(Interpolate, FailBeyondEdges) {}
+TEST(GetSampleTimes, Remainder)
+{
+    const Eigen::VectorXd time = GetSampleTimes(10_min, 3_min);
+    ASSERT_EQ(time.size(), 5);
+    EXPECT_DOUBLE_EQ(time[3], 9);
+    EXPECT_DOUBLE_EQ(time[4], 10);
+    EXPECT_EQ(GetSampleTimes(10_min, 1_min).size(), 11);
+}
+
+TEST(Interpolate, FailBeyondEdges)
+{
+    Eigen::VectorXd xp(2), yp(2), x(1);
+    xp << 0, 1;
+    yp << 0, 1;
+    x << -0.1;
+    EXPECT_ANY_THROW(Interpolate(xp, yp, x));
+    x << 1.1;
+    EXPECT_ANY_THROW(Interpolate(xp, yp, x));
+}
 
-TEST(Interpolate, IncreasingXp) {}
+TEST(Interpolate, IncreasingXp)
+{
+    Eigen::VectorXd xp(3), yp(3), x(1);
+    xp << 0, 1, 1;
+    yp << 0, 1, 2;
+    x << 0.5;
+    EXPECT_ANY_THROW(Interpolate(xp, yp, x));
+}
+
+TEST(Interpolate, Unsorted)
+{
+    // samples that jump backwards are still found
+    Eigen::VectorXd xp(4), yp(4), x(6), expected(6);
+    xp << 0, 1, 2, 4;
+    yp << 0, -1, 1, 5;
+    x << 3, 0.5, 4, 1, 0, 1.5;
+    expected << 3, -0.5, 5, -1, 0, 0;
+    Eigen::VectorXd y(x.size());
+    Interpolate(xp, yp, x, y);
+    for (size_t i = 0; i < x.size(); ++i) {
+        EXPECT_NEAR(y[i], expected[i], 1e-12);
+    }
+    Eigen::VectorXd wrongSize(x.size() - 1);
+    EXPECT_ANY_THROW(Interpolate(xp, yp, x, wrongSize));
+}
+
+TEST(GetDeco, SampleIndependent)
+{
+    Plan plan(
+        Water::SALT,
+        {.low = 0.5, .high = 0.8},
+        {.work = 20_L_per_min, .deco = 15_L_per_min},
+        {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}, {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+    plan.setTank("back");
+    plan.addSegment(3_min, 40_m);
+    plan.addSegment(20_min, 40_m);
+    plan.addSegment(4_min, 21_m);
+    plan.setTank("deco");
+    plan.addSegment(5_min, 21_m);
+    plan.addSegment(3_min, 0_m);
+    plan.finalize();
+
+    // sparse samples that don't line up with the plan points
+    Eigen::VectorXd sparseTime(4);
+    sparseTime << 0, 2.5, 24.25, 35;
+    const Eigen::VectorXd sparseDepth = Interpolate(plan.time(), plan.depth(), sparseTime);
+    const Result::Deco sparse = Result::GetDeco(plan, sparseTime, sparseDepth);
+
+    const Eigen::VectorXd denseTime = Eigen::VectorXd::LinSpaced(35 * 4 + 1, 0, 35);
+    const Eigen::VectorXd denseDepth = Interpolate(plan.time(), plan.depth(), denseTime);
+    const Result::Deco dense = Result::GetDeco(plan, denseTime, denseDepth);
+
+    const std::vector<size_t> denseIdxs = {0, 10, 97, 140};
+    for (size_t i = 0; i < denseIdxs.size(); ++i) {
+        ASSERT_DOUBLE_EQ(denseTime[denseIdxs[i]], sparseTime[i]);
+        EXPECT_NEAR(sparse.ceiling[i], dense.ceiling[denseIdxs[i]], 1e-9);
+        EXPECT_NEAR(sparse.gradient[i], dense.gradient[denseIdxs[i]], 1e-9);
+        EXPECT_TRUE(
+            sparse.tissuePressures.col(i).isApprox(dense.tissuePressures.col(denseIdxs[i]), 1e-12));
+    }
+}
+
+TEST(Result, Fields)
+{
+    Plan plan(Water::FRESH,
+              {.low = 0.5, .high = 0.8},
+              {.work = 20_L_per_min, .deco = 15_L_per_min},
+              {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}});
+    plan.setTank("back");
+    plan.addSegment(2_min, 20_m);
+    plan.addSegment(2_min, 0_m);
+    plan.finalize();
+
+    const Result result(plan,
+                        {.interval = 30_s, .fields = Result::CEILING | Result::TANK_PRESSURE});
+    EXPECT_EQ(result.time.size(), 9);
+    EXPECT_EQ(result.depth.size(), 9);
+    EXPECT_EQ(result.deco.ceiling.size(), 9);
+    EXPECT_EQ(result.tankPressure.at("back").size(), 9);
+    EXPECT_EQ(result.ambientPressure.size(), 0);
+    EXPECT_EQ(result.deco.gradient.size(), 0);
+    EXPECT_EQ(result.deco.tissuePressures.size(), 0);
+}
 
 TEST(Usage, NegativeDuration) { EXPECT_ANY_THROW(Usage(-1_s, 0_m, 1_L_per_min, Water::FRESH)); }
 
@@ -30,3 +132,148 @@ TEST(Usage, NegativeScr) { EXPECT_ANY_THROW(Usage(60_s, 0_m, -1_L_per_min, Water
 TEST(Usage, Surface) { EXPECT_EQ(Usage(60_s, 0_m, 10_L_per_min, Water::SALT), 10_L); }
 
 TEST(Usage, Depth) { EXPECT_UNIT_NEAR(Usage(60_s, 10_m, 10_L_per_min, Water::SALT), 20_L, 0.1_L); }
+
+TEST(Result, Previous)
+{
+    // same start, longer at the second depth
+    auto makePlan = [](Time bottomTime) {
+        Plan plan(Water::SALT,
+                  {.low = 0.5, .high = 0.8},
+                  {.work = 20_L_per_min, .deco = 15_L_per_min},
+                  {{"back", {Tank::AL80, 200_bar, Mix(0.21)}},
+                   {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+        plan.setTank("back");
+        plan.addSegment(3_min, 40_m);
+        plan.addSegment(10_min, 40_m);
+        plan.addSegment(2_min, 30_m);
+        plan.addSegment(bottomTime, 30_m);
+        plan.finalize();
+        return Replan(plan);
+    };
+    const Plan before = makePlan(10_min);
+    const Plan after = makePlan(20_min);
+    const Result::Config config{.interval = 30_s};
+    const Result previous(before, config);
+    ASSERT_EQ(previous.checkpoints.size(), before.profile().size());
+
+    const Result expected(after, config);
+    const Result resumed(after, config, &previous);
+    ASSERT_EQ(resumed.time.size(), expected.time.size());
+    ASSERT_EQ(resumed.checkpoints.size(), expected.checkpoints.size());
+    for (size_t i = 0; i < expected.checkpoints.size(); ++i) {
+        EXPECT_EQ(resumed.checkpoints[i].hash, expected.checkpoints[i].hash);
+        EXPECT_TRUE(
+            resumed.checkpoints[i].pressures.isApprox(expected.checkpoints[i].pressures, 1e-12));
+    }
+    EXPECT_TRUE(resumed.deco.tissuePressures.isApprox(expected.deco.tissuePressures, 1e-12));
+    EXPECT_TRUE(resumed.deco.ceilings.isApprox(expected.deco.ceilings, 1e-9));
+    EXPECT_TRUE(resumed.deco.gradient.isApprox(expected.deco.gradient, 1e-9));
+
+    // a result at a different spacing can't be reused, but is still right
+    const Result other(after, Result::Config{.interval = 20_s}, &previous);
+    const Result otherExpected(after, Result::Config{.interval = 20_s});
+    EXPECT_TRUE(other.deco.tissuePressures.isApprox(otherExpected.deco.tissuePressures, 1e-12));
+}
+
+TEST(GetTankPressure, SampleIndependent)
+{
+    Plan plan(
+        Water::SALT,
+        {.low = 0.5, .high = 0.8},
+        {.work = 20_L_per_min, .deco = 15_L_per_min},
+        {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}, {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+    plan.setTank("back");
+    plan.addSegment(3_min, 40_m);
+    plan.addSegment(20_min, 40_m);
+    plan.addSegment(4_min, 21_m);
+    plan.setTank("deco");
+    plan.addSegment(5_min, 21_m);
+    plan.addSegment(3_min, 0_m);
+    plan.finalize();
+
+    Eigen::VectorXd sparseTime(4);
+    sparseTime << 0, 1.5, 24.25, 35;
+    const auto sparse = Result::GetTankPressure(plan, sparseTime);
+    const Eigen::VectorXd denseTime = Eigen::VectorXd::LinSpaced(35 * 4 + 1, 0, 35);
+    const auto dense = Result::GetTankPressure(plan, denseTime);
+    const std::vector<size_t> denseIdxs = {0, 6, 97, 140};
+    for (const std::string name : {"back", "deco"}) {
+        for (size_t i = 0; i < denseIdxs.size(); ++i) {
+            EXPECT_NEAR(sparse.at(name)[i], dense.at(name)[denseIdxs[i]], 1e-9);
+        }
+    }
+}
+
+TEST(SegmentUsage, DecoScr)
+{
+    Plan plan(Water::FRESH,
+              {.low = 0.5, .high = 0.8},
+              {.work = 20_L_per_min, .deco = 10_L_per_min},
+              {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}});
+    plan.setTank("back");
+    plan.addSegment(2_min, 20_m);
+    plan.addSegment(10_min, 20_m);
+    plan.addSegment(5_min, 20_m);
+    plan.setDecoStart(2);
+    plan.finalize();
+
+    const Eigen::VectorXd usage = SegmentUsage(plan);
+    ASSERT_EQ(usage.size(), 3);
+    // same depth, half the scr
+    EXPECT_NEAR(usage[2] / 5, usage[1] / 10 / 2, 1e-9);
+    // the ramp uses the average of the rates at each end
+    const double surfaceRate = ScrAtDepth(20_L_per_min, 0_m, Water::FRESH)();
+    const double bottomRate = ScrAtDepth(20_L_per_min, 20_m, Water::FRESH)();
+    EXPECT_NEAR(usage[0], (surfaceRate + bottomRate) / 2 * 2, 1e-9);
+
+    const Eigen::VectorXd time = GetSampleTimes(17_min, 1_min);
+    const Eigen::VectorXd pressure = Result::GetTankPressure(plan, time).at("back");
+    const Tank::Params& params = GetTankParams(Tank::AL80);
+    EXPECT_NEAR(pressure[0], 200, 1e-9);
+    EXPECT_NEAR(pressure[17],
+                Tank::PressureAtVolume(
+                    params, Tank::VolumeAtPressure(params, 200_bar) - Volume(usage.sum()))(),
+                1e-9);
+}
+
+TEST(ResultStream, MatchesResult)
+{
+    Plan plan(
+        Water::SALT,
+        {.low = 0.5, .high = 0.8},
+        {.work = 20_L_per_min, .deco = 15_L_per_min},
+        {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}, {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+    plan.setTank("back");
+    plan.addSegment(3_min, 40_m);
+    plan.addSegment(25_min, 40_m);
+    plan.finalize();
+    const Plan output = Replan(plan);
+    const Result::Config config{.interval = 7_s};
+    const Result expected(output, config);
+
+    // chunks don't line up with the plan points or divide the number of samples
+    ResultStream stream(output, config, 37);
+    EXPECT_EQ(stream.sampleCount(), expected.time.size());
+    size_t offset = 0;
+    while (!stream.done()) {
+        const Result chunk = stream.next();
+        const size_t count = chunk.time.size();
+        ASSERT_LE(count, 37);
+        ASSERT_LE(offset + count, expected.time.size());
+        EXPECT_TRUE(chunk.time.isApprox(expected.time.segment(offset, count), 1e-12));
+        EXPECT_TRUE(chunk.depth.isApprox(expected.depth.segment(offset, count), 1e-12));
+        EXPECT_TRUE(chunk.tankPressure.at("back").isApprox(
+            expected.tankPressure.at("back").segment(offset, count), 1e-12));
+        EXPECT_TRUE(chunk.deco.tissuePressures.isApprox(
+            expected.deco.tissuePressures.middleCols(offset, count), 1e-12));
+        EXPECT_TRUE(
+            chunk.deco.ceilings.isApprox(expected.deco.ceilings.middleCols(offset, count), 1e-9));
+        for (size_t i = 0; i < count; ++i) {
+            EXPECT_NEAR(chunk.deco.gradient[i], expected.deco.gradient[offset + i], 1e-9);
+        }
+        offset += count;
+    }
+    EXPECT_EQ(offset, expected.time.size());
+    EXPECT_EQ(stream.state().time, output.profile().back().time);
+    EXPECT_ANY_THROW(stream.next());
+}
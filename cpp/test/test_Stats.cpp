@@ -0,0 +1,71 @@
+#include "utils.h"
+#include <bungee/Planner.h>
+#include <bungee/Result.h>
+#include <bungee/Stats.h>
+
+using namespace bungee;
+using namespace units::literals;
+
+namespace {
+
+Plan MakePlan()
+{
+    Plan plan(
+        Water::SALT,
+        {.low = 0.5, .high = 0.8},
+        {.work = 20_L_per_min, .deco = 15_L_per_min},
+        {{"back", {Tank::AL80, 200_bar, Mix(0.21)}}, {"deco", {Tank::AL40, 200_bar, Mix(0.5)}}});
+    plan.setTank("back");
+    plan.addSegment(3_min, 40_m);
+    plan.addSegment(20_min, 40_m);
+    plan.finalize();
+    return plan;
+}
+
+} // namespace
+
+TEST(Stats, Disabled)
+{
+    EnableStats(false);
+    ResetStats();
+    const Plan output = Replan(MakePlan());
+    const Result result(output);
+    const Stats stats = GetStats();
+    for (const auto& [name, count] : stats.counters) {
+        EXPECT_EQ(count, 0) << name;
+    }
+    for (const auto& [name, timing] : stats.phases) {
+        EXPECT_EQ(timing.calls, 0) << name;
+    }
+}
+
+TEST(Stats, Enabled)
+{
+    ResetStats();
+    EnableStats();
+    const Plan output = Replan(MakePlan());
+    const Result result(output, Result::Config{.interval = 1_min});
+    AddTiming(Stats::PARSE, 0.5);
+    EnableStats(false);
+
+    const Stats stats = GetStats();
+    EXPECT_EQ(stats.counters.size(), Stats::COUNTER_COUNT);
+    EXPECT_EQ(stats.phases.size(), Stats::PHASE_COUNT);
+    EXPECT_GT(stats.counters.at("model_updates"), 0);
+    EXPECT_GT(stats.counters.at("model_copies"), 0);
+    EXPECT_GT(stats.counters.at("stop_solves"), 0);
+    EXPECT_EQ(stats.counters.at("result_samples"), result.time.size());
+    EXPECT_EQ(stats.phases.at("replan").calls, 1);
+    EXPECT_EQ(stats.phases.at("replan_forward").calls, 1);
+    EXPECT_EQ(stats.phases.at("replan_ascent").calls, 1);
+    EXPECT_EQ(stats.phases.at("result").calls, 1);
+    EXPECT_EQ(stats.phases.at("result_deco").calls, 1);
+    EXPECT_GT(stats.phases.at("replan").seconds, 0);
+    EXPECT_GE(stats.phases.at("replan").seconds, stats.phases.at("replan_ascent").seconds);
+    EXPECT_NEAR(stats.phases.at("parse").seconds, 0.5, 1e-9);
+    // input and output plans
+    EXPECT_EQ(stats.phases.at("finalize").calls, 2);
+
+    ResetStats();
+    EXPECT_EQ(GetStats().counters.at("model_updates"), 0);
+}
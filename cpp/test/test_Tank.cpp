@@ -44,6 +44,17 @@ TEST(Tank, ServiceVolume)
     EXPECT_EQ(half.serviceVolume(), full.volume());
 }
 
+TEST(Tank, PressureAtVolumeVector)
+{
+    const Tank::Params& params = GetTankParams(Tank::AL80);
+    Eigen::VectorXd volume(3);
+    volume << 0, 500, 2000;
+    const Eigen::VectorXd pressure = Tank::PressureAtVolume(params, volume);
+    for (size_t i = 0; i < volume.size(); ++i) {
+        EXPECT_NEAR(pressure[i], Tank::PressureAtVolume(params, Volume(volume[i]))(), 1e-9);
+    }
+}
+
 // TEST(Tank, VolumePressureStaticMethodRoundTrip)
 // {
 //     const Tank::Params params{.size = 10_L, .servicePressure};
@@ -0,0 +1,338 @@
+"""Benchmarks for the hot paths, compared against a stored baseline.
+
+Run from the py directory:
+
+    python -m bench                  # run everything and compare against the baseline
+    python -m bench --only replan    # only cases with "replan" in the name
+    python -m bench --save           # overwrite the baseline with this run
+    python -m bench --check          # exit nonzero if anything regressed
+    python -m bench --cpp $BUILD_DIR # include the C++ benchmarks built in $BUILD_DIR
+
+The C++ benchmarks should come from a release build (./build makes one in $BUILD_DIR/release). The
+baseline records which build type its C++ numbers came from, and comparing against a different one
+is refused, as a debug build is several times slower for reasons that have nothing to do with the
+code under test.
+
+Every case runs in its own interpreter so that memory numbers aren't polluted by earlier cases.
+Peak memory is reported twice: the peak of Python-tracked allocations during the case (which
+includes numpy arrays, but not memory owned by bungee), and the growth in the process's peak RSS
+(which includes everything, but only counts the amount by which the case went past the setup's
+own high water mark).
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+from bench.plans import PLANS
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+WEB_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "..", "web"))
+
+# a case is slower or bigger than the baseline by more than this factor
+REGRESSION_FACTOR = 1.25
+# don't flag changes in memory smaller than this [KiB]
+MEMORY_NOISE = 256
+
+
+def _import_plot():
+    sys.path.insert(0, WEB_DIR)
+    import plot
+
+    return plot
+
+
+# Each case is a function taking the name of a synthetic plan and returning a callable that runs
+# the thing being benchmarked. Anything done before returning the callable is setup and is not
+# measured.
+
+
+def _case_parse(plan_name):
+    import cenote
+
+    data = PLANS[plan_name]()
+    return lambda: cenote.plan_from_dict(data)
+
+
+def _case_replan(plan_name):
+    import bungee
+    import cenote
+
+    plan = cenote.plan_from_dict(PLANS[plan_name]())
+    return lambda: bungee.replan(plan)
+
+
+def _case_result(plan_name):
+    import bungee
+    import cenote
+
+    plan = bungee.replan(cenote.plan_from_dict(PLANS[plan_name]()))
+    return lambda: bungee.Result(plan)
+
+
+def _case_get_result(plan_name):
+    import bungee
+    import cenote
+
+    plan = bungee.replan(cenote.plan_from_dict(PLANS[plan_name]()))
+
+    def run():
+        result = cenote.get_result(plan)
+        # touch every field, in case any of them are lazy
+        result.ambient_pressure, result.tank_pressure
+        for name in ["ceiling", "gradient", "M0s", "tissue_pressures", "ceilings", "gradients"]:
+            getattr(result.deco, name)
+        return result
+
+    return run
+
+
+def _case_figures(plan_name):
+    import bungee
+    import cenote
+
+    plot = _import_plot()
+    plan = bungee.replan(cenote.plan_from_dict(PLANS[plan_name]()))
+    result = cenote.get_result(plan)
+
+    def run():
+        return [
+            plot.get_plan_df(
+                [(p.time.value(), p.depth.value(), p.tank) for p in plan.profile()], "min", "ft"
+            ),
+            plot.get_depth_fig(result, "min", "ft"),
+            plot.get_pressure_fig(result, "min", "psi"),
+            plot.get_gradient_fig(result, "min"),
+        ]
+
+    return run
+
+
+def _case_montecarlo(plan_name):
+    import bungee
+    import cenote
+    from cenote import montecarlo
+
+    plan = bungee.replan(cenote.plan_from_dict(PLANS[plan_name]()))
+    return lambda: montecarlo.simulate(
+        plan, count=1000, scr=0.1, depth="3 ft", duration=montecarlo.Uniform(0, "1 min"), seed=0
+    )
+
+
+def _case_tables(plan_name):
+    import bungee
+    from cenote import tables
+
+    data = PLANS[plan_name]()
+    # a small table, breathing whatever the plan starts on
+    return lambda: tables.make_deco_table(
+        data,
+        data["profile"][0]["tank"],
+        ["{} ft".format(depth) for depth in range(40, 160, 10)],
+        ["{} min".format(time) for time in range(10, 70, 10)],
+        cache=bungee.CheckpointCache(),
+    )
+
+
+def _case_import(module):
+    # a fresh interpreter every time, so nothing is imported already. this includes starting the
+    # interpreter and importing bungee, which is the floor the case can't go under
+    command = [sys.executable, "-c", "import bungee; import {}".format(module)]
+    return lambda: subprocess.run(command, check=True)
+
+
+CASE_KINDS = {
+    "parse": _case_parse,
+    "replan": _case_replan,
+    "result": _case_result,
+    "get_result": _case_get_result,
+    "figures": _case_figures,
+    "montecarlo": _case_montecarlo,
+    "tables": _case_tables,
+}
+
+
+# cases that don't take a plan, by name
+OTHER_CASES = {
+    "import/cenote": lambda: _case_import("cenote"),
+}
+
+
+def case_names() -> list:
+    return ["{}/{}".format(kind, plan) for kind in CASE_KINDS for plan in PLANS] + list(OTHER_CASES)
+
+
+def measure(name: str) -> dict:
+    """Run a single case in this process."""
+    if name in OTHER_CASES:
+        run = OTHER_CASES[name]()
+    else:
+        kind, plan_name = name.split("/")
+        run = CASE_KINDS[kind](plan_name)
+    # warm up caches and lazy imports so they aren't charged to the first timed run
+    run()
+
+    # memory, from a single run
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    run()
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # time, as the best of several repeats of enough calls to take a decent amount of time
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=number)) / number
+
+    return {
+        "time": best,
+        "py_peak_kib": py_peak / 1024,
+        # linux reports this in KiB
+        "rss_growth_kib": rss_after - rss_before,
+    }
+
+
+def measure_in_subprocess(name: str):
+    proc = subprocess.run(
+        [sys.executable, "-m", "bench", "--worker", name],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(BENCH_DIR),
+    )
+    if proc.returncode != 0:
+        # most likely a missing optional dependency, e.g. bokeh for the figures
+        last_line = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        print("{:<24} skipped: {}".format(name, last_line))
+        return None
+    return json.loads(proc.stdout)
+
+
+def measure_cpp(build_dir: str) -> dict:
+    """Run every bench_* executable in `build_dir`. Each one prints a json object mapping case
+    names to measurements."""
+    results = {}
+    for filename in sorted(os.listdir(build_dir)):
+        path = os.path.join(build_dir, filename)
+        if filename.startswith("bench_") and os.access(path, os.X_OK):
+            output = subprocess.run([path], check=True, capture_output=True, text=True).stdout
+            results.update(json.loads(output))
+    return results
+
+
+def cpp_build_type(build_dir: str) -> str:
+    """CMAKE_BUILD_TYPE of the cmake build in `build_dir`, or an empty string if it has none."""
+    try:
+        with open(os.path.join(build_dir, "CMakeCache.txt"), "r") as f:
+            for line in f:
+                if line.startswith("CMAKE_BUILD_TYPE:"):
+                    return line.split("=", 1)[1].strip()
+    except FileNotFoundError:
+        pass
+    return ""
+
+
+def compare(name: str, current: dict, baseline: dict) -> bool:
+    """Print a line comparing a case against the baseline. Returns True if it regressed."""
+    line = "{:<24} {:>12.3f} us".format(name, current["time"] * 1e6)
+    regressed = False
+    if baseline is None:
+        print(line + "  (no baseline)")
+        return False
+    ratio = current["time"] / baseline["time"]
+    line += " {:>6.2f}x".format(ratio)
+    if ratio > REGRESSION_FACTOR:
+        regressed = True
+        line += " SLOWER"
+    for key in ["py_peak_kib", "rss_growth_kib"]:
+        if key not in current:
+            continue
+        line += "  {} {:>9.0f} KiB".format(key.split("_kib")[0], current[key])
+        if key in baseline:
+            limit = max(baseline[key] * REGRESSION_FACTOR, baseline[key] + MEMORY_NOISE)
+            if current[key] > limit:
+                regressed = True
+                line += " BIGGER"
+    print(line)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", default="", help="only run cases containing this string")
+    parser.add_argument("--save", action="store_true", help="save results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit nonzero on regressions")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--cpp", metavar="BUILD_DIR", help="also run C++ benchmarks in this dir")
+    parser.add_argument("--worker", metavar="CASE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(measure(args.worker), sys.stdout)
+        return 0
+
+    baseline = {}
+    baseline_build_type = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            saved = json.load(f)
+        baseline = saved["cases"]
+        baseline_build_type = saved.get("cpp_build_type")
+
+    build_type = baseline_build_type
+    if args.cpp:
+        build_type = cpp_build_type(args.cpp)
+        if build_type != baseline_build_type:
+            if not args.save:
+                print(
+                    "C++ baseline has build type {}, but {} has build type {}".format(
+                        baseline_build_type or "unknown", args.cpp, build_type or "unknown"
+                    ),
+                    file=sys.stderr,
+                )
+                return 1
+            # don't keep numbers from the other build type around next to the new ones
+            baseline = {name: case for name, case in baseline.items() if name in case_names()}
+
+    results = {}
+    for name in case_names():
+        if args.only in name:
+            result = measure_in_subprocess(name)
+            if result is not None:
+                results[name] = result
+    if args.cpp:
+        results.update(
+            {name: result for name, result in measure_cpp(args.cpp).items() if args.only in name}
+        )
+
+    regressions = [
+        name for name, result in results.items() if compare(name, result, baseline.get(name))
+    ]
+
+    if args.save:
+        # keep baseline entries for cases that weren't run this time
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {"machine": os.uname().machine, "cpp_build_type": build_type, "cases": baseline},
+                f,
+                indent=4,
+                sort_keys=True,
+            )
+            f.write("\n")
+
+    if regressions:
+        print("\n{} regressed: {}".format(len(regressions), ", ".join(regressions)))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
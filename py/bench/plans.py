@@ -0,0 +1,93 @@
+"""Synthetic plans for benchmarking, as dicts in the format taken by `cenote.plan_from_dict`.
+
+Each generator covers a different way a plan can be expensive: long runtimes, many tanks, many
+waypoints, or lots of deco.
+"""
+
+
+def _plan(tanks: dict, profile: list, gf=(0.5, 0.8)) -> dict:
+    return {
+        "water": "FRESH",
+        "gf": {"low": gf[0], "high": gf[1]},
+        "scr": {"work": "0.7 ft^3 / min", "deco": "0.5 ft^3 / min"},
+        "tanks": tanks,
+        "profile": profile,
+    }
+
+
+def _tank(kind: str, pressure: str, fO2: float) -> dict:
+    return {"type": kind, "pressure": pressure, "mix": {"fO2": fO2}}
+
+
+def rec_dive() -> dict:
+    """Short no-stop dive on a single tank."""
+    return _plan(
+        {"back": _tank("AL80", "3000 psi", 0.32)},
+        [
+            {"depth": "60 ft", "duration": "2 min", "tank": "back"},
+            {"depth": "60 ft", "duration": "40 min"},
+        ],
+    )
+
+
+def cave_dive() -> dict:
+    """3 hour dive on doubles and two stages, wandering between depths in the cave, and ending
+    at depth so the planner adds the deco on the deco bottles."""
+    profile = [{"depth": "70 ft", "duration": "3 min", "tank": "back"}]
+    depths = [90, 110, 100, 120, 95, 105, 80]
+    for i in range(24):
+        depth = depths[i % len(depths)]
+        # switch to the stage for the middle of the dive
+        tank = "stage" if 6 <= i < 14 else "back"
+        profile.append({"depth": "{} ft".format(depth), "duration": "2 min", "tank": tank})
+        profile.append({"depth": "{} ft".format(depth), "duration": "5 min"})
+    return _plan(
+        {
+            "back": _tank("D_LP108", "3400 psi", 0.32),
+            "stage": _tank("AL80", "3000 psi", 0.32),
+            "deco50": _tank("AL40", "3000 psi", 0.5),
+            "deco100": _tank("AL40", "3000 psi", 0.97),
+        },
+        profile,
+    )
+
+
+def waypoints(count: int = 500) -> dict:
+    """Saw tooth profile with `count` one minute segments."""
+    profile = [{"depth": "80 ft", "duration": "4 min", "tank": "back"}]
+    for i in range(count - 1):
+        profile.append({"depth": "{} ft".format(80 + 10 * (i % 4)), "duration": "1 min"})
+    return _plan(
+        {
+            "back": _tank("D_LP108", "3400 psi", 0.28),
+            "deco50": _tank("AL40", "3000 psi", 0.5),
+            "deco100": _tank("AL40", "3000 psi", 0.97),
+        },
+        profile,
+    )
+
+
+def deep_deco() -> dict:
+    """Deep air dive with a long bottom time and conservative gradient factors, so most of the dive
+    is deco."""
+    return _plan(
+        {
+            "back": _tank("D_LP108", "3600 psi", 0.21),
+            "deco50": _tank("AL80", "3000 psi", 0.5),
+            "deco100": _tank("AL40", "3000 psi", 0.97),
+        },
+        [
+            {"depth": "200 ft", "duration": "6 min", "tank": "back"},
+            {"depth": "200 ft", "duration": "45 min"},
+        ],
+        gf=(0.3, 0.7),
+    )
+
+
+# every synthetic plan, by name
+PLANS = {
+    "rec": rec_dive,
+    "cave": cave_dive,
+    "waypoints": waypoints,
+    "deep_deco": deep_deco,
+}
@@ -1,16 +1,73 @@
 import bungee
 
-import pint
+import copy
+import functools
+import itertools
 import json
-import numpy as np
+import math
+import numbers
+import os
+import re
+import shutil
+import time
+import uuid
 
+# pint is slow to import and to build a registry with, and numpy isn't needed until there are
+# results, so neither is loaded until something needs it. `UREG` and the `*_UNIT` module attributes
+# are built on first access (PEP 562).
 
-UREG = pint.UnitRegistry()
+# bungee's units, by the name of the module attribute they are exposed as
+_UNIT_STR_GETTERS = {
+    "DEPTH_UNIT": bungee.get_depth_unit_str,
+    "PRESSURE_UNIT": bungee.get_pressure_unit_str,
+    "TIME_UNIT": bungee.get_time_unit_str,
+    "VOLUME_RATE_UNIT": bungee.get_volume_rate_unit_str,
+}
 
-DEPTH_UNIT = UREG.parse_units(bungee.get_depth_unit_str())
-PRESSURE_UNIT = UREG.parse_units(bungee.get_pressure_unit_str())
-TIME_UNIT = UREG.parse_units(bungee.get_time_unit_str())
-VOLUME_RATE_UNIT = UREG.parse_units(bungee.get_volume_rate_unit_str())
+
+@functools.lru_cache(maxsize=None)
+def _ureg():
+    """The unit registry shared by everything in cenote."""
+    import pint
+
+    return pint.UnitRegistry()
+
+
+@functools.lru_cache(maxsize=None)
+def _unit(name: str):
+    return _ureg().parse_units(_UNIT_STR_GETTERS[name]())
+
+
+def __getattr__(name: str):
+    if name == "UREG":
+        return _ureg()
+    if name in _UNIT_STR_GETTERS:
+        return _unit(name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + ["UREG"] + list(_UNIT_STR_GETTERS.keys()))
+
+
+def _timed(phase: bungee.StatsPhase):
+    """Decorator that adds the time spent in a function to a phase of `bungee.stats()`, while
+    stats are enabled."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not bungee.stats_enabled():
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                bungee.add_timing(phase, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
 
 
 def plan_from_file(path: str) -> bungee.Plan:
@@ -24,11 +81,58 @@ def plan_from_json_str(blob: str) -> bungee.Plan:
     return plan_from_dict(data)
 
 
+# a number followed by a unit, e.g. "150 ft", "3000psi" or "0.5 ft^3 / min". the unit is only words,
+# "/", "^" and exponents, so that expressions like "150 ft + 3 m" go to the full parser
+_QUANTITY_RE = re.compile(
+    r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"\s*([A-Za-z%](?:[A-Za-z%/^\d\s]*[A-Za-z%\d])?)?\s*$"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _factor(unit, to_unit) -> float:
+    """Multiplier from `unit` (a unit string or pint unit) to `to_unit`. Plans reuse a handful of
+    unit strings over and over, so each one only goes through pint once."""
+    if isinstance(unit, str):
+        unit = _ureg().parse_units(unit)
+    return _ureg().Quantity(1.0, unit).to(to_unit).m
+
+
+def _magnitude(value, to_unit) -> float:
+    """Magnitude of `value` in `to_unit`.
+
+    value : str, pint.Quantity, (float, unit) or float
+        A string like "150 ft", a quantity, a pair of a magnitude and a unit string or pint unit, or
+        a bare number that is already in `to_unit`.
+    """
+    if isinstance(value, str):
+        match = _QUANTITY_RE.match(value)
+        if match is None:
+            # anything fancier than "<number> <unit>" gets the full parser
+            return _ureg().parse_expression(value).to(to_unit).m
+        magnitude, unit = match.groups()
+        try:
+            factor = _factor(unit or "", to_unit)
+        except Exception:
+            # not just a unit after all, e.g. "10 ft / 2"
+            return _ureg().parse_expression(value).to(to_unit).m
+        return float(magnitude) * factor
+    if isinstance(value, (tuple, list)):
+        magnitude, unit = value
+        return float(magnitude) * _factor(unit, to_unit)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    # pint quantity
+    return value.m * _factor(value.u, to_unit)
+
+
+@_timed(bungee.StatsPhase.PARSE)
 def plan_from_dict(data: dict) -> bungee.Plan:
     """
-    user_input : str
-        either a path to a yaml file (is_path = True),
-        or the contents of a yaml file (is_path = False).
+    data : dict
+        Plan in the format of the json files. Anywhere a quantity is expected it may be given as a
+        string like "150 ft", a pint quantity, a (magnitude, unit) pair, or a bare number in
+        bungee's units. See `_magnitude`.
     """
     # Water type
     water = getattr(bungee.Water, data["water"])
@@ -37,19 +141,16 @@ def plan_from_dict(data: dict) -> bungee.Plan:
     gf = bungee.GradientFactor(data["gf"]["low"], data["gf"]["high"])
 
     # SCR
-    working_scr_pint = UREG.parse_expression(data["scr"]["work"]).to(VOLUME_RATE_UNIT)
-    deco_scr_pint = UREG.parse_expression(data["scr"]["deco"]).to(VOLUME_RATE_UNIT)
     scr = bungee.Scr(
-        bungee.VolumeRate(working_scr_pint.m),
-        bungee.VolumeRate(deco_scr_pint.m),
+        bungee.VolumeRate(_magnitude(data["scr"]["work"], _unit("VOLUME_RATE_UNIT"))),
+        bungee.VolumeRate(_magnitude(data["scr"]["deco"], _unit("VOLUME_RATE_UNIT"))),
     )
 
     # Tank loadout
     tanks = {}
     for name, info in data["tanks"].items():
         enum = getattr(bungee.Tank, info["type"])
-        pressure_pint = UREG.parse_expression(info["pressure"]).to(PRESSURE_UNIT)
-        pressure = bungee.Pressure(pressure_pint.m)
+        pressure = bungee.Pressure(_magnitude(info["pressure"], _unit("PRESSURE_UNIT")))
         mix = bungee.Mix(info["mix"]["fO2"])
         tanks[name] = bungee.TankConfig(enum, pressure, mix)
 
@@ -57,41 +158,610 @@ def plan_from_dict(data: dict) -> bungee.Plan:
     plan = bungee.Plan(water, gf, scr, tanks)
 
     # Profile
-    for segment_data in data["profile"]:
-        if "tank" in segment_data:
-            plan.set_tank(segment_data["tank"])
-        depth_pint = UREG.parse_expression(segment_data["depth"]).to(DEPTH_UNIT)
-        depth = bungee.Depth(depth_pint.m)
-        duration_pint = UREG.parse_expression(segment_data["duration"]).to(TIME_UNIT)
-        duration = bungee.Time(duration_pint.m)
-        plan.add_segment(duration, depth)
+    # the whole profile goes to bungee in one call
+    import numpy as np
+
+    profile = data["profile"]
+    durations = np.fromiter(
+        (_magnitude(segment["duration"], _unit("TIME_UNIT")) for segment in profile),
+        float,
+        len(profile),
+    )
+    depths = np.fromiter(
+        (_magnitude(segment["depth"], _unit("DEPTH_UNIT")) for segment in profile),
+        float,
+        len(profile),
+    )
+    segment_tanks = [segment.get("tank", "") for segment in profile]
+    plan.add_segments(durations, depths, segment_tanks)
 
     plan.finalize()
 
     return plan
 
 
+# Result fields by the attribute name they have in `Result` or `Deco`.
+RESULT_FIELDS = {
+    "ambient_pressure": bungee.ResultField.AMBIENT_PRESSURE,
+    "tank_pressure": bungee.ResultField.TANK_PRESSURE,
+    "ceiling": bungee.ResultField.CEILING,
+    "gradient": bungee.ResultField.GRADIENT,
+    "M0s": bungee.ResultField.M0S,
+    "tissue_pressures": bungee.ResultField.TISSUE_PRESSURES,
+    "ceilings": bungee.ResultField.CEILINGS,
+    "gradients": bungee.ResultField.GRADIENTS,
+}
+
+
+@_timed(bungee.StatsPhase.CONVERT)
+def _convert_field(bungee_result: bungee.Result, name: str):
+    """Attach units to a single field of a bungee result.
+
+    bungee hands out read-only views of its arrays. `UREG.Quantity` wraps them as is, whereas
+    multiplying by a unit or converting with `.to()` would copy. Gradients are the exception: they
+    are given in percent, so they are copied, but only once they're read.
+    """
+    if name == "tank_pressure":
+        return {
+            tank: _ureg().Quantity(pressure, _unit("PRESSURE_UNIT"))
+            for tank, pressure in bungee_result.tank_pressure.items()
+        }
+    if name == "ambient_pressure":
+        return _ureg().Quantity(bungee_result.ambient_pressure, _unit("PRESSURE_UNIT"))
+    if name in ("gradient", "gradients"):
+        # bungee's gradients are fractions
+        return (
+            _ureg()
+            .Quantity(getattr(bungee_result.deco, name), _ureg().dimensionless)
+            .to(_ureg().percent)
+        )
+    unit = {
+        "ceiling": _unit("DEPTH_UNIT"),
+        "M0s": _unit("PRESSURE_UNIT"),
+        "tissue_pressures": _unit("PRESSURE_UNIT"),
+        "ceilings": _unit("DEPTH_UNIT"),
+    }[name]
+    return _ureg().Quantity(getattr(bungee_result.deco, name), unit)
+
+
 class Deco:
-    def __init__(self, bungee_deco: bungee.Deco):
-        self.ceiling = bungee_deco.ceiling * DEPTH_UNIT
-        self.gradient = (bungee_deco.gradient * UREG.dimensionless).to(UREG.percent)
-        self.M0s = bungee_deco.M0s * PRESSURE_UNIT
-        self.tissue_pressures = bungee_deco.tissue_pressures * PRESSURE_UNIT
-        self.ceilings = bungee_deco.ceilings * DEPTH_UNIT
-        self.gradients = (bungee_deco.gradients * UREG.dimensionless).to(UREG.percent)
+    """Deco fields of a `Result`. Each field is computed on first access if it was not requested
+    up front."""
+
+    def __init__(self, result: "Result"):
+        self._result = result
+
+    ceiling = property(lambda self: self._result._get("ceiling"))
+    gradient = property(lambda self: self._result._get("gradient"))
+    M0s = property(lambda self: self._result._get("M0s"))
+    tissue_pressures = property(lambda self: self._result._get("tissue_pressures"))
+    ceilings = property(lambda self: self._result._get("ceilings"))
+    gradients = property(lambda self: self._result._get("gradients"))
 
 
 class Result:
-    def __init__(self, bungee_result: bungee.Result):
-        self.time = bungee_result.time * TIME_UNIT
-        self.depth = bungee_result.depth * DEPTH_UNIT
-        self.ambient_pressure = bungee_result.ambient_pressure * PRESSURE_UNIT
-        self.tank_pressure = {
-            tank: pressure * PRESSURE_UNIT for tank, pressure in bungee_result.tank_pressure.items()
+    """
+    bungee_result : bungee.Result
+        Computed result to wrap.
+    plan : bungee.Plan
+        The plan `bungee_result` was computed from. Required to compute fields that were not
+        requested up front.
+    config : bungee.ResultConfig
+        The config `bungee_result` was computed with.
+    """
+
+    def __init__(
+        self,
+        bungee_result: bungee.Result,
+        plan: bungee.Plan = None,
+        config: bungee.ResultConfig = None,
+    ):
+        self._bungee_result = bungee_result
+        self._plan = plan
+        self._config = config
+        self._fields = {}
+        self.time = _ureg().Quantity(bungee_result.time, _unit("TIME_UNIT"))
+        self.depth = _ureg().Quantity(bungee_result.depth, _unit("DEPTH_UNIT"))
+        self.deco = Deco(self)
+
+    ambient_pressure = property(lambda self: self._get("ambient_pressure"))
+    tank_pressure = property(lambda self: self._get("tank_pressure"))
+
+    def _get(self, name: str):
+        if name not in self._fields:
+            bungee_result = self._bungee_result
+            if not bungee_result.fields & RESULT_FIELDS[name]:
+                if self._plan is None:
+                    raise AttributeError("{} was not computed for this result".format(name))
+                config = bungee.ResultConfig(self._config.interval, RESULT_FIELDS[name])
+                bungee_result = bungee.Result(self._plan, config)
+            self._fields[name] = _convert_field(bungee_result, name)
+        return self._fields[name]
+
+
+def _result_config(interval, fields) -> bungee.ResultConfig:
+    config = bungee.ResultConfig()
+    if interval is not None:
+        if isinstance(interval, str):
+            interval = _ureg().parse_expression(interval)
+        config.interval = bungee.Time(interval.to(_unit("TIME_UNIT")).m)
+    if fields is not None:
+        config.fields = 0
+        for name in fields:
+            config.fields |= RESULT_FIELDS[name]
+    return config
+
+
+def get_result(plan: bungee.Plan, interval=None, fields=None, previous: Result = None) -> Result:
+    """
+    plan : bungee.Plan
+        Finalized plan to evaluate.
+    interval : pint.Quantity or str, optional
+        Spacing of the output samples, e.g. "30 s". Defaults to bungee's model resolution.
+    fields : iterable of str, optional
+        Names of the `Result` / `Deco` fields to compute up front (keys of `RESULT_FIELDS`).
+        Defaults to all of them. Anything else is computed on first access.
+    previous : Result, optional
+        Result of an earlier version of `plan` with the same interval, e.g. before the user edited
+        the end of it. The deco model picks up from the last profile point the two plans share
+        instead of starting from the beginning of the dive.
+    """
+    config = _result_config(interval, fields)
+    if previous is not None:
+        bungee_result = bungee.Result(plan, config, previous._bungee_result)
+    else:
+        bungee_result = bungee.Result(plan, config)
+    return Result(bungee_result, plan, config)
+
+
+def iter_result(plan: bungee.Plan, chunk=4096, interval=None, fields=None):
+    """Compute the result of a plan a chunk at a time, for dives too long to hold the whole result
+    in memory at once. The deco model carries on from one chunk to the next, so the chunks put
+    together are the same as `get_result` with the same arguments.
+
+    plan : bungee.Plan
+        Finalized plan to evaluate.
+    chunk : int, pint.Quantity or str, optional
+        Number of samples in each chunk, or a duration such as "1 hour". The last chunk may be
+        shorter.
+    interval, fields
+        Same as `get_result`. Fields that aren't requested can't be computed on access, since the
+        chunks don't know where they are in the dive.
+
+    Yields a `Result` for each chunk. Each one is independent of the others, so they can be
+    dropped as soon as they have been consumed.
+    """
+    config = _result_config(interval, fields)
+    if not isinstance(chunk, int):
+        if isinstance(chunk, str):
+            chunk = _ureg().parse_expression(chunk)
+        chunk = max(1, int(chunk.to(_unit("TIME_UNIT")).m / config.interval.value()))
+    for bungee_result in bungee.ResultStream(plan, config, chunk):
+        yield Result(bungee_result)
+
+
+# version of the layout written by `save_result`
+RESULT_FORMAT_VERSION = 1
+# name of the header file in a saved result directory
+RESULT_META_FILE = "meta.json"
+
+
+def _unit_str(unit) -> str:
+    return "dimensionless" if unit == _ureg().dimensionless else str(unit)
+
+
+def _save_directory(path: str, arrays: dict, meta: dict, meta_file: str):
+    """Write a directory of .npy files plus a json header in one step.
+
+    Everything is written to a new directory next to `path`, which then takes the place of any
+    directory already there. Files that were already there are never written to, so a reader that
+    has them memory mapped keeps seeing the old data. Readers that open `path` in the moment
+    between moving the old directory out and the new one in won't find it.
+
+    arrays : dict
+        Maps file names to the arrays to save in them.
+    meta : dict
+        json serializable header, written to `meta_file`.
+    """
+    import numpy as np
+
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = "{}.{}.tmp".format(path, uuid.uuid4().hex[:8])
+    os.mkdir(staging)
+    try:
+        for filename, array in arrays.items():
+            np.save(os.path.join(staging, filename), array)
+        with open(os.path.join(staging, meta_file), "w") as f:
+            json.dump(meta, f, indent=4)
+        if os.path.exists(path):
+            # directories can only be renamed over empty ones, so the old one is moved aside first
+            old = "{}.{}.old".format(path, uuid.uuid4().hex[:8])
+            os.replace(path, old)
+            os.replace(staging, path)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def save_result(path: str, result: Result, plan: bungee.Plan = None, metadata=None, fields=None):
+    """Write a result to the directory `path`, as one .npy file per array plus a json header with
+    the units and shapes of the arrays, the profile of the plan, and `metadata`. `load_result`
+    maps it back without bungee and without reading the arrays up front. A directory already at
+    `path` is replaced as a whole, without touching files that readers may have mapped.
+
+    result : Result
+        Result to save.
+    plan : bungee.Plan, optional
+        The plan `result` was computed from, for its profile. Defaults to the one `result` holds.
+    metadata : dict, optional
+        Anything json serializable to keep alongside the arrays, e.g. the input plan dict.
+    fields : iterable of str, optional
+        Names of the fields to save (keys of `RESULT_FIELDS`). Defaults to all of them, computing
+        any that `result` doesn't have yet. Time and depth are always saved.
+    """
+    import numpy as np
+
+    plan = plan if plan is not None else result._plan
+    fields = list(RESULT_FIELDS) if fields is None else list(fields)
+
+    arrays = {}
+    columns = {}
+
+    def write(name: str, array, unit):
+        filename = name + ".npy"
+        array = np.asarray(array)
+        arrays[filename] = array
+        columns[name] = {
+            "file": filename,
+            "unit": _unit_str(unit),
+            "shape": list(array.shape),
+            "dtype": array.dtype.str,
+        }
+
+    write("time", result.time.m, result.time.units)
+    write("depth", result.depth.m, result.depth.units)
+    # tank name -> column, or None if tank pressures weren't saved
+    tanks = None
+    for name in fields:
+        if name == "tank_pressure":
+            tanks = {}
+            # tank names can be anything, so the files are numbered
+            for i, (tank, pressure) in enumerate(result.tank_pressure.items()):
+                write("tank_pressure.{}".format(i), pressure.m, pressure.units)
+                tanks[tank] = "tank_pressure.{}".format(i)
+        else:
+            value = (
+                getattr(result, name) if name == "ambient_pressure" else getattr(result.deco, name)
+            )
+            write(name, value.m, value.units)
+
+    profile = None
+    if plan is not None:
+        points = plan.profile()
+        profile = {
+            "time": [point.time.value() for point in points],
+            "depth": [point.depth.value() for point in points],
+            "tank": [point.tank for point in points],
+            "time_unit": _unit_str(_unit("TIME_UNIT")),
+            "depth_unit": _unit_str(_unit("DEPTH_UNIT")),
         }
-        self.deco = Deco(bungee_result.deco)
 
+    meta = {
+        "version": RESULT_FORMAT_VERSION,
+        "columns": columns,
+        "tanks": tanks,
+        "profile": profile,
+        "metadata": metadata,
+    }
+    _save_directory(path, arrays, meta, RESULT_META_FILE)
+
+
+class SavedResult:
+    """A result written by `save_result`, with the same fields as `Result`. Arrays are memory
+    mapped read-only on first access, so only the parts that are used get read from disk.
+
+    Only the fields that were saved are available. `columns` has the raw arrays without units, and
+    `profile` and `metadata` are as saved.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, RESULT_META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta["version"] != RESULT_FORMAT_VERSION:
+            raise ValueError(
+                "{} has result format version {}, expected {}".format(
+                    path, meta["version"], RESULT_FORMAT_VERSION
+                )
+            )
+        self._columns = meta["columns"]
+        self._tanks = meta["tanks"]
+        self._fields = {}
+        self.profile = meta["profile"]
+        self.metadata = meta["metadata"]
+        self.deco = Deco(self)
+
+    def column(self, name: str):
+        """Raw array of a single column, without units."""
+        import numpy as np
+
+        return np.load(os.path.join(self.path, self._columns[name]["file"]), mmap_mode="r")
+
+    @property
+    def columns(self) -> list:
+        return list(self._columns)
+
+    def _quantity(self, name: str):
+        return _ureg().Quantity(self.column(name), self._columns[name]["unit"])
+
+    time = property(lambda self: self._get("time"))
+    depth = property(lambda self: self._get("depth"))
+    ambient_pressure = property(lambda self: self._get("ambient_pressure"))
+    tank_pressure = property(lambda self: self._get("tank_pressure"))
+
+    def _get(self, name: str):
+        if name not in self._fields:
+            if name == "tank_pressure":
+                if self._tanks is None:
+                    raise AttributeError("tank_pressure was not saved in {}".format(self.path))
+                value = {tank: self._quantity(column) for tank, column in self._tanks.items()}
+            else:
+                if name not in self._columns:
+                    raise AttributeError("{} was not saved in {}".format(name, self.path))
+                value = self._quantity(name)
+            self._fields[name] = value
+        return self._fields[name]
+
+
+def load_result(path: str) -> SavedResult:
+    """Open a result written by `save_result`."""
+    return SavedResult(path)
+
+
+def plan_grid(data: dict, axes: dict) -> list:
+    """Every combination of a set of changes to a plan dict, e.g. for contingency tables.
+
+    data : dict
+        Base plan, in the format taken by `plan_from_dict`. Not modified.
+    axes : dict
+        Maps a dotted path into `data` to the values to try there. List indices are given as
+        integers, e.g. "profile.1.duration" or "gf.low". A value of None removes the key, e.g. to
+        drop a tank for lost gas scenarios.
+
+    Returns one plan dict per combination, with the last axis varying fastest.
+    """
+    paths = list(axes.keys())
+    variants = []
+    for values in itertools.product(*axes.values()):
+        variant = copy.deepcopy(data)
+        for path, value in zip(paths, values):
+            *parents, key = path.split(".")
+            node = variant
+            for parent in parents:
+                node = node[int(parent)] if isinstance(node, list) else node[parent]
+            if isinstance(node, list):
+                key = int(key)
+            if value is None:
+                del node[key]
+            else:
+                node[key] = value
+        variants.append(variant)
+    return variants
+
+
+def _convert_summary(summary: bungee.Summary) -> dict:
+    return {
+        "runtime": summary.runtime.value() * _unit("TIME_UNIT"),
+        "stops": [
+            {
+                "depth": stop.depth.value() * _unit("DEPTH_UNIT"),
+                "duration": stop.duration.value() * _unit("TIME_UNIT"),
+                "tank": stop.tank,
+            }
+            for stop in summary.stops
+        ],
+        "gas_used": {
+            name: pressure.value() * _unit("PRESSURE_UNIT")
+            for name, pressure in summary.gas_used.items()
+        },
+        "max_gradient": summary.max_gradient,
+    }
+
+
+def replan_batch(plans, thread_count: int = 0, cache: bungee.CheckpointCache = None) -> list:
+    """Replan many plans in parallel and summarize each of them.
+
+    plans : iterable of bungee.Plan or dict
+        Plans to replan. Dicts are parsed with `plan_from_dict`, so the output of `plan_grid` can be
+        passed straight in.
+    thread_count : int
+        Number of threads to plan on. 0 uses one per core. The GIL is released while planning.
+    cache : bungee.CheckpointCache, optional
+        Shared between the plans, so that plans that start the same way only simulate the start
+        once. Keep it around to reuse it across calls.
+
+    Returns one dict per plan, in order, with the runtime, the stops added by the planner, the
+    pressure used from each tank, and the max gradient reached.
+    """
+    plans = [plan if isinstance(plan, bungee.Plan) else plan_from_dict(plan) for plan in plans]
+    return [_convert_summary(summary) for summary in bungee.replan_many(plans, thread_count, cache)]
+
+
+def _replan_each(
+    plans: list,
+    thread_count: int = 0,
+    cache: bungee.CheckpointCache = None,
+    options: bungee.ReplanOptions = None,
+) -> list:
+    """`bungee.replan_many`, except that plans that can't be planned, e.g. because a stop can never
+    be cleared, get None instead of failing the whole batch."""
+    options = options if options is not None else bungee.ReplanOptions()
+    try:
+        return bungee.replan_many(plans, thread_count, cache, options)
+    except RuntimeError:
+        # find out which
+        summaries = []
+        for plan in plans:
+            try:
+                summaries.append(bungee.summarize(plan, bungee.replan(plan, cache, options)))
+            except RuntimeError:
+                summaries.append(None)
+        return summaries
+
+
+def _pareto_front(candidates: list, key) -> list:
+    """Candidates that no other candidate is at least as good as on every objective and better on
+    one. `key` gives a tuple of objectives to minimize. Of candidates with the same objectives, only
+    the first is kept."""
+    front = []
+    for candidate in sorted(candidates, key=key):
+        objectives = key(candidate)
+        # sorted, so only candidates already on the front can dominate this one
+        if not any(all(a <= b for a, b in zip(key(other), objectives)) for other in front):
+            front.append(candidate)
+    return front
+
+
+def optimize_plan(
+    data: dict,
+    gf=None,
+    tanks=None,
+    max_deco_ppO2=None,
+    stop_depth_inc=None,
+    thread_count: int = 0,
+    cache: bungee.CheckpointCache = None,
+) -> list:
+    """Search ascent settings for a plan and return the ones worth choosing between.
+
+    data : dict
+        Plan in the format taken by `plan_from_dict`. Not modified. Its profile is kept as is; only
+        the ascent the planner adds is searched.
+    gf : iterable of (float, float), optional
+        (low, high) gradient factor pairs to try. Defaults to the plan's own.
+    tanks : iterable of str, optional
+        Tanks that may be left behind. Every subset of them is tried. Tanks breathed in the profile
+        are always carried. Defaults to every tank that isn't.
+    max_deco_ppO2 : iterable of quantities, optional
+        Max ppO2 to switch to a deco gas at, which sets the switch depth of each deco gas. Defaults
+        to bungee's.
+    stop_depth_inc : iterable of quantities, optional
+        Spacing of the deco stops. Defaults to bungee's.
+    thread_count : int
+        Number of threads to plan on. 0 uses one per core.
+    cache : bungee.CheckpointCache, optional
+        Shared by every candidate. All of them have the same profile, so it is only simulated once.
+        Defaults to a new one for this call.
+
+    Candidates are pruned before planning: those with no breathable gas at the end of the profile
+    are dropped, as are those that would breathe the same gases at the same stops as an earlier
+    candidate, e.g. a tank that is carried but never switched to. Earlier values of each argument
+    are preferred, and fewer tanks are preferred over more.
+
+    Returns the Pareto front of the candidates that could be planned, sorted by runtime: those for
+    which no other candidate is as short, leaves as much gas and reaches as low a gradient, with
+    at least one of them strictly better. Each one is a dict with the summary from `replan_batch`,
+    its settings ("gf", "tanks", "max_deco_ppO2" and "stop_depth_inc") and its "gas_margin": the
+    smallest fraction of its starting pressure left in any tank carried.
+    """
+    profile_tanks = {segment["tank"] for segment in data["profile"] if segment.get("tank")}
+    if cache is None:
+        cache = bungee.CheckpointCache()
+    if gf is None:
+        gf = [(data["gf"]["low"], data["gf"]["high"])]
+    if tanks is None:
+        tanks = [name for name in data["tanks"] if name not in profile_tanks]
+    defaults = bungee.ReplanOptions()
+    if max_deco_ppO2 is None:
+        max_deco_ppO2 = [defaults.max_deco_ppO2.value()]
+    if stop_depth_inc is None:
+        stop_depth_inc = [defaults.stop_depth_inc.value()]
+    gf = [tuple(pair) for pair in gf]
+    tanks = list(tanks)
+    max_deco_ppO2 = [_magnitude(value, _unit("PRESSURE_UNIT")) for value in max_deco_ppO2]
+    stop_depth_inc = [_magnitude(value, _unit("DEPTH_UNIT")) for value in stop_depth_inc]
+    start_pressure = {
+        name: _magnitude(info["pressure"], _unit("PRESSURE_UNIT"))
+        for name, info in data["tanks"].items()
+    }
+
+    # one parsed plan per gf pair and set of tanks, shared by every ppO2 and stop increment
+    @functools.lru_cache(maxsize=None)
+    def parse(pair: tuple, carried: tuple) -> bungee.Plan:
+        variant = copy.deepcopy(data)
+        variant["gf"] = {"low": pair[0], "high": pair[1]}
+        variant["tanks"] = {name: variant["tanks"][name] for name in carried}
+        return plan_from_dict(variant)
+
+    subsets = [
+        combination
+        for count in range(len(tanks) + 1)
+        for combination in itertools.combinations(tanks, count)
+    ]
+    # the planner picks its gas at the end of the profile and at each stop after that, so
+    # candidates that pick the same gases there plan the same ascent
+    signatures = set()
+    candidates = []
+    for carried, ppO2, inc in itertools.product(subsets, max_deco_ppO2, stop_depth_inc):
+        carried = tuple(name for name in data["tanks"] if name in profile_tanks or name in carried)
+        plan = parse(gf[0], carried)
+        depth = plan.profile()[-1].depth.value()
+        mixes = []
+        try:
+            while True:
+                mixes.append(plan.best_mix(bungee.Depth(depth), bungee.Pressure(ppO2)))
+                if depth <= 0:
+                    break
+                # same as the planner's next stop. round half away from zero, like std::round
+                depth = max(math.floor((depth - inc) / inc + 0.5) * inc, 0.0)
+        except RuntimeError:
+            # nothing to breathe at the end of the profile
+            continue
+        for pair in gf:
+            signature = (pair, inc, tuple(mixes))
+            if signature in signatures:
+                continue
+            signatures.add(signature)
+            used = tuple(name for name in carried if name in profile_tanks or name in mixes)
+            candidates.append(
+                {"gf": pair, "tanks": used, "max_deco_ppO2": ppO2, "stop_depth_inc": inc}
+            )
+
+    # everything with the same options goes to the thread pool at once
+    groups = {}
+    for candidate in candidates:
+        key = (candidate["max_deco_ppO2"], candidate["stop_depth_inc"])
+        groups.setdefault(key, []).append(candidate)
+    planned = []
+    for (ppO2, inc), group in groups.items():
+        options = bungee.ReplanOptions(bungee.Pressure(ppO2), bungee.Depth(inc))
+        plans = [parse(candidate["gf"], candidate["tanks"]) for candidate in group]
+        summaries = _replan_each(plans, thread_count, cache, options)
+        for candidate, summary in zip(group, summaries):
+            if summary is not None:
+                planned.append((candidate, summary))
+
+    def objectives(entry: tuple) -> tuple:
+        candidate, summary = entry
+        return (summary.runtime.value(), -margin(candidate, summary), summary.max_gradient)
+
+    def margin(candidate: dict, summary: bungee.Summary) -> float:
+        return min(
+            1.0 - summary.gas_used[name].value() / start_pressure[name]
+            for name in candidate["tanks"]
+        )
 
-def get_result(plan: bungee.Plan) -> Result:
-    bungee_result = bungee.Result(plan)
-    return Result(bungee_result)
+    front = []
+    for candidate, summary in _pareto_front(planned, objectives):
+        entry = _convert_summary(summary)
+        entry["gas_margin"] = margin(candidate, summary)
+        entry["gf"] = candidate["gf"]
+        entry["tanks"] = list(candidate["tanks"])
+        entry["max_deco_ppO2"] = candidate["max_deco_ppO2"] * _unit("PRESSURE_UNIT")
+        entry["stop_depth_inc"] = candidate["stop_depth_inc"] * _unit("DEPTH_UNIT")
+        front.append(entry)
+    return front
@@ -0,0 +1,250 @@
+"""Monte Carlo risk analysis of a plan.
+
+Real dives don't follow the plan exactly: SCR goes up with stress and workload, depths wander and
+stops run long. `simulate` perturbs a plan many times over and runs the deco model and gas use of
+every realization at once, as numpy arrays of (realizations x compartments) state sampled along
+time, instead of going through `bungee.Result` once per realization.
+
+The deco model is ZHL-16A with the same constants as bungee, and is integrated exactly with the
+Schreiner equation like `deco/buhlmann/Buhlmann`, so an unperturbed realization matches
+`bungee.Result` to floating point error.
+"""
+
+import functools
+import numbers
+
+import numpy as np
+
+import bungee
+from cenote import _magnitude, _unit, _ureg
+
+# samples of (realizations x compartments) computed at once, to bound memory
+_CHUNK_ELEMENTS = 1 << 22
+
+
+class Normal:
+    """Normally distributed perturbation. `sigma` and `mean` take anything `cenote._magnitude`
+    does, e.g. "2 ft", or plain numbers for SCR factors."""
+
+    def __init__(self, sigma, mean=0.0):
+        self.sigma = sigma
+        self.mean = mean
+
+    def sample(self, rng: np.random.Generator, shape: tuple, unit=None) -> np.ndarray:
+        return rng.normal(_value(self.mean, unit), _value(self.sigma, unit), shape)
+
+
+class Uniform:
+    """Uniformly distributed perturbation in [low, high). See `Normal` for the units."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: np.random.Generator, shape: tuple, unit=None) -> np.ndarray:
+        return rng.uniform(_value(self.low, unit), _value(self.high, unit), shape)
+
+
+def _value(value, unit) -> float:
+    if unit is None:
+        return float(value)
+    return _magnitude(value, unit)
+
+
+def _sample(distribution, rng: np.random.Generator, shape: tuple, unit=None, mean=0.0):
+    """Draw from one of the perturbation arguments of `simulate`. Callables are given the rng and
+    the shape, and return either plain values in bungee's units or a pint quantity."""
+    if distribution is None:
+        return np.full(shape, mean)
+    if isinstance(distribution, (numbers.Real, str)) or hasattr(distribution, "units"):
+        distribution = Normal(distribution, mean)
+    if hasattr(distribution, "sample"):
+        return distribution.sample(rng, shape, unit)
+    values = distribution(rng, shape)
+    if hasattr(values, "units"):
+        return values.to(unit).m
+    return np.broadcast_to(np.asarray(values, dtype=float), shape)
+
+
+@functools.lru_cache(maxsize=None)
+def _model():
+    """Decay constant [1/min], `a` [bar] and `b` of each ZHL-16A compartment."""
+    params = [
+        bungee.CompartmentParams(half_life)
+        for half_life in bungee.get_compartment_list(bungee.Model.ZHL_16A)
+    ]
+    k = np.log(2.0) / np.array([p.half_life.value() for p in params])
+    a = np.array([p.a.value() for p in params])
+    b = np.array([p.b for p in params])
+    return k, a, b
+
+
+def simulate(
+    plan: bungee.Plan,
+    count: int = 1000,
+    scr=None,
+    depth=None,
+    duration=None,
+    interval="1 min",
+    gf: float = 1.0,
+    seed=None,
+) -> dict:
+    """Run many perturbed realizations of a plan.
+
+    plan : bungee.Plan
+        Finalized plan, usually the output of `bungee.replan` so that the ascent is included.
+    count : int
+        Number of realizations.
+    scr : distribution, optional
+        Factor both SCRs are multiplied by, drawn once per realization. A bare number is the
+        standard deviation of a normal distribution around 1. Negative factors are taken as 0.
+    depth : distribution, optional
+        Offset added to the depth of each profile point below the surface, drawn for every point of
+        every realization. A bare value, e.g. "3 ft", is the standard deviation of a normal
+        distribution around 0. Depths are kept at or below the surface.
+    duration : distribution, optional
+        Offset added to the duration of each segment, drawn like `depth`, e.g. `Uniform(0, "3
+        min")` for stops that run long. Segments that take no time, e.g. gas switches, are left
+        alone, and no segment gets shorter than 0.
+    interval : pint.Quantity or str
+        Longest time between the samples the gradient is checked at. Every profile point is also
+        a sample, so only peaks in the middle of a segment can be missed.
+    gf : float
+        Gradient above which a sample counts as a ceiling violation. The default is the M value,
+        which is the ceiling of `bungee.Result`.
+    seed : int or numpy.random.Generator, optional
+        Seed for the draws, for repeatable runs.
+
+    A distribution is a `Normal`, a `Uniform`, or a callable taking a numpy Generator and a shape
+    and returning samples of that shape.
+
+    Returns a dict of arrays with one entry per realization:
+
+    - "runtime": length of the dive
+    - "max_gradient": highest gradient of any compartment at any sample, as a fraction
+    - "violation_time": time spent above the ceiling at `gf`
+    - "end_pressure": dict of the pressure left in each tank
+    - "tissue_pressures": (realizations x compartments) inert gas pressure at the end
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    rng = np.random.default_rng(seed)
+    interval = _magnitude(interval, _unit("TIME_UNIT"))
+    if interval <= 0:
+        raise ValueError("interval must be positive")
+    k, a, b = _model()
+
+    # perturbed profile, one row per realization
+    water = plan.water()
+    point_depth = np.asarray(plan.depth(), dtype=float)
+    point_duration = np.diff(np.asarray(plan.time(), dtype=float))
+    segment_count = len(point_duration)
+    depths = np.tile(point_depth, (count, 1))
+    below = point_depth > 0
+    depths[:, below] += _sample(depth, rng, (count, int(below.sum())), _unit("DEPTH_UNIT"))
+    np.maximum(depths, 0.0, out=depths)
+    durations = np.tile(point_duration, (count, 1))
+    moving = point_duration > 0
+    durations[:, moving] += _sample(duration, rng, (count, int(moving.sum())), _unit("TIME_UNIT"))
+    np.maximum(durations, 0.0, out=durations)
+    scr_factor = np.maximum(_sample(scr, rng, (count,), mean=1.0), 0.0)
+
+    # ambient pressure is affine in depth
+    surface = bungee.SURFACE_PRESSURE.value()
+    pressure_per_depth = bungee.pressure_from_depth(bungee.Depth(1.0), water).value() - surface
+    pressures = surface + pressure_per_depth * depths
+
+    tank_ids = plan.tank_ids()
+    tank_count = plan.tank_count()
+    configs = [plan.tank_config(i) for i in range(tank_count)]
+    fN2 = np.array([config.mix.fN2 for config in configs])
+    water_vapor = bungee.WATER_VAPOR_PRESSURE.value()
+
+    # gas used from each tank, in closed form like `bungee.segment_usage`
+    plan_scr = plan.scr()
+    deco_start = plan.deco_start()
+    segment_scr = np.array(
+        [
+            (plan_scr.work if seg < deco_start else plan_scr.deco).value()
+            for seg in range(segment_count)
+        ]
+    )
+    # SCR scales with ambient pressure, which is linear over a segment
+    mean_rates = scr_factor[:, None] * segment_scr * (pressures[:, :-1] + pressures[:, 1:]) / 2
+    usage = mean_rates / surface * durations
+    used = np.zeros((count, tank_count))
+    for seg in range(segment_count):
+        used[:, tank_ids[seg]] += usage[:, seg]
+
+    # deco model, starting at equilibrium with air at the surface
+    tissue = np.full((count, len(k)), bungee.AIR.fN2 * surface)
+    max_gradient = np.full(count, -np.inf)
+    violation_time = np.zeros(count)
+
+    def check(samples, ambient, weight):
+        """samples: (realizations x times x compartments), ambient and weight: (realizations x
+        times)"""
+        # gradient of the controlling compartment, see `Buhlmann::gradientAtDepth`
+        m0 = (samples - a) * b
+        gradient = ((samples - ambient[:, :, None]) / (samples - m0)).max(axis=2)
+        np.maximum(max_gradient, gradient.max(axis=1), out=max_gradient)
+        violation_time[:] += ((gradient > gf) * weight).sum(axis=1)
+
+    check(tissue[:, None, :], pressures[:, :1], np.zeros((count, 1)))
+
+    for seg in range(segment_count):
+        if not moving[seg]:
+            continue
+        # split the segment into the same number of pieces in every realization, short enough for
+        # the longest one
+        piece_count = max(int(np.ceil(durations[:, seg].max() / interval - 1e-9)), 1)
+        seg_duration = durations[:, seg]
+        inspired_start = fN2[tank_ids[seg]] * pressures[:, seg] - water_vapor
+        ambient_rate = np.divide(
+            pressures[:, seg + 1] - pressures[:, seg],
+            seg_duration,
+            out=np.zeros(count),
+            where=seg_duration > 0,
+        )
+        rate = fN2[tank_ids[seg]] * ambient_rate
+        rate_over_k = rate[:, None] / k
+        start = tissue
+        # Schreiner equation from the start of the segment, for many sample times at once
+        pieces_per_chunk = max(_CHUNK_ELEMENTS // (count * len(k)), 1)
+        for first in range(1, piece_count + 1, pieces_per_chunk):
+            j = np.arange(first, min(first + pieces_per_chunk, piece_count + 1))
+            t = seg_duration[:, None] * (j / piece_count)
+            decay = np.exp(-k * t[:, :, None])
+            samples = (
+                inspired_start[:, None, None]
+                + rate[:, None, None] * t[:, :, None]
+                - rate_over_k[:, None, :]
+                - (inspired_start[:, None] - start - rate_over_k)[:, None, :] * decay
+            )
+            ambient = pressures[:, seg][:, None] + ambient_rate[:, None] * t
+            check(samples, ambient, (seg_duration / piece_count)[:, None])
+        # end of the segment, exactly
+        decay = np.exp(-k * seg_duration[:, None])
+        tissue = (
+            inspired_start[:, None]
+            + rate[:, None] * seg_duration[:, None]
+            - rate_over_k
+            - (inspired_start[:, None] - start - rate_over_k) * decay
+        )
+
+    end_pressure = {}
+    for i, config in enumerate(configs):
+        params = bungee.get_tank_params(config.type)
+        size = params.size.value()
+        initial = size * config.pressure.value() / (params.z * surface)
+        end_pressure[plan.tank_name(i)] = _ureg().Quantity(
+            (initial - used[:, i]) * (params.z * surface / size), _unit("PRESSURE_UNIT")
+        )
+
+    return {
+        "runtime": _ureg().Quantity(durations.sum(axis=1) + plan.time()[0], _unit("TIME_UNIT")),
+        "max_gradient": max_gradient,
+        "violation_time": _ureg().Quantity(violation_time, _unit("TIME_UNIT")),
+        "end_pressure": end_pressure,
+        "tissue_pressures": _ureg().Quantity(tissue, _unit("PRESSURE_UNIT")),
+    }
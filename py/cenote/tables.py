@@ -0,0 +1,455 @@
+"""Precomputed no-decompression limits and deco schedules.
+
+`make_deco_table` plans a square profile for every combination of a grid of depths, bottom times,
+bottom gases and gradient factors, and keeps the summary of each one in a `DecoTable` of numpy
+arrays. Looking a dive up afterwards is a few index computations instead of a replan, and
+`save_deco_table` writes the table out so it can be shipped and loaded without planning anything.
+
+Cells along bottom time share their simulation: the profile of every cell is the profile of the
+cell one bottom time shorter with one more segment on the end, so with a shared
+`bungee.CheckpointCache` each cell only simulates that last segment before planning its ascent.
+"""
+
+import bisect
+import json
+import math
+import os
+
+import numpy as np
+
+import bungee
+from cenote import _magnitude, _replan_each, _save_directory, _unit, _unit_str
+
+# version of the layout written by `save_deco_table`
+TABLE_FORMAT_VERSION = 1
+# name of the header file in a saved table directory
+TABLE_META_FILE = "meta.json"
+
+# arrays of a table, by name, with the name of the module attribute of their unit. the first four
+# dimensions are always (depth, bottom time, gas, gf)
+TABLE_COLUMNS = {
+    "runtime": "TIME_UNIT",
+    "ascent_time": "TIME_UNIT",
+    "max_gradient": None,
+    "stop_depth": "DEPTH_UNIT",
+    "stop_duration": "TIME_UNIT",
+    "stop_tank": None,
+    "gas_used": "PRESSURE_UNIT",
+    "ndl": "TIME_UNIT",
+}
+
+# fraction of a step that an evenly spaced axis value may be off by and still count as on the grid
+_AXIS_SLACK = 1e-9
+
+
+class _Axis:
+    """Sorted grid values along one dimension of a table. Evenly spaced axes, which is what tables
+    are usually made with, are indexed arithmetically; anything else is bisected."""
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        if self.values.ndim != 1 or len(self.values) == 0:
+            raise ValueError("table axes must be non-empty lists")
+        steps = np.diff(self.values)
+        if np.any(steps <= 0):
+            raise ValueError("table axes must be strictly increasing")
+        self._step = None
+        if len(steps) > 0 and np.allclose(steps, steps[0], rtol=1e-9, atol=0):
+            self._step = float(steps[0])
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def ceil(self, value: float) -> int:
+        """Index of the first grid value at or above `value`, or None if there isn't one."""
+        if value <= self.values[0]:
+            return 0
+        if self._step is not None:
+            index = int(np.ceil((value - self.values[0]) / self._step - _AXIS_SLACK))
+        else:
+            index = bisect.bisect_left(self.values, value)
+        return index if index < len(self.values) else None
+
+    def bracket(self, value: float) -> tuple:
+        """Indices of the grid values on either side of `value` and the weight of the upper one.
+        Raises ValueError outside of the grid."""
+        upper = self.ceil(value)
+        if upper is None or value < self.values[0]:
+            raise ValueError(
+                "{} is outside of the table ({} to {})".format(
+                    value, self.values[0], self.values[-1]
+                )
+            )
+        if upper == 0:
+            return 0, 0, 0.0
+        lower = upper - 1
+        weight = (value - self.values[lower]) / (self.values[upper] - self.values[lower])
+        return lower, upper, min(max(weight, 0.0), 1.0)
+
+
+class DecoTable:
+    """Summaries of a grid of square profiles, made by `make_deco_table` or loaded by
+    `load_deco_table`.
+
+    Axes are `depths` and `bottom_times` in bungee's units, `gases` as the fO2 of the bottom gas
+    and `gfs` as (low, high) pairs. `columns` has the raw arrays, see `TABLE_COLUMNS`; cells that
+    weren't planned, e.g. because the bottom gas isn't breathable at that depth, are NaN. Stops are
+    padded with NaN depths and durations and a tank index of -1. Tank indices and the last
+    dimension of "gas_used" follow `tanks`.
+    """
+
+    def __init__(self, depths, bottom_times, gases, gfs, tanks, columns, metadata=None):
+        self._depth = _Axis(depths)
+        self._bottom_time = _Axis(bottom_times)
+        self.gases = [float(gas) for gas in gases]
+        self.gfs = [tuple(float(value) for value in pair) for pair in gfs]
+        self._gas_index = {gas: i for i, gas in enumerate(self.gases)}
+        self._gf_index = {pair: i for i, pair in enumerate(self.gfs)}
+        self.tanks = list(tanks)
+        self.columns = columns
+        self.metadata = metadata
+
+    @property
+    def depths(self):
+        return _quantity(self._depth.values, "DEPTH_UNIT")
+
+    @property
+    def bottom_times(self):
+        return _quantity(self._bottom_time.values, "TIME_UNIT")
+
+    def _key(self, gas, gf) -> tuple:
+        gas = float(gas)
+        if gas not in self._gas_index:
+            raise KeyError("no gas with fO2 {} in the table, it has {}".format(gas, self.gases))
+        if gf is None:
+            if len(self.gfs) != 1:
+                raise KeyError(
+                    "the table has several gradient factors, pick one of " + str(self.gfs)
+                )
+            gf = self.gfs[0]
+        gf = tuple(float(value) for value in gf)
+        if gf not in self._gf_index:
+            raise KeyError("no gradient factors {} in the table, it has {}".format(gf, self.gfs))
+        return self._gas_index[gas], self._gf_index[gf]
+
+    def lookup(self, depth, bottom_time, gas: float, gf=None) -> dict:
+        """Schedule for a dive, the way a printed table is read: from the first row at least as
+        deep and at least as long. Gas and gradient factors have to be in the table exactly; `gf`
+        may be left out if the table only has one pair.
+
+        Returns the summary in the same format as `replan_batch`, plus the "depth" and
+        "bottom_time" of the row it came from, or None if the dive is off the table or the row
+        couldn't be planned.
+        """
+        g, f = self._key(gas, gf)
+        d = self._depth.ceil(_magnitude(depth, _unit("DEPTH_UNIT")))
+        t = self._bottom_time.ceil(_magnitude(bottom_time, _unit("TIME_UNIT")))
+        if d is None or t is None:
+            return None
+        cell = (d, t, g, f)
+        runtime = self.columns["runtime"][cell]
+        if np.isnan(runtime):
+            return None
+        stops = []
+        for stop_depth, duration, tank in zip(
+            self.columns["stop_depth"][cell],
+            self.columns["stop_duration"][cell],
+            self.columns["stop_tank"][cell],
+        ):
+            if tank < 0:
+                break
+            stops.append(
+                {
+                    "depth": _quantity(stop_depth, "DEPTH_UNIT"),
+                    "duration": _quantity(duration, "TIME_UNIT"),
+                    "tank": self.tanks[tank],
+                }
+            )
+        return {
+            "depth": _quantity(self._depth.values[d], "DEPTH_UNIT"),
+            "bottom_time": _quantity(self._bottom_time.values[t], "TIME_UNIT"),
+            "runtime": _quantity(runtime, "TIME_UNIT"),
+            "ascent_time": _quantity(self.columns["ascent_time"][cell], "TIME_UNIT"),
+            "stops": stops,
+            "gas_used": {
+                tank: _quantity(used, "PRESSURE_UNIT")
+                for tank, used in zip(self.tanks, self.columns["gas_used"][cell])
+            },
+            "max_gradient": float(self.columns["max_gradient"][cell]),
+        }
+
+    def interpolate(self, name: str, depth, bottom_time, gas: float, gf=None):
+        """Bilinear interpolation of a column over depth and bottom time, e.g. for plotting. Only
+        columns with one value per cell ("runtime", "ascent_time", "max_gradient") can be
+        interpolated, and the result is only as good as the grid: stop times jump, so this is no
+        substitute for `lookup` when diving.
+
+        Raises ValueError outside of the grid. Cells that weren't planned make the result NaN.
+        """
+        if name not in ("runtime", "ascent_time", "max_gradient"):
+            raise ValueError("can't interpolate " + name)
+        g, f = self._key(gas, gf)
+        d0, d1, dw = self._depth.bracket(_magnitude(depth, _unit("DEPTH_UNIT")))
+        t0, t1, tw = self._bottom_time.bracket(_magnitude(bottom_time, _unit("TIME_UNIT")))
+        column = self.columns[name]
+        value = (1 - dw) * ((1 - tw) * column[d0, t0, g, f] + tw * column[d0, t1, g, f]) + dw * (
+            (1 - tw) * column[d1, t0, g, f] + tw * column[d1, t1, g, f]
+        )
+        return _quantity(value, TABLE_COLUMNS[name])
+
+    def ndl(self, depth, gas: float, gf=None):
+        """No-decompression limit of the first depth at least as deep as `depth`, to the resolution
+        of the bottom time grid: the longest bottom time in the table that needs no stops. None if
+        the depth is off the table or even the shortest bottom time needs stops. A dive that needs
+        no stops at the longest bottom time gets that bottom time, so the limit is only a lower
+        bound there."""
+        g, f = self._key(gas, gf)
+        d = self._depth.ceil(_magnitude(depth, _unit("DEPTH_UNIT")))
+        if d is None:
+            return None
+        ndl = self.columns["ndl"][d, g, f]
+        return None if np.isnan(ndl) else _quantity(ndl, "TIME_UNIT")
+
+
+def _quantity(value, unit_name):
+    if unit_name is None:
+        return value
+    return value * _unit(unit_name)
+
+
+def make_deco_table(
+    data: dict,
+    tank: str,
+    depths,
+    bottom_times,
+    gases=None,
+    gf=None,
+    descent_rate="60 ft/min",
+    max_ppO2="1.4 bar",
+    thread_count: int = 0,
+    cache: bungee.CheckpointCache = None,
+    metadata=None,
+) -> DecoTable:
+    """Plan a square profile for every combination of depth, bottom time, bottom gas and gradient
+    factors.
+
+    data : dict
+        Plan in the format taken by `plan_from_dict`, for its water, SCR and tanks. Its profile and
+        gradient factors aren't used.
+    tank : str
+        Tank in `data` breathed on the bottom. The others are only there to deco on.
+    depths : iterable of quantities
+        Bottom depths, in increasing order.
+    bottom_times : iterable of quantities
+        Bottom times, in increasing order, counted from leaving the surface to leaving the bottom
+        like the usual tables do, in whole minutes. Cells shorter than their descent are left out.
+    gases : iterable of float, optional
+        fO2 of the bottom gas. Defaults to the one `tank` has in `data`.
+    gf : iterable of (float, float), optional
+        (low, high) gradient factor pairs. Defaults to the plan's own.
+    descent_rate : quantity
+        Speed of the descent from the surface. The descent is rounded up to whole minutes.
+    max_ppO2 : quantity
+        Cells that would breathe the bottom gas at a higher ppO2 are left out.
+    thread_count : int
+        Number of threads to plan on. 0 uses one per core.
+    cache : bungee.CheckpointCache, optional
+        Cache for the shared simulation of the cells. Defaults to a new one big enough to hold a
+        column of bottom times at every depth and gas.
+    metadata : dict, optional
+        Anything json serializable to keep with the table, e.g. for `save_deco_table`.
+    """
+    depths = [_magnitude(value, _unit("DEPTH_UNIT")) for value in depths]
+    bottom_times = [_magnitude(value, _unit("TIME_UNIT")) for value in bottom_times]
+    if gases is None:
+        gases = [data["tanks"][tank]["mix"]["fO2"]]
+    gases = [float(gas) for gas in gases]
+    if gf is None:
+        gf = [(data["gf"]["low"], data["gf"]["high"])]
+    gf = [tuple(float(value) for value in pair) for pair in gf]
+    # checked up front so that a bad axis doesn't cost a whole table
+    depth_axis, time_axis = _Axis(depths), _Axis(bottom_times)
+    descent_rate = _magnitude(descent_rate, _unit("DEPTH_UNIT") / _unit("TIME_UNIT"))
+    max_ppO2 = _magnitude(max_ppO2, _unit("PRESSURE_UNIT"))
+    if descent_rate <= 0:
+        raise ValueError("descent rate must be positive")
+    time_inc = bungee.STOP_TIME_INC.value()
+    if any(time != round(time) for time in bottom_times):
+        raise ValueError("bottom times must be whole minutes")
+    if tank not in data["tanks"]:
+        raise KeyError("no tank named {}".format(tank))
+
+    water = getattr(bungee.Water, data["water"])
+    scr = bungee.Scr(
+        bungee.VolumeRate(_magnitude(data["scr"]["work"], _unit("VOLUME_RATE_UNIT"))),
+        bungee.VolumeRate(_magnitude(data["scr"]["deco"], _unit("VOLUME_RATE_UNIT"))),
+    )
+    configs = {
+        name: bungee.TankConfig(
+            getattr(bungee.Tank, info["type"]),
+            bungee.Pressure(_magnitude(info["pressure"], _unit("PRESSURE_UNIT"))),
+            bungee.Mix(info["mix"]["fO2"]),
+        )
+        for name, info in data["tanks"].items()
+    }
+    loadouts = []
+    for gas in gases:
+        loadout = dict(configs)
+        loadout[tank] = bungee.TankConfig(
+            configs[tank].type, configs[tank].pressure, bungee.Mix(gas)
+        )
+        loadouts.append(loadout)
+    gradient_factors = [bungee.GradientFactor(low, high) for low, high in gf]
+
+    if cache is None:
+        cache = bungee.CheckpointCache(max(4096, 4 * len(depths) * len(gases)))
+
+    shape = (len(depths), len(bottom_times), len(gases), len(gf))
+    runtime = np.full(shape, np.nan)
+    ascent_time = np.full(shape, np.nan)
+    max_gradient = np.full(shape, np.nan)
+    stops = {}
+    gas_used = {}
+
+    # every cell at a depth has the same profile up to its own bottom time: the descent, then a
+    # segment to each shorter bottom time. bottom times go one at a time so that the cells one
+    # bottom time shorter have all been simulated and cached before anything that builds on them.
+    tank_names = None
+    for t in range(len(bottom_times)):
+        cells = []
+        plans = []
+        for d, depth in enumerate(depths):
+            # plans are in whole minutes, so the descent is rounded up like the planner's ascents
+            descent = math.ceil(depth / descent_rate / time_inc - _AXIS_SLACK) * time_inc
+            if bottom_times[t] < descent:
+                continue
+            times = [descent] + [time for time in bottom_times[: t + 1] if time > descent]
+            durations = np.diff(times, prepend=0.0)
+            for g, gas in enumerate(gases):
+                if gas * bungee.pressure_from_depth(bungee.Depth(depth), water).value() > max_ppO2:
+                    continue
+                for f, gradient_factor in enumerate(gradient_factors):
+                    plan = bungee.Plan(water, gradient_factor, scr, loadouts[g])
+                    plan.add_segments(
+                        durations, np.full(len(durations), depth), [tank] * len(times)
+                    )
+                    plan.finalize()
+                    cells.append((d, t, g, f))
+                    plans.append(plan)
+        if not plans:
+            continue
+        if tank_names is None:
+            tank_names = [plans[0].tank_name(i) for i in range(plans[0].tank_count())]
+        for cell, summary in zip(cells, _replan_each(plans, thread_count, cache)):
+            if summary is None:
+                # can't be planned, e.g. not enough oxygen in any gas to get out
+                continue
+            runtime[cell] = summary.runtime.value()
+            ascent_time[cell] = summary.runtime.value() - bottom_times[cell[1]]
+            max_gradient[cell] = summary.max_gradient
+            stops[cell] = [
+                (stop.depth.value(), stop.duration.value(), tank_names.index(stop.tank))
+                for stop in summary.stops
+            ]
+            gas_used[cell] = [summary.gas_used[name].value() for name in tank_names]
+
+    tank_names = tank_names if tank_names is not None else list(data["tanks"])
+    stop_count = max([len(cell_stops) for cell_stops in stops.values()] + [0])
+    stop_depth = np.full(shape + (stop_count,), np.nan)
+    stop_duration = np.full(shape + (stop_count,), np.nan)
+    stop_tank = np.full(shape + (stop_count,), -1, dtype=np.int32)
+    for cell, cell_stops in stops.items():
+        for s, (depth, duration, index) in enumerate(cell_stops):
+            stop_depth[cell + (s,)] = depth
+            stop_duration[cell + (s,)] = duration
+            stop_tank[cell + (s,)] = index
+    used = np.full(shape + (len(tank_names),), np.nan)
+    for cell, cell_used in gas_used.items():
+        used[cell] = cell_used
+
+    # the longest bottom time that needs no stops, as long as none of the shorter ones did either.
+    # cells shorter than their descent come first and don't count
+    ndl = np.full((len(depths), len(gases), len(gf)), np.nan)
+    for d, g, f in np.ndindex(ndl.shape):
+        for t in range(len(bottom_times)):
+            if np.isnan(runtime[d, t, g, f]):
+                if not np.isnan(ndl[d, g, f]):
+                    break
+            elif stop_count == 0 or stop_tank[d, t, g, f, 0] < 0:
+                ndl[d, g, f] = bottom_times[t]
+            else:
+                break
+
+    columns = {
+        "runtime": runtime,
+        "ascent_time": ascent_time,
+        "max_gradient": max_gradient,
+        "stop_depth": stop_depth,
+        "stop_duration": stop_duration,
+        "stop_tank": stop_tank,
+        "gas_used": used,
+        "ndl": ndl,
+    }
+    return DecoTable(depth_axis.values, time_axis.values, gases, gf, tank_names, columns, metadata)
+
+
+def save_deco_table(path: str, table: DecoTable, metadata=None):
+    """Write a table to the directory `path`, as one .npy file per column plus a json header with
+    the axes, units and `metadata` (the table's own if not given). `load_deco_table` maps it back
+    without replanning and without reading the columns up front. A table already at `path` is
+    replaced as a whole, so a service that has it mapped keeps the old one until it reloads."""
+    arrays = {}
+    columns = {}
+    for name, array in table.columns.items():
+        filename = name + ".npy"
+        array = np.asarray(array)
+        arrays[filename] = array
+        unit_name = TABLE_COLUMNS.get(name)
+        columns[name] = {
+            "file": filename,
+            "unit": _unit_str(_unit(unit_name)) if unit_name is not None else None,
+            "shape": list(array.shape),
+            "dtype": array.dtype.str,
+        }
+    meta = {
+        "version": TABLE_FORMAT_VERSION,
+        "axes": {
+            "depth": table._depth.values.tolist(),
+            "bottom_time": table._bottom_time.values.tolist(),
+            "gas": table.gases,
+            "gf": [list(pair) for pair in table.gfs],
+            "depth_unit": _unit_str(_unit("DEPTH_UNIT")),
+            "time_unit": _unit_str(_unit("TIME_UNIT")),
+        },
+        "tanks": table.tanks,
+        "columns": columns,
+        "metadata": metadata if metadata is not None else table.metadata,
+    }
+    _save_directory(path, arrays, meta, TABLE_META_FILE)
+
+
+def load_deco_table(path: str) -> DecoTable:
+    """Open a table written by `save_deco_table`. Columns are memory mapped read-only, so a lookup
+    only reads the cells it needs."""
+    with open(os.path.join(path, TABLE_META_FILE), "r") as f:
+        meta = json.load(f)
+    if meta["version"] != TABLE_FORMAT_VERSION:
+        raise ValueError(
+            "{} has table format version {}, expected {}".format(
+                path, meta["version"], TABLE_FORMAT_VERSION
+            )
+        )
+    axes = meta["axes"]
+    columns = {
+        name: np.load(os.path.join(path, column["file"]), mmap_mode="r")
+        for name, column in meta["columns"].items()
+    }
+    return DecoTable(
+        axes["depth"],
+        axes["bottom_time"],
+        axes["gas"],
+        axes["gf"],
+        meta["tanks"],
+        columns,
+        meta["metadata"],
+    )
@@ -4,7 +4,7 @@ setup(
     name = "cenote",
     version = "0.0.2",
     description = "Dive planner",
-    packages = find_packages(),
+    packages = find_packages(exclude=["bench", "bench.*"]),
     python_requires = ">=3.10",
     # entry_points = {
     #     "console_scripts": [
@@ -1,4 +1,7 @@
 import cenote
+import copy
+import json
+import pint
 import unittest
 import os
 
@@ -24,3 +27,49 @@ class TestGetPlan(unittest.TestCase):
                 "deco100",  # 0
             ],
         )
+
+
+class TestPlanFromDict(unittest.TestCase):
+    def setUp(self):
+        with open(PROFILE1, "r") as f:
+            self.data = json.load(f)
+
+    def assertSameProfile(self, plan, expected):
+        self.assertEqual(len(plan.profile()), len(expected.profile()))
+        for point, expected_point in zip(plan.profile(), expected.profile()):
+            self.assertAlmostEqual(point.time.value(), expected_point.time.value())
+            self.assertAlmostEqual(point.depth.value(), expected_point.depth.value())
+            self.assertEqual(point.tank, expected_point.tank)
+
+    def test_numeric_input(self):
+        expected = cenote.plan_from_dict(self.data)
+        data = copy.deepcopy(self.data)
+        for segment in data["profile"]:
+            depth = cenote.UREG.parse_expression(segment["depth"])
+            # mix of quantities, pairs, and bare numbers in bungee units
+            segment["depth"] = depth
+            segment["duration"] = (
+                cenote.UREG.parse_expression(segment["duration"]).to("s").m,
+                "s",
+            )
+        data["profile"][0]["depth"] = data["profile"][0]["depth"].to(cenote.DEPTH_UNIT).m
+        self.assertSameProfile(cenote.plan_from_dict(data), expected)
+
+    def test_expression(self):
+        # anything that isn't "<number> <unit>" still goes through pint
+        self.assertAlmostEqual(cenote._magnitude("1/2 h", cenote.TIME_UNIT), 30.0)
+        self.assertAlmostEqual(cenote._magnitude("10ft", cenote.DEPTH_UNIT), 3.048)
+        with self.assertRaises(pint.DimensionalityError):
+            cenote._magnitude("10 psi", cenote.DEPTH_UNIT)
+
+    def test_compound_expression(self):
+        # operators after the unit aren't part of it
+        self.assertAlmostEqual(cenote._magnitude("150 ft + 3 m", cenote.DEPTH_UNIT), 48.72)
+        self.assertAlmostEqual(cenote._magnitude("10 ft * 2", cenote.DEPTH_UNIT), 6.096)
+        self.assertAlmostEqual(cenote._magnitude("10 ft / 2", cenote.DEPTH_UNIT), 1.524)
+        self.assertAlmostEqual(cenote._magnitude("10 ft - 1 m", cenote.DEPTH_UNIT), 2.048)
+        # compound units still take the fast path
+        self.assertAlmostEqual(
+            cenote._magnitude("0.5 ft^3 / min", cenote.VOLUME_RATE_UNIT), 14.158423, places=5
+        )
+        self.assertAlmostEqual(cenote._magnitude("2 cubic foot per minute", "ft^3/min"), 2.0)
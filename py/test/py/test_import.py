@@ -0,0 +1,40 @@
+import unittest
+import cenote
+import bungee
+import os
+import subprocess
+import sys
+
+MEASURE = """
+import sys, time
+start = time.perf_counter()
+import bungee
+mid = time.perf_counter()
+import cenote
+end = time.perf_counter()
+print(mid - start, end - mid, "pint" in sys.modules, "numpy" in sys.modules)
+"""
+
+
+class TestImport(unittest.TestCase):
+    def measure(self):
+        # fresh interpreter, so nothing is imported already
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE],
+            check=True,
+            capture_output=True,
+            text=True,
+            env=os.environ,
+        ).stdout.split()
+        return float(output[0]), float(output[1]), output[2] == "True", output[3] == "True"
+
+    def test_lazy(self):
+        _, _, pint_imported, numpy_imported = self.measure()
+        self.assertFalse(pint_imported)
+        self.assertFalse(numpy_imported)
+
+    def test_units_on_first_use(self):
+        self.assertEqual(cenote.DEPTH_UNIT, cenote.UREG.parse_units(bungee.get_depth_unit_str()))
+        self.assertIs(cenote.UREG, cenote.UREG)
+        with self.assertRaises(AttributeError):
+            cenote.NOT_A_UNIT
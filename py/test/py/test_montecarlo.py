@@ -0,0 +1,61 @@
+import unittest
+import cenote
+import bungee
+import os
+import numpy as np
+from cenote import montecarlo
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+PROFILE2 = os.path.join(DATA_DIR, "profile2.json")
+
+
+class TestSimulate(unittest.TestCase):
+    def setUp(self):
+        self.plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+
+    def test_unperturbed_matches_result(self):
+        # with samples at the same times as the result, every realization is the plan itself
+        out = montecarlo.simulate(self.plan, count=4, interval="1 min")
+        result = cenote.get_result(self.plan, interval="1 min")
+        np.testing.assert_allclose(out["runtime"].m, result.time.m[-1])
+        np.testing.assert_allclose(
+            out["max_gradient"], result.deco.gradient.m.max() / 100, rtol=1e-12
+        )
+        np.testing.assert_allclose(
+            out["tissue_pressures"].m,
+            np.tile(result.deco.tissue_pressures.m[:, -1], (4, 1)),
+            rtol=1e-11,
+        )
+        self.assertEqual(set(out["end_pressure"]), set(result.tank_pressure))
+        for tank, pressure in result.tank_pressure.items():
+            np.testing.assert_allclose(out["end_pressure"][tank].m, pressure.m[-1], rtol=1e-12)
+        np.testing.assert_array_equal(out["violation_time"].m, 0)
+
+    def test_seed(self):
+        kwargs = dict(count=50, scr=0.2, depth="3 ft", duration=montecarlo.Uniform(0, "2 min"))
+        first = montecarlo.simulate(self.plan, seed=7, **kwargs)
+        second = montecarlo.simulate(self.plan, seed=7, **kwargs)
+        np.testing.assert_array_equal(first["max_gradient"], second["max_gradient"])
+        self.assertEqual(first["max_gradient"].shape, (50,))
+        self.assertGreater(np.ptp(first["max_gradient"]), 0)
+
+    def test_perturbations(self):
+        base = montecarlo.simulate(self.plan, count=1)
+        # working harder uses more gas from every tank that is breathed
+        out = montecarlo.simulate(self.plan, count=20, scr=montecarlo.Uniform(1.1, 1.3), seed=0)
+        for tank, pressure in out["end_pressure"].items():
+            self.assertTrue(np.all(pressure.m < base["end_pressure"][tank].m[0]))
+        # stops that run long make the dive longer
+        out = montecarlo.simulate(
+            self.plan, count=20, duration=lambda rng, shape: rng.uniform(0, 1, shape), seed=0
+        )
+        self.assertTrue(np.all(out["runtime"] > base["runtime"][0]))
+        # going deeper than planned loads more gas
+        out = montecarlo.simulate(self.plan, count=20, depth=montecarlo.Uniform("5 ft", "10 ft"))
+        self.assertTrue(np.all(out["tissue_pressures"][:, -1] > base["tissue_pressures"][0, -1]))
+
+    def test_violations(self):
+        # the plan is at gf 100/100, so counting violations at a lower gf finds some
+        out = montecarlo.simulate(self.plan, count=2, gf=0.5)
+        self.assertTrue(np.all(out["violation_time"].m > 0))
+        self.assertTrue(np.all(out["violation_time"] <= out["runtime"]))
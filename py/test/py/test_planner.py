@@ -1,6 +1,8 @@
 import unittest
+import unittest.mock
 import cenote
 import bungee
+import json
 import os
 from pint.testsuite import helpers
 
@@ -75,3 +77,118 @@ class TestPlanner(unittest.TestCase):
         )
         self.assertEqual(profile[11].time.value(), (71.0 * UREG.minute).m)
         self.assertEqual(profile[11].tank, "Deco100")
+
+
+class TestReplanBatch(unittest.TestCase):
+    def setUp(self):
+        with open(PROFILE2, "r") as f:
+            self.data = json.load(f)
+
+    def test_plan_grid(self):
+        variants = cenote.plan_grid(
+            self.data, {"profile.1.duration": ["30 min", "40 min"], "gf.low": [0.3, 0.5, 0.7]}
+        )
+        self.assertEqual(len(variants), 6)
+        self.assertEqual(variants[0]["profile"][1]["duration"], "30 min")
+        self.assertEqual(variants[0]["gf"]["low"], 0.3)
+        self.assertEqual(variants[5]["profile"][1]["duration"], "40 min")
+        self.assertEqual(variants[5]["gf"]["low"], 0.7)
+        # base is untouched
+        self.assertEqual(self.data["profile"][1]["duration"], "35 min")
+
+    def test_plan_grid_remove(self):
+        variants = cenote.plan_grid(self.data, {"tanks.Deco50": [None]})
+        self.assertNotIn("Deco50", variants[0]["tanks"])
+        self.assertIn("Deco50", self.data["tanks"])
+
+    def test_matches_replan(self):
+        variants = cenote.plan_grid(self.data, {"profile.1.duration": ["20 min", "35 min"]})
+        summaries = cenote.replan_batch(variants, thread_count=2)
+        self.assertEqual(len(summaries), 2)
+        for variant, summary in zip(variants, summaries):
+            output = bungee.replan(cenote.plan_from_dict(variant))
+            self.assertEqual(summary["runtime"].m, output.profile()[-1].time.value())
+        self.assertLess(summaries[0]["runtime"], summaries[1]["runtime"])
+        self.assertEqual(set(summaries[1]["gas_used"]), {"Deco100", "Deco50", "Sidemount"})
+        self.assertGreater(summaries[1]["gas_used"]["Sidemount"].m, 0)
+        self.assertEqual(summaries[1]["stops"][-1]["tank"], "Deco100")
+
+    def test_cache(self):
+        variants = cenote.plan_grid(self.data, {"profile.1.duration": ["20 min", "35 min"]})
+        cache = bungee.CheckpointCache()
+        cached = cenote.replan_batch(variants, thread_count=1, cache=cache)
+        self.assertEqual(cache.hits + cache.misses, 2)
+        # both plans share their first point, and every point is kept
+        self.assertEqual(len(cache), 3)
+        for summary, expected in zip(cached, cenote.replan_batch(variants)):
+            self.assertEqual(summary["runtime"], expected["runtime"])
+
+
+class TestOptimize(unittest.TestCase):
+    def setUp(self):
+        with open(PROFILE2, "r") as f:
+            self.data = json.load(f)
+
+    def test_front(self):
+        front = cenote.optimize_plan(
+            self.data,
+            gf=[(0.3, 0.7), (0.5, 0.8), (1.0, 1.0)],
+            max_deco_ppO2=["1.4 bar", "1.6 bar"],
+            stop_depth_inc=["10 ft", "3 m"],
+            thread_count=2,
+        )
+        self.assertGreater(len(front), 1)
+        runtimes = [entry["runtime"] for entry in front]
+        self.assertEqual(runtimes, sorted(runtimes))
+        # nothing on the front is dominated by anything else on it
+        objectives = [(e["runtime"].m, -e["gas_margin"], e["max_gradient"]) for e in front]
+        for a in objectives:
+            for b in objectives:
+                self.assertFalse(a != b and all(x <= y for x, y in zip(a, b)))
+        # each entry is what replanning with its settings gives
+        for entry in front:
+            variant = dict(self.data)
+            variant["gf"] = {"low": entry["gf"][0], "high": entry["gf"][1]}
+            variant["tanks"] = {name: self.data["tanks"][name] for name in entry["tanks"]}
+            options = bungee.ReplanOptions(
+                bungee.Pressure(entry["max_deco_ppO2"].to(cenote.PRESSURE_UNIT).m),
+                bungee.Depth(entry["stop_depth_inc"].to(cenote.DEPTH_UNIT).m),
+            )
+            output = bungee.replan(cenote.plan_from_dict(variant), options=options)
+            self.assertEqual(entry["runtime"].m, output.profile()[-1].time.value())
+
+    def test_default_cache(self):
+        # every candidate shares the profile, so all but the first resume from the cache even when
+        # the caller doesn't pass one
+        caches = []
+        make_cache = bungee.CheckpointCache
+
+        def record(*args, **kwargs):
+            caches.append(make_cache(*args, **kwargs))
+            return caches[-1]
+
+        with unittest.mock.patch.object(bungee, "CheckpointCache", record):
+            cenote.optimize_plan(self.data, gf=[(0.3, 0.7), (0.5, 0.8)], thread_count=1)
+        self.assertEqual(len(caches), 1)
+        self.assertGreater(caches[0].hits, 0)
+
+    def test_pruned(self):
+        # a tank that is never breathed is not carried, and switch depths that don't change which
+        # gases are breathed at the stops don't make new candidates
+        front = cenote.optimize_plan(self.data, max_deco_ppO2=["1.6 bar", "1.61 bar"])
+        self.assertEqual(len(front), 1)
+        self.assertEqual(front[0]["max_deco_ppO2"].m, 1.6)
+        self.assertEqual(front[0]["tanks"], ["Deco100", "Deco50", "Sidemount"])
+
+    def test_unplannable(self):
+        # a hypoxic bottom gas at a low gf can't be offgassed on at the shallow stops, so only the
+        # candidate that carries the deco gas can be planned
+        self.data["tanks"]["Sidemount"]["mix"]["fO2"] = 0.1
+        front = cenote.optimize_plan(self.data, gf=[(0.1, 0.1)], tanks=["Deco50"])
+        self.assertEqual(len(front), 1)
+        self.assertEqual(front[0]["tanks"], ["Deco50", "Sidemount"])
+
+    def test_infeasible(self):
+        # nothing to breathe at the bottom
+        front = cenote.optimize_plan(self.data, tanks=[], max_deco_ppO2=["0.5 bar"])
+        self.assertEqual(front, [])
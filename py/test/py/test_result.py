@@ -0,0 +1,174 @@
+import json
+import unittest
+import cenote
+import bungee
+import os
+import tempfile
+import numpy as np
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+PROFILE2 = os.path.join(DATA_DIR, "profile2.json")
+
+
+class TestGetResult(unittest.TestCase):
+    def setUp(self):
+        self.plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+
+    def test_interval(self):
+        result = cenote.get_result(self.plan, interval="1 min")
+        end = self.plan.profile()[-1].time.value()
+        np.testing.assert_allclose(result.time.m, np.arange(end + 1))
+
+    def test_fields_skipped(self):
+        result = cenote.get_result(self.plan, interval="1 min", fields=["ceiling", "gradient"])
+        self.assertEqual(result._bungee_result.deco.M0s.size, 0)
+        self.assertEqual(len(result._bungee_result.tank_pressure), 0)
+
+    def test_lazy_field_matches_full(self):
+        full = cenote.get_result(self.plan)
+        lazy = cenote.get_result(self.plan, interval="1 min", fields=["ceiling"])
+        np.testing.assert_allclose(lazy.deco.gradients.m, full.deco.gradients.m[:, ::60], atol=1e-6)
+        for tank, pressure in full.tank_pressure.items():
+            np.testing.assert_allclose(lazy.tank_pressure[tank].m, pressure.m[::60], atol=1e-6)
+
+
+class TestPreviousResult(unittest.TestCase):
+    def test_matches_full(self):
+        with open(PROFILE2, "r") as f:
+            data = json.load(f)
+        shorter, longer = [
+            bungee.replan(cenote.plan_from_dict(variant))
+            for variant in cenote.plan_grid(data, {"profile.1.duration": ["30 min", "35 min"]})
+        ]
+        previous = cenote.get_result(shorter, fields=["tissue_pressures"])
+        resumed = cenote.get_result(longer, fields=["tissue_pressures"], previous=previous)
+        full = cenote.get_result(longer, fields=["tissue_pressures"])
+        np.testing.assert_allclose(
+            resumed.deco.tissue_pressures.m, full.deco.tissue_pressures.m, rtol=1e-12
+        )
+
+
+class TestIterResult(unittest.TestCase):
+    def setUp(self):
+        self.plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+
+    def test_matches_full(self):
+        full = cenote.get_result(self.plan, interval="10 s")
+        chunks = list(cenote.iter_result(self.plan, chunk=100, interval="10 s"))
+        self.assertTrue(all(len(chunk.time) <= 100 for chunk in chunks))
+        np.testing.assert_allclose(np.concatenate([c.time.m for c in chunks]), full.time.m)
+        np.testing.assert_allclose(
+            np.concatenate([c.deco.tissue_pressures.m for c in chunks], axis=1),
+            full.deco.tissue_pressures.m,
+            rtol=1e-12,
+        )
+        for tank, pressure in full.tank_pressure.items():
+            np.testing.assert_allclose(
+                np.concatenate([c.tank_pressure[tank].m for c in chunks]), pressure.m, rtol=1e-12
+            )
+
+    def test_chunk_duration(self):
+        chunks = list(cenote.iter_result(self.plan, chunk="10 min", interval="1 min"))
+        self.assertEqual(len(chunks[0].time), 10)
+
+    def test_fields(self):
+        chunk = next(cenote.iter_result(self.plan, fields=["ceiling"]))
+        chunk.deco.ceiling
+        with self.assertRaises(AttributeError):
+            chunk.deco.gradients
+
+
+class TestResultViews(unittest.TestCase):
+    def test_no_copy(self):
+        plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+        result = cenote.get_result(plan)
+        bungee_result = result._bungee_result
+        self.assertTrue(np.shares_memory(result.time.m, bungee_result.time))
+        self.assertTrue(
+            np.shares_memory(result.deco.tissue_pressures.m, bungee_result.deco.tissue_pressures)
+        )
+        for tank, pressure in result.tank_pressure.items():
+            self.assertTrue(np.shares_memory(pressure.m, bungee_result.tank_pressure[tank]))
+
+    def test_gradient_percent(self):
+        plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+        result = cenote.get_result(plan)
+        bungee_result = result._bungee_result
+        self.assertEqual(result.deco.gradient.units, cenote.UREG.percent)
+        np.testing.assert_allclose(result.deco.gradient.m, bungee_result.deco.gradient * 100)
+        np.testing.assert_allclose(result.deco.gradients.m, bungee_result.deco.gradients * 100)
+
+    def test_read_only(self):
+        plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+        bungee_result = bungee.Result(plan)
+        with self.assertRaises(ValueError):
+            bungee_result.deco.ceilings[0, 0] = 1.0
+
+
+class TestInterpolate(unittest.TestCase):
+    def test_matches_numpy(self):
+        xp = np.array([0.0, 1.0, 3.0, 4.0])
+        yp = np.array([0.0, 10.0, 10.0, 0.0])
+        x = np.linspace(0, 4, 41)
+        np.testing.assert_allclose(bungee.interpolate(xp, yp, x), np.interp(x, xp, yp))
+
+    def test_out(self):
+        xp = np.array([0.0, 2.0])
+        yp = np.array([0.0, 4.0])
+        x = np.array([0.5, 1.0, 2.0])
+        out = np.zeros(3)
+        bungee.interpolate(xp, yp, x, out)
+        np.testing.assert_allclose(out, [1.0, 2.0, 4.0])
+
+
+class TestSaveResult(unittest.TestCase):
+    def setUp(self):
+        self.plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+        self.result = cenote.get_result(self.plan, interval="10 s")
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "dive")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_roundtrip(self):
+        cenote.save_result(self.path, self.result, metadata={"name": "profile2"})
+        saved = cenote.load_result(self.path)
+        self.assertEqual(saved.metadata, {"name": "profile2"})
+        self.assertIsInstance(saved.column("time"), np.memmap)
+        np.testing.assert_array_equal(saved.time.m, self.result.time.m)
+        self.assertEqual(saved.depth.units, self.result.depth.units)
+        for name in ["ceiling", "gradient", "M0s", "tissue_pressures", "ceilings", "gradients"]:
+            np.testing.assert_array_equal(
+                getattr(saved.deco, name).m, getattr(self.result.deco, name).m
+            )
+        self.assertEqual(saved.tank_pressure.keys(), self.result.tank_pressure.keys())
+        for tank, pressure in self.result.tank_pressure.items():
+            np.testing.assert_array_equal(saved.tank_pressure[tank].m, pressure.m)
+        points = self.plan.profile()
+        self.assertEqual(saved.profile["tank"], [point.tank for point in points])
+        self.assertEqual(saved.profile["depth"], [point.depth.value() for point in points])
+
+    def test_fields(self):
+        cenote.save_result(self.path, self.result, fields=["ceiling"])
+        saved = cenote.load_result(self.path)
+        self.assertEqual(saved.columns, ["time", "depth", "ceiling"])
+        with self.assertRaises(AttributeError):
+            saved.tank_pressure
+        with self.assertRaises(AttributeError):
+            saved.deco.gradients
+
+    def test_overwrite(self):
+        cenote.save_result(self.path, self.result, metadata={"name": "first"})
+        first = cenote.load_result(self.path)
+        first_ceiling = first.deco.ceiling.m
+        expected = np.array(first_ceiling)
+        # a different result over the same directory, while the first one is still mapped
+        other = cenote.get_result(self.plan, interval="1 min")
+        cenote.save_result(self.path, other, metadata={"name": "second"})
+        np.testing.assert_array_equal(first_ceiling, expected)
+        second = cenote.load_result(self.path)
+        self.assertEqual(second.metadata, {"name": "second"})
+        np.testing.assert_array_equal(second.deco.ceiling.m, other.deco.ceiling.m)
+        # nothing left over next to it
+        self.assertEqual(os.listdir(self.dir.name), ["dive"])
@@ -0,0 +1,38 @@
+import os
+import unittest
+import cenote
+import bungee
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+PROFILE2 = os.path.join(DATA_DIR, "profile2.json")
+
+
+class TestStats(unittest.TestCase):
+    def tearDown(self):
+        bungee.enable_stats(False)
+        bungee.reset_stats()
+
+    def test_disabled(self):
+        bungee.reset_stats()
+        cenote.get_result(bungee.replan(cenote.plan_from_file(PROFILE2))).deco.ceiling
+        stats = bungee.stats()
+        self.assertFalse(any(stats["counters"].values()))
+        self.assertFalse(any(phase["calls"] for phase in stats["phases"].values()))
+
+    def test_enabled(self):
+        bungee.reset_stats()
+        bungee.enable_stats()
+        self.assertTrue(bungee.stats_enabled())
+        plan = bungee.replan(cenote.plan_from_file(PROFILE2))
+        cenote.get_result(plan, fields=["ceiling"]).deco.ceiling
+        stats = bungee.stats()
+        self.assertGreater(stats["counters"]["model_updates"], 0)
+        for name in ["parse", "replan", "result", "result_deco", "convert"]:
+            self.assertEqual(stats["phases"][name]["calls"], 1, name)
+        self.assertGreater(stats["phases"]["parse"]["seconds"], 0)
+        bungee.reset_stats()
+        self.assertEqual(bungee.stats()["counters"]["model_updates"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+import cenote
+import bungee
+import json
+import os
+import tempfile
+import numpy as np
+from cenote import tables
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+PROFILE1 = os.path.join(DATA_DIR, "profile1.json")
+
+
+class TestDecoTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(PROFILE1, "r") as f:
+            cls.data = json.load(f)
+        cls.cache = bungee.CheckpointCache()
+        cls.table = tables.make_deco_table(
+            cls.data,
+            "bottom",
+            depths=["{} ft".format(depth) for depth in range(40, 160, 20)],
+            bottom_times=["{} min".format(time) for time in range(10, 70, 10)],
+            gases=[0.21, 0.32],
+            gf=[(0.3, 0.7), (1.0, 1.0)],
+            cache=cls.cache,
+        )
+
+    def square(self, depth: str, bottom_time: int, fO2: float, gf: tuple) -> dict:
+        """Summary of the same dive planned on its own, as a single bottom segment."""
+        data = dict(self.data)
+        data["tanks"] = dict(data["tanks"])
+        data["tanks"]["bottom"] = dict(data["tanks"]["bottom"], mix={"fO2": fO2})
+        data["gf"] = {"low": gf[0], "high": gf[1]}
+        descent = int(np.ceil(cenote._magnitude(depth, "ft") / 60))
+        data["profile"] = [
+            {"depth": depth, "duration": "{} min".format(descent), "tank": "bottom"},
+            {"depth": depth, "duration": "{} min".format(bottom_time - descent)},
+        ]
+        return cenote.replan_batch([data])[0]
+
+    def test_matches_replan(self):
+        for depth, bottom_time, fO2, gf in [
+            ("60 ft", 30, 0.32, (1.0, 1.0)),
+            ("140 ft", 40, 0.21, (0.3, 0.7)),
+            ("100 ft", 60, 0.21, (0.3, 0.7)),
+        ]:
+            expected = self.square(depth, bottom_time, fO2, gf)
+            found = self.table.lookup(depth, "{} min".format(bottom_time), fO2, gf)
+            self.assertEqual(found["runtime"], expected["runtime"])
+            self.assertEqual(len(found["stops"]), len(expected["stops"]))
+            for a, b in zip(found["stops"], expected["stops"]):
+                self.assertAlmostEqual(a["depth"].m, b["depth"].m)
+                self.assertEqual(a["duration"], b["duration"])
+                self.assertEqual(a["tank"], b["tank"])
+            for tank, used in expected["gas_used"].items():
+                self.assertAlmostEqual(found["gas_used"][tank].m, used.m)
+        # and the deep ones do need stops
+        self.assertGreater(len(self.table.lookup("140 ft", "40 min", 0.21, (0.3, 0.7))["stops"]), 0)
+
+    def test_shared_simulation(self):
+        self.assertGreater(self.cache.hits, 0)
+
+    def test_lookup_rounds_up(self):
+        found = self.table.lookup("75 ft", "31 min", 0.21, (0.3, 0.7))
+        self.assertAlmostEqual(found["depth"].to("ft").m, 80)
+        self.assertEqual(found["bottom_time"].to("min").m, 40)
+        exact = self.table.lookup("80 ft", "40 min", 0.21, (0.3, 0.7))
+        self.assertEqual(found["runtime"], exact["runtime"])
+        # off the table
+        self.assertIsNone(self.table.lookup("150 ft", "10 min", 0.21, (0.3, 0.7)))
+        self.assertIsNone(self.table.lookup("40 ft", "61 min", 0.21, (0.3, 0.7)))
+        # too much oxygen to breathe at depth
+        self.assertIsNone(self.table.lookup("140 ft", "20 min", 0.32, (0.3, 0.7)))
+        with self.assertRaises(KeyError):
+            self.table.lookup("60 ft", "20 min", 0.5, (0.3, 0.7))
+        with self.assertRaises(KeyError):
+            # two gf pairs to pick from
+            self.table.lookup("60 ft", "20 min", 0.21)
+
+    def test_ndl(self):
+        for fO2 in [0.21, 0.32]:
+            for gf in [(0.3, 0.7), (1.0, 1.0)]:
+                ndls = self.table.columns["ndl"][
+                    :, self.table.gases.index(fO2), self.table.gfs.index(gf)
+                ]
+                ndls = ndls[~np.isnan(ndls)]
+                self.assertTrue(np.all(np.diff(ndls) <= 0))
+        # nitrox stays longer
+        self.assertGreater(
+            self.table.ndl("80 ft", 0.32, (1, 1)), self.table.ndl("80 ft", 0.21, (1, 1))
+        )
+        ndl = self.table.ndl("100 ft", 0.21, (1, 1))
+        self.assertEqual(len(self.table.lookup("100 ft", ndl, 0.21, (1, 1))["stops"]), 0)
+        self.assertGreater(
+            len(self.table.lookup("100 ft", ndl + 10 * cenote.TIME_UNIT, 0.21, (1, 1))["stops"]), 0
+        )
+
+    def test_interpolate(self):
+        corner = self.table.interpolate("runtime", "80 ft", "40 min", 0.21, (0.3, 0.7))
+        self.assertEqual(corner, self.table.lookup("80 ft", "40 min", 0.21, (0.3, 0.7))["runtime"])
+        low = self.table.lookup("60 ft", "40 min", 0.21, (0.3, 0.7))["runtime"]
+        high = self.table.lookup("80 ft", "40 min", 0.21, (0.3, 0.7))["runtime"]
+        middle = self.table.interpolate("runtime", (70, "ft"), "40 min", 0.21, (0.3, 0.7))
+        self.assertAlmostEqual(middle.m, (low.m + high.m) / 2)
+        with self.assertRaises(ValueError):
+            self.table.interpolate("runtime", "30 ft", "40 min", 0.21, (0.3, 0.7))
+        with self.assertRaises(ValueError):
+            self.table.interpolate("stop_depth", "60 ft", "40 min", 0.21, (0.3, 0.7))
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            tables.save_deco_table(path, self.table, metadata={"name": "test"})
+            loaded = tables.load_deco_table(path)
+            self.assertEqual(loaded.metadata, {"name": "test"})
+            self.assertEqual(loaded.tanks, self.table.tanks)
+            for name, column in self.table.columns.items():
+                np.testing.assert_array_equal(loaded.columns[name], column)
+            self.assertEqual(
+                loaded.lookup("95 ft", "33 min", 0.32, (1.0, 1.0)),
+                self.table.lookup("95 ft", "33 min", 0.32, (1.0, 1.0)),
+            )
+            del loaded
+
+    def test_axes(self):
+        # unevenly spaced axes are bisected instead
+        axis = tables._Axis([10, 20, 40, 80])
+        self.assertEqual(
+            [axis.ceil(value) for value in [5, 10, 11, 40, 41, 80]], [0, 0, 1, 2, 3, 3]
+        )
+        self.assertIsNone(axis.ceil(81))
+        axis = tables._Axis(np.arange(0.0, 3.0, 0.1))
+        self.assertEqual(axis.ceil(0.3), 3)
+        with self.assertRaises(ValueError):
+            tables._Axis([10, 10, 20])
+
+    def test_save_over(self):
+        with tempfile.TemporaryDirectory() as parent:
+            path = os.path.join(parent, "table")
+            tables.save_deco_table(path, self.table, metadata={"name": "first"})
+            first = tables.load_deco_table(path)
+            runtime = np.array(first.columns["runtime"])
+            tables.save_deco_table(path, self.table, metadata={"name": "second"})
+            # the mapped columns of the first save aren't written to
+            np.testing.assert_array_equal(first.columns["runtime"], runtime)
+            self.assertEqual(tables.load_deco_table(path).metadata, {"name": "second"})
+            self.assertEqual(os.listdir(parent), ["table"])
+            del first
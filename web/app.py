@@ -1,29 +1,37 @@
 #!/usr/bin/env python3
 # system
+import io
 import os
+import secrets
+import traceback
 
 # pip deps
 import flask
-import bokeh.embed
-import bokeh.resources
-import bokeh.themes
-import pretty_html_table
 
 # in the webapp
-import plot
+# plotting pulls in bokeh and pandas, which take a long time to import and are only needed by the
+# plot page, so `plot` and the other plotting deps are imported by the endpoints that use them.
+import assets
+import metrics
 import plan
+from cache import PlotCache, plan_key
 from state import State
 
 # elsewhere
 import bungee
 import cenote
 
+# signs the session cookie and csrf tokens. every worker process serving the app must use the same
+# key, so set SECRET_KEY in the environment when running more than one. without it, a random key is
+# made up for this process, which is fine for the dev server.
+SECRET_KEY = os.environ.get("SECRET_KEY") or secrets.token_hex(32)
 
-SECRET_KEY = "secret!"
-
-# ermagerd what if more than one person uses it?
-# lol that'll never happen
-USER_PLAN_PATH = "/tmp/user_plan.json"
+# /plot cache limits. set PLOT_CACHE_DIR to also keep entries on disk, e.g. to survive restarts or
+# to share them between worker processes.
+PLOT_CACHE_MAX_ENTRIES = int(os.environ.get("PLOT_CACHE_MAX_ENTRIES", 128))
+PLOT_CACHE_MAX_BYTES = int(os.environ.get("PLOT_CACHE_MAX_BYTES", 256 * 2**20))
+PLOT_CACHE_DIR = os.environ.get("PLOT_CACHE_DIR")
+PLOT_CACHE_MAX_DISK_BYTES = int(os.environ.get("PLOT_CACHE_MAX_DISK_BYTES", 2 * 2**30))
 
 
 class Webapp:
@@ -35,8 +43,25 @@ class Webapp:
         )
         self.app.add_url_rule("/plan/<state_b64>", methods=["GET", "POST"], view_func=self.plan)
         self.app.add_url_rule("/plot/<state_b64>", methods=["POST", "GET"], view_func=self.plot)
+        self.app.add_url_rule("/plot_cache", methods=["GET"], view_func=self.plot_cache_stats)
+        self.app.add_url_rule("/metrics", methods=["GET"], view_func=self.metrics_stats)
+        self.app.add_url_rule(
+            "/bokeh/<version>/static/<path:filename>", methods=["GET"], view_func=assets.bokeh_asset
+        )
+        self.app.after_request(assets.compress_response)
+        self.app.before_request(metrics.start_request)
+        self.app.after_request(metrics.finish_request)
+        if metrics.ENABLED:
+            metrics.enable()
+        self.plot_cache = PlotCache(
+            max_entries=PLOT_CACHE_MAX_ENTRIES,
+            max_bytes=PLOT_CACHE_MAX_BYTES,
+            disk_dir=PLOT_CACHE_DIR,
+            max_disk_bytes=PLOT_CACHE_MAX_DISK_BYTES,
+        )
 
-    def run(self, host="0.0.0.0", port=8888, debug=True, use_reloader=True):
+    def run(self, host="0.0.0.0", port=8888, debug=False, use_reloader=False):
+        """Run the flask dev server. Only for development, see `wsgi.py` for serving for real."""
         self.app.run(host=host, port=port, debug=debug, use_reloader=use_reloader)
 
     @staticmethod
@@ -45,9 +70,6 @@ class Webapp:
         upload_form = plan.UploadForm()
         plan_form = plan.PlanForm()
 
-        print(plan_form.tanks[0].kind)
-        print(plan_form.tanks[0].kind.data)
-
         # parse url arguments
         if state_b64 is not None:
             state = State.from_b64_str(state_b64)
@@ -60,11 +82,9 @@ class Webapp:
 
         # upload
         if upload_form.upload_button.data and upload_form.file_picker.data is not None:
-            # it will be of type FileStorage
-            # path = werkzeug.utils.secure_filename(upload_form.file_picker.data.filename)
-            upload_form.file_picker.data.save(USER_PLAN_PATH)
-            with open(USER_PLAN_PATH, "r") as f:
-                state = State.from_json_str(f.read())
+            # it will be of type FileStorage. plans are small, so just read it straight out of the
+            # request instead of saving it anywhere.
+            state = State.from_json_str(upload_form.file_picker.data.read().decode("utf-8"))
             # instead of trying to load everything in a second way here, just redirect back to the same
             # page using the url parameters so the code path above gets used
             return flask.redirect(flask.url_for("plan", state_b64=state.to_b64_str()))
@@ -98,75 +118,127 @@ class Webapp:
         # save
         if plan_form.save_button.data:
             state = State.from_forms(plan_form)
-            json_str = prettify_json(state.to_json_str())
-            with open(USER_PLAN_PATH, "w") as f:
-                f.write(json_str)
             return flask.send_file(
-                USER_PLAN_PATH, as_attachment=True, download_name="kalousac.json"
+                io.BytesIO(str(state).encode("utf-8")),
+                mimetype="application/json",
+                as_attachment=True,
+                download_name="kalousac.json",
             )
 
         return flask.render_template("plan.html", **kwargs)
 
-    @staticmethod
-    def plot(state_b64: str):
+    def plot(self, state_b64: str):
+        import bokeh
+        import plot
+
         # state must be well formed for this page to work at all
-        state = State.from_b64_str(state_b64)
-        # TODO: logging instead
-        print("Received state:\n{}".format(str(state)))
+        with metrics.timed("state"):
+            state = State.from_b64_str(state_b64)
+        # only formatted if debug logging is on
+        self.app.logger.debug("Received state:\n%s", state)
         nav_form = plot.NavForm()
         kwargs = {
             "nav_form": nav_form,
+            "plot_units": plot.requested_units(state.config["unit"]),
         }
         if nav_form.plan_button.data:
             # go back with the current plan in the editor
             # FIXME: if editing functionality ever added, will need to send b64 from state, not
             # from the original arg
             return flask.redirect(flask.url_for("plan", state_b64=state_b64))
-        try:
-            input_plan = cenote.plan_from_dict(state.plan)
-            output_plan = bungee.replan(input_plan)
-            result = cenote.get_result(output_plan)
-        except Exception as exc:
-            flask.flash("There's a problem with your dive plan:\n{}".format(traceback.format_exc()))
-            return flask.render_template("plot.html", **kwargs)
 
-        plan_table_df = plot.get_plan_df(
-            output_plan,
-            time_unit=state.config["unit"]["time"],
-            depth_unit=state.config["unit"]["depth"],
-        )
-        kwargs["plan_table"] = pretty_html_table.build_table(
-            plan_table_df,
-            "green_dark",
-            odd_bg_color="#242329",
-            even_bg_color="#282828",
-            even_color="white",
+        # the cache entry for a plan holds the computed plot data, plus the rendered page content.
+        # the page is rendered in bungee's units and switched to the display units in the browser,
+        # so one render serves every set of units.
+        with metrics.timed("cache"):
+            key = plan_key(state.plan)
+            entry = self.plot_cache.get(key)
+        if entry is None:
+            try:
+                with metrics.timed("parse"):
+                    input_plan = cenote.plan_from_dict(state.plan)
+                with metrics.timed("replan"):
+                    output_plan = bungee.replan(input_plan)
+                with metrics.timed("result"):
+                    result = cenote.get_result(output_plan, fields=plot.PlotData.FIELDS)
+            except Exception as exc:
+                flask.flash(
+                    "There's a problem with your dive plan:\n{}".format(traceback.format_exc())
+                )
+                return flask.render_template("plot.html", **kwargs)
+            with metrics.timed("plot_data"):
+                entry = {"data": plot.PlotData(output_plan, result), "render": None}
+            with metrics.timed("cache"):
+                self.plot_cache.put(key, entry)
+
+        if entry.get("render") is None:
+            entry["render"] = self.render_plot(entry["data"])
+            # update the size and disk copy
+            with metrics.timed("cache"):
+                self.plot_cache.put(key, entry)
+        kwargs.update(entry["render"])
+        # BokehJS is loaded from separate urls so that browsers cache it across plots
+        kwargs["bokeh_resources"] = assets.bokeh_resources(
+            "{}/bokeh/{}/".format(flask.request.script_root, bokeh.__version__)
         )
-        figs = [
-            plot.get_depth_fig(
-                result,
-                time_unit=state.config["unit"]["time"],
-                depth_unit=state.config["unit"]["depth"],
-            ),
-            plot.get_pressure_fig(
-                result,
-                time_unit=state.config["unit"]["time"],
-                pressure_unit=state.config["unit"]["pressure"],
-            ),
-            plot.get_gradient_fig(result, time_unit=state.config["unit"]["time"]),
-            # plot.get_compartment_fig(result)
-        ]
-        bokeh_theme = bokeh.themes.Theme(
-            os.path.join(os.path.dirname(__file__), "static", "bokeh_monokai_theme.yaml")
-        )
-        kwargs["bokeh_script"], kwargs["bokeh_divs"] = bokeh.embed.components(
-            figs, theme=bokeh_theme
-        )
-        kwargs["bokeh_resources"] = bokeh.resources.INLINE.render()
 
-        return flask.render_template("plot.html", **kwargs)
+        with metrics.timed("template"):
+            return flask.render_template("plot.html", **kwargs)
+
+    @staticmethod
+    def render_plot(data) -> dict:
+        """Render the parts of the plot page that depend on the plan from `plot.PlotData`, in
+        bungee's units. See `plot.add_unit_switching`."""
+        import bokeh.embed
+        import pretty_html_table
+        import plot
+
+        units = {kind: plot.bungee_unit_name(kind) for kind in plot.UNIT_KINDS}
+        rendered = {}
+        with metrics.timed("table"):
+            plan_table_df = plot.get_plan_df(
+                data.profile,
+                time_unit=units["time"],
+                depth_unit=units["depth"],
+            )
+            rendered["plan_table"] = pretty_html_table.build_table(
+                plan_table_df,
+                "green_dark",
+                odd_bg_color="#242329",
+                even_bg_color="#282828",
+                even_color="white",
+            )
+        with metrics.timed("figures"):
+            figs = [
+                plot.get_depth_fig(
+                    data,
+                    time_unit=units["time"],
+                    depth_unit=units["depth"],
+                ),
+                plot.get_pressure_fig(
+                    data,
+                    time_unit=units["time"],
+                    pressure_unit=units["pressure"],
+                ),
+                plot.get_gradient_fig(data, time_unit=units["time"]),
+                # plot.get_compartment_fig(result)
+            ]
+            models = plot.add_unit_switching(figs, data.profile)
+        with metrics.timed("embed"):
+            rendered["bokeh_script"], rendered["bokeh_divs"] = bokeh.embed.components(
+                models, theme=assets.bokeh_theme()
+            )
+        return rendered
+
+    def plot_cache_stats(self):
+        return flask.jsonify(self.plot_cache.stats())
+
+    def metrics_stats(self):
+        return flask.jsonify(metrics.stats())
 
 
 if __name__ == "__main__":
+    # the debugger runs arbitrary code from the browser, so it has to be asked for
+    debug = os.environ.get("WEB_DEBUG", "0") == "1"
     webapp = Webapp()
-    webapp.run()
+    webapp.run(debug=debug, use_reloader=debug)
@@ -0,0 +1,110 @@
+# system
+import functools
+import gzip
+import hashlib
+import mimetypes
+import os
+
+# pip deps
+import flask
+import werkzeug.security
+
+# BokehJS is served under a path with the bokeh version in it, so browsers can keep it forever
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+# responses smaller than this aren't worth compressing [bytes]
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+COMPRESS_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+}
+
+THEME_PATH = os.path.join(os.path.dirname(__file__), "static", "bokeh_monokai_theme.yaml")
+
+
+@functools.lru_cache(maxsize=None)
+def bokeh_theme():
+    """The plot theme, parsed once per process."""
+    import bokeh.themes
+
+    return bokeh.themes.Theme(THEME_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def bokeh_resources(root_url: str) -> str:
+    """Tags loading BokehJS from `root_url`, where `bokeh_asset` is routed."""
+    import bokeh.resources
+
+    return bokeh.resources.Resources(mode="server", root_url=root_url).render()
+
+
+@functools.lru_cache(maxsize=64)
+def _load_asset(path: str) -> tuple:
+    """(contents, gzipped contents, etag) of a file that doesn't change while the app runs."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, gzip.compress(data, COMPRESS_LEVEL), hashlib.sha256(data).hexdigest()[:32]
+
+
+def bokeh_asset(version: str, filename: str):
+    """Serve a file from the BokehJS bundle, compressed once per process."""
+    import bokeh
+    import bokeh.util.paths
+
+    if version != bokeh.__version__:
+        flask.abort(404)
+    path = werkzeug.security.safe_join(str(bokeh.util.paths.bokehjs_path()), filename)
+    if path is None or not os.path.isfile(path):
+        flask.abort(404)
+    data, gzipped, etag = _load_asset(path)
+
+    response = flask.Response(mimetype=mimetypes.guess_type(path)[0])
+    if "gzip" in flask.request.accept_encodings:
+        response.set_data(gzipped)
+        response.headers["Content-Encoding"] = "gzip"
+        # the two encodings are different representations, so they can't share an etag
+        etag += "-gzip"
+    else:
+        response.set_data(data)
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(flask.request)
+
+
+def _has_csrf_token() -> bool:
+    """Whether a CSRF token was rendered into this response. flask_wtf keeps the token generated for
+    a request in `flask.g`, under the name of its form field."""
+    return flask.current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token") in flask.g
+
+
+def compress_response(response: flask.Response) -> flask.Response:
+    """`after_request` hook that gzips text responses for clients that accept it.
+
+    Pages with a CSRF token are left alone. They also reflect the plan from the URL, so compressing
+    them would let an attacker who can make the browser load chosen URLs and watch the response size
+    recover the token a guess at a time (BREACH). Static assets and JSON carry no secrets, and are
+    the bulk of the bytes anyway.
+    """
+    if (
+        response.direct_passthrough
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESS_MIMETYPES
+        or "gzip" not in flask.request.accept_encodings
+        or (response.mimetype == "text/html" and _has_csrf_token())
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
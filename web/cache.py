@@ -0,0 +1,151 @@
+# system
+import collections
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+
+def plan_key(plan: dict) -> str:
+    """Canonical hash of a plan dict. Key order and whitespace don't matter, so the same plan
+    always lands on the same entry no matter how its URL was built."""
+    blob = json.dumps(plan, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class PlotCache:
+    """Bounded LRU cache for everything the /plot page computes from a plan.
+
+    Values can be anything picklable. Entries are evicted least recently used first once there are
+    more than `max_entries` of them or their pickled size adds up to more than `max_bytes`. If
+    `disk_dir` is given, every entry is also written there, so that entries evicted from memory
+    (or lost to a restart) can be loaded instead of recomputed. The disk tier is evicted oldest
+    first once it holds more than `max_disk_bytes`.
+
+    Safe to share between request threads.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        max_bytes: int = 256 * 2**20,
+        disk_dir: str = None,
+        max_disk_bytes: int = 2 * 2**30,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+        # key -> (value, size in bytes), least recently used first
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Returns the cached value, or None on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+        blob = self._read_disk(key)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        value = pickle.loads(blob)
+        with self._lock:
+            self.disk_hits += 1
+            self._insert(key, value, len(blob))
+        return value
+
+    def put(self, key: str, value):
+        """Insert or replace an entry. Call again after changing a cached value in place so its size
+        and the disk copy are updated."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._insert(key, value, len(blob))
+        self._write_disk(key, blob)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+            }
+
+    def _insert(self, key: str, value, size: int):
+        # must hold the lock
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        # always keep the newest entry, even if it's bigger than the limit on its own
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + ".pkl")
+
+    def _read_disk(self, key: str):
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        # mark as recently used for disk eviction
+        os.utime(path)
+        return blob
+
+    def _write_disk(self, key: str, blob: bytes):
+        if self.disk_dir is None:
+            return
+        # write to a temporary file and move it into place so that readers never see partial
+        # entries, even from other processes sharing the directory
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, self._path(key))
+        self._evict_disk()
+
+    def _evict_disk(self):
+        paths = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                paths.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        # oldest first, but never the one that was just written
+        paths.sort()
+        for _, size, path in paths[:-1]:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # another process got to it first
+                pass
+            total -= size
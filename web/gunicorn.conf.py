@@ -0,0 +1,15 @@
+# gunicorn settings for serving the web app, see `wsgi.py`. everything can be overridden from the
+# environment.
+import multiprocessing
+import os
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:8888")
+# replanning holds the gil for most of a request, so scale with processes rather than threads
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+# a few threads per worker so that slow clients and static files don't block the replanning
+threads = int(os.environ.get("WEB_THREADS", 4))
+# big plans can take a while to replan and plot
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+# import the app, including bungee, once before forking the workers
+preload_app = True
+accesslog = "-"
@@ -0,0 +1,89 @@
+# system
+import contextlib
+import os
+import threading
+import time
+
+# pip deps
+import flask
+
+# elsewhere
+import bungee
+
+# off unless asked for. when on, every response gets a Server-Timing header with the time spent in
+# each phase of the request (browsers show it in the network tab), bungee counts and times its hot
+# paths, and /metrics has the totals for this process.
+ENABLED = os.environ.get("WEB_METRICS", "0") == "1"
+
+_lock = threading.Lock()
+# phase name -> [calls, seconds], for every request this process has served
+_totals = {}
+_requests = 0
+
+
+def enable():
+    """Turn on timing for this process, e.g. from tests. Normally set by WEB_METRICS."""
+    global ENABLED
+    ENABLED = True
+    bungee.enable_stats()
+
+
+@contextlib.contextmanager
+def _timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        flask.g.setdefault("timings", []).append((name, time.perf_counter() - start))
+
+
+def timed(name: str):
+    """Context manager that times a phase of the current request. `name` shows up in the
+    Server-Timing header, so it has to be a single token. Costs nothing when disabled."""
+    if not ENABLED:
+        return contextlib.nullcontext()
+    return _timed(name)
+
+
+def start_request():
+    """before_request hook."""
+    if ENABLED:
+        flask.g.request_start = time.perf_counter()
+
+
+def finish_request(response: flask.Response) -> flask.Response:
+    """after_request hook that reports the timings of the request."""
+    global _requests
+    if not ENABLED or "request_start" not in flask.g:
+        return response
+    timings = flask.g.get("timings", [])
+    timings.append(("total", time.perf_counter() - flask.g.request_start))
+    # phases can repeat, e.g. rendering several figures, so they're added up
+    phases = {}
+    for name, seconds in timings:
+        phases[name] = phases.get(name, 0.0) + seconds
+    response.headers["Server-Timing"] = ", ".join(
+        "{};dur={:.3f}".format(name, seconds * 1e3) for name, seconds in phases.items()
+    )
+    with _lock:
+        _requests += 1
+        for name, seconds in phases.items():
+            total = _totals.setdefault(name, [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+    return response
+
+
+def stats() -> dict:
+    with _lock:
+        phases = {
+            name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in _totals.items()
+        }
+        requests = _requests
+    return {
+        "enabled": ENABLED,
+        "pid": os.getpid(),
+        "requests": requests,
+        "phases": phases,
+        "bungee": bungee.stats(),
+    }
@@ -4,6 +4,12 @@ import wtforms
 
 import bungee
 
+# unit choices, in the order they're offered. only ever append, since URLs store the index.
+TIME_UNITS = ["minute", "second", "hour"]
+DEPTH_UNITS = ["foot", "meter", "inch", "yard"]
+PRESSURE_UNITS = ["psi", "bar"]
+VOLUME_RATE_UNITS = ["cubic foot per minute", "liter per minute"]
+
 
 class TankSubform(wtforms.Form):
     # "name" field means something else
@@ -58,37 +64,22 @@ class PlanForm(flask_wtf.FlaskForm):
     time_unit = wtforms.fields.SelectField(
         "Time unit",
         default="minute",
-        choices=[
-            "minute",
-            "second",
-            "hour",
-        ],
+        choices=TIME_UNITS,
     )
     depth_unit = wtforms.fields.SelectField(
         "Depth unit",
         default="foot",
-        choices=[
-            "foot",
-            "meter",
-            "inch",
-            "yard",
-        ],
+        choices=DEPTH_UNITS,
     )
     pressure_unit = wtforms.fields.SelectField(
         "Pressure unit",
         default="psi",
-        choices=[
-            "psi",
-            "bar",
-        ],
+        choices=PRESSURE_UNITS,
     )
     volume_rate_unit = wtforms.fields.SelectField(
         "Volume rate unit",
         default="cubic foot per minute",
-        choices=[
-            "cubic foot per minute",
-            "liter per minute",
-        ],
+        choices=VOLUME_RATE_UNITS,
     )
 
     water = wtforms.fields.SelectField(
@@ -1,5 +1,11 @@
+import functools
+import json
+
 import pandas as pd
 import numpy as np
+import bokeh.document
+import bokeh.layouts
+import bokeh.models
 import bokeh.plotting
 import flask_wtf
 import flask_wtf.file
@@ -8,9 +14,9 @@ import werkzeug.utils
 
 import cenote
 import bungee
+import plan
 from state import State
 
-
 COLORS = {
     "yellow": "#e6db74",  # string; agreed
     "blue": "#66d9ef",  # builtin / storage type; agreed
@@ -27,6 +33,95 @@ COLORS = {
     "lightest-gray": "#cccccc",  # title text; disputed
     "white": "#f8f8f2",  # basic text; disputed
 }
+# figures are this many pixels wide, and each series is cut down to about two points per pixel
+# column of that before it's sent to the browser
+PLOT_WIDTH = 600
+# per compartment series are drawn faint and on top of each other, so they get fewer points
+LAYER_BUCKETS = PLOT_WIDTH // 4
+# depth slope changes smaller than this aren't profile corners [m / sample^2]
+CORNER_TOLERANCE = 1e-6
+
+# Units can be switched in the browser. Pages are built in bungee's units, every data source and
+# axis is tagged with the kind of quantity it holds, and `SWITCH_UNITS_JS` rescales them, so a
+# switch costs the server nothing. By kind: the unit choices offered and the cenote attribute with
+# bungee's unit. Gradients are always shown in percent.
+UNIT_KINDS = {
+    "time": (plan.TIME_UNITS, "TIME_UNIT"),
+    "depth": (plan.DEPTH_UNITS, "DEPTH_UNIT"),
+    "pressure": (plan.PRESSURE_UNITS, "PRESSURE_UNIT"),
+}
+# Callback of the unit selects. Each select is tagged with [kind, current unit, json of
+# {unit: [factor from bungee's unit, label]}], each data source with json of {column: kind} and
+# each axis with json of {"kind": kind, "name": axis name}. The plan table is rewritten from the
+# profile in bungee's units.
+SWITCH_UNITS_JS = """
+const [kind, current, choices_json] = cb_obj.tags;
+const unit = cb_obj.value;
+if (unit === current) {
+    return;
+}
+const choices = JSON.parse(choices_json);
+const ratio = choices[unit][0] / choices[current][0];
+const label = choices[unit][1];
+cb_obj.tags = [kind, unit, choices_json];
+
+// patches and multi lines hold a list of arrays per column
+const scale = (values) => (typeof values === "number" ? values * ratio : values.map(scale));
+for (const source of sources) {
+    const columns = JSON.parse(source.tags[0]);
+    const data = Object.assign({}, source.data);
+    for (const column in columns) {
+        if (columns[column] === kind) {
+            data[column] = scale(data[column]);
+        }
+    }
+    source.data = data;
+}
+for (const axis of axes) {
+    const tag = JSON.parse(axis.tags[0]);
+    if (tag.kind === kind) {
+        axis.axis_label = tag.name + " (" + label + ")";
+    }
+}
+
+// columns of `get_plan_df`
+const table_columns = {time: 0, depth: 1};
+const table = document.querySelector("#plan-table table");
+const profile = JSON.parse(profile_json);
+if (table !== null && kind in table_columns) {
+    const rows = table.tBodies[0].rows;
+    for (let i = 0; i < rows.length; i++) {
+        const value = profile[kind][i] * choices[unit][0];
+        rows[i].cells[table_columns[kind]].textContent = value.toFixed(0) + " " + label;
+    }
+}
+"""
+
+# Runs once the page is up, and switches to the units the page was asked for, which are in a json
+# script tag so that the rest of the page is the same for every unit. Units that aren't offered
+# come with their own factor and label, see `requested_units`.
+INITIAL_UNITS_JS = """
+const element = document.getElementById("plot-units");
+if (element === null) {
+    return;
+}
+const requested = JSON.parse(element.textContent);
+for (const select of selects) {
+    const [kind, current, choices_json] = select.tags;
+    if (!(kind in requested)) {
+        continue;
+    }
+    const [unit, factor, label] = requested[kind];
+    const choices = JSON.parse(choices_json);
+    if (!(unit in choices)) {
+        choices[unit] = [factor, label];
+        select.tags = [kind, current, JSON.stringify(choices)];
+        select.options = [...select.options, [unit, label]];
+    }
+    select.value = unit;
+}
+"""
+
 COLOR_ORDER = [
     # "green",
     "blue",
@@ -46,7 +141,11 @@ class PlotUnitHandler:
         if as_pint_type:
             return x.to(self.x_unit), y.to(self.y_unit)
         else:
-            return x.to(self.x_unit).magnitude, y.to(self.y_unit).magnitude
+            # only used for plotting, where single precision is plenty and half the page weight
+            return (
+                np.asarray(x.to(self.x_unit).magnitude, dtype=np.float32),
+                np.asarray(y.to(self.y_unit).magnitude, dtype=np.float32),
+            )
 
     def x_label(self):
         return format(self.x_unit, "~")
@@ -55,48 +154,212 @@ class PlotUnitHandler:
         return format(self.y_unit, "~")
 
 
-def get_plan_df(output_plan: bungee.Plan, time_unit: str, depth_unit: str) -> pd.DataFrame:
+@functools.lru_cache(maxsize=None)
+def unit_info(kind: str, name: str) -> tuple:
+    """(factor from bungee's unit, short label) of a display unit."""
+    unit = cenote.UREG.parse_units(name)
+    bungee_unit = getattr(cenote, UNIT_KINDS[kind][1])
+    return cenote.UREG.Quantity(1.0, bungee_unit).to(unit).m, format(unit, "~")
+
+
+def bungee_unit_name(kind: str) -> str:
+    return str(getattr(cenote, UNIT_KINDS[kind][1]))
+
+
+def requested_units(units: dict) -> dict:
+    """What `INITIAL_UNITS_JS` needs to switch to the display units in the state config: [unit,
+    factor, label] by kind."""
+    return {
+        kind: [units[kind], *unit_info(kind, units[kind])] for kind in UNIT_KINDS if kind in units
+    }
+
+
+def _tag_source(renderer, **columns):
+    """Tag the data source of a renderer with the kind of unit of each of its columns."""
+    renderer.data_source.tags = [json.dumps(columns)]
+
+
+def _tag_axis(axis, kind: str, name: str):
+    axis.tags = [json.dumps({"kind": kind, "name": name})]
+
+
+class PlotDeco:
+    """Deco fields of `PlotData`, named as in `cenote.Deco`."""
+
+    def __init__(self, data: "PlotData"):
+        self._data = data
+
+    ceiling = property(lambda self: self._data._quantity("ceiling", cenote.DEPTH_UNIT))
+    ceilings = property(lambda self: self._data._quantity("ceilings", cenote.DEPTH_UNIT))
+    gradient = property(lambda self: self._data._quantity("gradient", cenote.UREG.percent))
+    gradients = property(lambda self: self._data._quantity("gradients", cenote.UREG.percent))
+
+
+class PlotData:
+    """Everything the plot page needs from a replanned dive, and nothing that isn't picklable, so
+    it can be cached. Arrays are stored without units and exposed with the same names and units as
+    `cenote.Result`, so the figure functions take either one.
+
+    output_plan : bungee.Plan
+        The replanned dive.
+    result : cenote.Result
+        Result of `output_plan`, with at least the fields in `FIELDS`.
+    """
+
+    FIELDS = ["tank_pressure", "ceiling", "ceilings", "gradient", "gradients"]
+
+    def __init__(self, output_plan: bungee.Plan, result: cenote.Result):
+        # (time, depth, tank) in bungee units
+        self.profile = [
+            (point.time.value(), point.depth.value(), point.tank) for point in output_plan.profile()
+        ]
+        self.arrays = {
+            "time": result.time.m,
+            "depth": result.depth.m,
+            "ceiling": result.deco.ceiling.m,
+            "ceilings": result.deco.ceilings.m,
+            "gradient": result.deco.gradient.m,
+            "gradients": result.deco.gradients.m,
+        }
+        self.tank_pressure_arrays = {
+            tank: pressure.m for tank, pressure in result.tank_pressure.items()
+        }
+
+    def _quantity(self, name: str, unit):
+        return cenote.UREG.Quantity(self.arrays[name], unit)
+
+    time = property(lambda self: self._quantity("time", cenote.TIME_UNIT))
+    depth = property(lambda self: self._quantity("depth", cenote.DEPTH_UNIT))
+    deco = property(lambda self: PlotDeco(self))
+
+    @property
+    def tank_pressure(self) -> dict:
+        return {
+            tank: cenote.UREG.Quantity(pressure, cenote.PRESSURE_UNIT)
+            for tank, pressure in self.tank_pressure_arrays.items()
+        }
+
+
+def get_plan_df(profile: list, time_unit: str, depth_unit: str) -> pd.DataFrame:
+    """
+    profile : list of (time, depth, tank)
+        Points of the output plan in bungee units, as in `PlotData.profile`.
+    """
     unit = PlotUnitHandler(time_unit, depth_unit)
     data = []
-    for point in output_plan.profile():
-        # Plan is a bungee type, so not units
-        # FIXME: need to fully wrap bungee.Plan so it is never visile outside cenote.
+    for time, depth, tank in profile:
         time, depth = unit.convert(
-            point.time.value() * cenote.TIME_UNIT,
-            point.depth.value() * cenote.DEPTH_UNIT,
+            time * cenote.TIME_UNIT,
+            depth * cenote.DEPTH_UNIT,
             as_pint_type=True,
         )
-        data.append(["{:~.0f}".format(time), "{:~.0f}".format(depth), point.tank])
+        data.append(["{:~.0f}".format(time), "{:~.0f}".format(depth), tank])
     return pd.DataFrame(data, columns=["Time", "Depth", "Tank"])
 
 
+def downsample(y: np.ndarray, keep: np.ndarray = None, buckets: int = PLOT_WIDTH) -> np.ndarray:
+    """Indices of a subset of `y` that looks the same when plotted `buckets` pixels wide: the first
+    and last samples, the min and max of each of `buckets` equal slices, and every sample where
+    `keep` is True. Extrema and kept samples are exact, and the size doesn't depend on `len(y)`.
+    """
+    n = len(y)
+    if keep is None:
+        keep = np.zeros(n, dtype=bool)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    # pad the end with the last sample so the slices can be done as rows of a matrix
+    size = -(-n // buckets)
+    padded = np.empty(size * buckets)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    idxs = np.concatenate(
+        [
+            offsets + padded.argmin(axis=1),
+            offsets + padded.argmax(axis=1),
+            [0, n - 1],
+            np.nonzero(keep)[0],
+        ]
+    )
+    return np.unique(np.minimum(idxs, n - 1))
+
+
+def _downsample_where(
+    y: np.ndarray, mask: np.ndarray, keep: np.ndarray, buckets: int = PLOT_WIDTH
+) -> np.ndarray:
+    """`downsample` only the samples of `y` where `mask` is True, keeping both ends of every run of
+    them. Returns indices into `y`."""
+    idxs = np.nonzero(mask)[0]
+    edges = np.zeros(len(idxs), dtype=bool)
+    gaps = np.diff(idxs) > 1
+    edges[:-1] |= gaps
+    edges[1:] |= gaps
+    return idxs[downsample(y[idxs], keep[idxs] | edges, buckets)]
+
+
+def get_corners(result: cenote.Result, gas_switches: bool = False) -> np.ndarray:
+    """Mask of the samples that downsampling must keep: the corners of the profile, where the depth
+    rate changes, and optionally the gas switches, where a tank starts or stops being used."""
+    depth = result.depth.m
+    corners = np.zeros(len(depth), dtype=bool)
+    corners[1:-1] = np.abs(np.diff(depth, 2)) > CORNER_TOLERANCE
+    if gas_switches:
+        for pressure in result.tank_pressure.values():
+            in_use = np.diff(pressure.m) != 0
+            corners[1:-1] |= np.diff(in_use)
+    return corners
+
+
 def get_depth_fig(result: cenote.Result, time_unit: str, depth_unit: str) -> str:
-    fig = bokeh.plotting.figure(title="Profile")
+    fig = bokeh.plotting.figure(title="Profile", width=PLOT_WIDTH)
     unit = PlotUnitHandler(time_unit, depth_unit)
+    corners = get_corners(result)
 
     # profile
-    fig.line(
-        *unit.convert(result.time, result.depth), color=COLORS["green"], legend_label="Profile"
+    idxs = downsample(result.depth.m, corners)
+    renderer = fig.line(
+        *unit.convert(result.time[idxs], result.depth[idxs]),
+        color=COLORS["green"],
+        legend_label="Profile",
     )
+    _tag_source(renderer, x="time", y="depth")
     # ceiling
-    idxs = np.nonzero(result.deco.ceiling > 0)[0]
-    fig.line(
-        *unit.convert(result.time[idxs], result.deco.ceiling[idxs]),
+    ceiling = result.deco.ceiling
+    idxs = _downsample_where(ceiling.m, ceiling.m > 0, corners)
+    renderer = fig.line(
+        *unit.convert(result.time[idxs], ceiling[idxs]),
         color=COLORS["pink"],
         legend_label="Ceiling",
     )
-    # compartment ceilings
-    for i in range(result.deco.ceilings.shape[0]):
-        idxs = np.nonzero(result.deco.ceilings[i, :] > 0)[0]
+    _tag_source(renderer, x="time", y="depth")
+    # compartment ceilings, as one glyph with a closed polygon down to the surface per compartment
+    ceilings = result.deco.ceilings
+    xs, ys = [], []
+    for i in range(ceilings.shape[0]):
+        idxs = _downsample_where(ceilings.m[i, :], ceilings.m[i, :] > 0, corners, LAYER_BUCKETS)
         if len(idxs):
-            x, y = unit.convert(result.time[idxs], result.deco.ceilings[i, idxs])
-            fig.varea(x=x, y1=0, y2=y, alpha=0.1, color=COLORS["pink"])
+            x, y = unit.convert(result.time[idxs], ceilings[i, idxs])
+            xs.append(np.concatenate([x, x[::-1]]))
+            ys.append(np.concatenate([y, np.zeros(len(y))]))
+    if xs:
+        renderer = fig.patches(
+            source=bokeh.models.ColumnDataSource({"xs": xs, "ys": ys}),
+            xs="xs",
+            ys="ys",
+            alpha=0.1,
+            color=COLORS["pink"],
+            line_color=None,
+        )
+        _tag_source(renderer, xs="time", ys="depth")
 
     # formatting
     fig.y_range.flipped = True
     fig.legend.location = "bottom_right"
     fig.xaxis.axis_label = "Time ({})".format(unit.x_label())
     fig.yaxis.axis_label = "Depth ({})".format(unit.y_label())
+    _tag_axis(fig.xaxis[0], "time", "Time")
+    _tag_axis(fig.yaxis[0], "depth", "Depth")
 
     return fig
 
@@ -106,40 +369,64 @@ def get_pressure_fig(result: cenote.Result, time_unit: str, pressure_unit: str)
     if len(result.tank_pressure) > len(COLOR_ORDER):
         raise Exception("Too many tanks to plot pressure in distinct colors")
 
-    fig = bokeh.plotting.figure(title="Tank Pressure")
+    fig = bokeh.plotting.figure(title="Tank Pressure", width=PLOT_WIDTH)
     unit = PlotUnitHandler(time_unit, pressure_unit)
+    corners = get_corners(result, gas_switches=True)
 
     for idx, tank in enumerate(result.tank_pressure):
         color = COLORS[COLOR_ORDER[idx]]
-        fig.line(
-            *unit.convert(result.time, result.tank_pressure[tank]),
+        pressure = result.tank_pressure[tank]
+        idxs = downsample(pressure.m, corners)
+        renderer = fig.line(
+            *unit.convert(result.time[idxs], pressure[idxs]),
             color=color,
             legend_label=tank,
         )
+        _tag_source(renderer, x="time", y="pressure")
+
+    # formatting
+    fig.xaxis.axis_label = "Time ({})".format(unit.x_label())
+    fig.yaxis.axis_label = "Pressure ({})".format(unit.y_label())
+    _tag_axis(fig.xaxis[0], "time", "Time")
+    _tag_axis(fig.yaxis[0], "pressure", "Pressure")
 
     return fig
 
 
 def get_gradient_fig(result: cenote.Result, time_unit: str) -> str:
-    fig = bokeh.plotting.figure(title="Gradient")
+    fig = bokeh.plotting.figure(title="Gradient", width=PLOT_WIDTH)
 
     unit = PlotUnitHandler(time_unit, "percent")
+    corners = get_corners(result)
 
     # gradient of controlling compartment
-    idxs = np.nonzero(result.deco.gradient >= 0)[0]
-    fig.line(*unit.convert(result.time[idxs], result.deco.gradient[idxs]), color=COLORS["green"])
-    # gradient of each compartment
-    for i in range(result.deco.gradients.shape[0]):
-        idxs = np.nonzero(result.deco.gradients[i, :] > 0)[0]
+    gradient = result.deco.gradient
+    idxs = _downsample_where(gradient.m, gradient.m >= 0, corners)
+    renderer = fig.line(*unit.convert(result.time[idxs], gradient[idxs]), color=COLORS["green"])
+    _tag_source(renderer, x="time")
+    # gradient of each compartment, as one glyph
+    gradients = result.deco.gradients
+    xs, ys = [], []
+    for i in range(gradients.shape[0]):
+        idxs = _downsample_where(gradients.m[i, :], gradients.m[i, :] > 0, corners, LAYER_BUCKETS)
         if len(idxs):
-            fig.line(
-                *unit.convert(result.time[idxs], result.deco.gradients[i, idxs]),
-                color=COLORS["green"],
-                line_alpha=0.3,
-            )
+            x, y = unit.convert(result.time[idxs], gradients[i, idxs])
+            xs.append(x)
+            ys.append(y)
+    if xs:
+        renderer = fig.multi_line(
+            source=bokeh.models.ColumnDataSource({"xs": xs, "ys": ys}),
+            xs="xs",
+            ys="ys",
+            color=COLORS["green"],
+            line_alpha=0.3,
+        )
+        _tag_source(renderer, xs="time")
 
     # formatting
-    # plt.ylabel("Gradient (%)")
+    fig.xaxis.axis_label = "Time ({})".format(unit.x_label())
+    fig.yaxis.axis_label = "Gradient (%)"
+    _tag_axis(fig.xaxis[0], "time", "Time")
 
     return fig
 
@@ -178,5 +465,65 @@ def get_gradient_fig(result: cenote.Result, time_unit: str) -> str:
 #     return fig_to_html(fig)
 
 
+def get_unit_selects() -> list:
+    """A select for each kind of unit, starting out in bungee's units like the rest of the page.
+    See `SWITCH_UNITS_JS` for the tags."""
+    selects = []
+    for kind, (names, _) in UNIT_KINDS.items():
+        current = bungee_unit_name(kind)
+        if current not in names:
+            names = [current] + names
+        choices = {name: unit_info(kind, name) for name in names}
+        selects.append(
+            bokeh.models.Select(
+                title=kind.capitalize(),
+                value=current,
+                options=[(name, label) for name, (_, label) in choices.items()],
+                tags=[kind, current, json.dumps(choices)],
+                width=120,
+            )
+        )
+    return selects
+
+
+def add_unit_switching(figs: list, profile: list) -> list:
+    """Put unit selects in front of figures built in bungee's units, which switch every figure and
+    the plan table between units in the browser.
+
+    figs : list of bokeh figures
+        Figures with tagged data sources and axes, e.g. from `get_depth_fig`.
+    profile : list of (time, depth, tank)
+        Points of the output plan in bungee units, as in `PlotData.profile`.
+
+    Returns the models to embed, all in one document that switches to the requested units once
+    it's loaded. See `requested_units`.
+    """
+    selects = get_unit_selects()
+    sources = [
+        renderer.data_source
+        for fig in figs
+        for renderer in fig.renderers
+        if renderer.data_source.tags
+    ]
+    axes = [axis for fig in figs for axis in fig.xaxis + fig.yaxis if axis.tags]
+    profile_json = json.dumps(
+        {"time": [point[0] for point in profile], "depth": [point[1] for point in profile]}
+    )
+    callback = bokeh.models.CustomJS(
+        args=dict(sources=sources, axes=axes, profile_json=profile_json), code=SWITCH_UNITS_JS
+    )
+    for select in selects:
+        select.js_on_change("value", callback)
+
+    models = [bokeh.layouts.row(*selects)] + figs
+    doc = bokeh.document.Document()
+    for model in models:
+        doc.add_root(model)
+    doc.js_on_event(
+        "document_ready", bokeh.models.CustomJS(args=dict(selects=selects), code=INITIAL_UNITS_JS)
+    )
+    return models
+
+
 class NavForm(flask_wtf.FlaskForm):
     plan_button = wtforms.fields.SubmitField(label="Back to Planning")
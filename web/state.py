@@ -1,26 +1,335 @@
 # system
-import json
+import array
 import base64
-import pprint
+import binascii
+import json
+import struct
+import sys
+import zlib
 
 # webapp
 import plan
 
-
-def minify_json(blob: str) -> str:
-    return json.dumps(json.loads(blob), separators=(",", ":"))
-
-
-def prettify_json(blob: str) -> str:
-    return json.dumps(json.loads(blob), indent=4, sort_keys=True)
+import bungee
+
+# URL state encoding
+#
+# A state in a URL is URL-safe base64, without padding, of a version byte followed by the zlib
+# compressed body. Version 1 bodies are laid out by `STATE_SCHEMA`. States that don't fit the schema
+# (e.g. uploaded files with extra keys) are stored as version 0, which is minified JSON. URLs from
+# before any of this are plain base64 JSON, which is told apart by decoding to something that starts
+# with "{".
+#
+# Walking the schema splits a state into three flat arrays: unsigned ints (struct key masks, list
+# lengths, enum and string indices), floats, and a table of distinct strings. Each array is packed
+# and unpacked in one go, so there's no per-byte work in python, and repeated strings (units,
+# depths, tank names) are only stored once.
+
+STATE_VERSION = 1
+_JSON_VERSION = 0
+
+# int array widths by typecode, and the header of a version 1 body: int typecode, then the number
+# of ints, floats and string table bytes
+_INT_TYPECODES = ["B", "H", "I"]
+_BODY_HEADER = struct.Struct("<cIII")
+
+
+class _SchemaMismatch(Exception):
+    """The state doesn't fit the schema, so it has to be stored as JSON instead."""
+
+
+class _Encoder:
+    def __init__(self):
+        self.ints = []
+        self.floats = []
+        # distinct strings by their index in the table. 0 is reserved for missing values.
+        self.strings = {}
+
+    def string(self, value) -> int:
+        if not isinstance(value, str) or "\0" in value:
+            raise _SchemaMismatch()
+        return self.strings.setdefault(value, len(self.strings) + 1)
+
+    def body(self) -> bytes:
+        ints = self.ints
+        typecode = next(
+            code
+            for code in _INT_TYPECODES
+            if max(ints, default=0) < 256 ** array.array(code).itemsize
+        )
+        ints = array.array(typecode, ints)
+        floats = array.array("d", self.floats)
+        if sys.byteorder == "big":
+            ints.byteswap()
+            floats.byteswap()
+        strings = "\0".join(self.strings).encode("utf-8")
+        header = _BODY_HEADER.pack(typecode.encode("ascii"), len(ints), len(floats), len(strings))
+        return header + ints.tobytes() + floats.tobytes() + strings
+
+
+class _Decoder:
+    def __init__(self, body: bytes):
+        try:
+            typecode, int_count, float_count, string_size = _BODY_HEADER.unpack_from(body)
+            typecode = typecode.decode("ascii")
+            if typecode not in _INT_TYPECODES:
+                raise ValueError("bad int typecode")
+            ints = array.array(typecode)
+            floats = array.array("d")
+            pos = _BODY_HEADER.size
+            ints.frombytes(body[pos : pos + int_count * ints.itemsize])
+            pos += int_count * ints.itemsize
+            floats.frombytes(body[pos : pos + float_count * floats.itemsize])
+            pos += float_count * floats.itemsize
+        except (struct.error, ValueError) as e:
+            raise ValueError("state body is malformed") from e
+        if len(ints) != int_count or len(floats) != float_count or pos + string_size != len(body):
+            raise ValueError("state body is the wrong size")
+        if sys.byteorder == "big":
+            ints.byteswap()
+            floats.byteswap()
+        self.ints = ints.tolist()
+        self.floats = floats.tolist()
+        self.strings = [None] + body[pos:].decode("utf-8").split("\0")
+        self.int_pos = 0
+        self.float_pos = 0
+
+    def int(self) -> int:
+        value = self.ints[self.int_pos]
+        self.int_pos += 1
+        return value
+
+    def int_slice(self, count: int) -> list:
+        values = self.ints[self.int_pos : self.int_pos + count]
+        if len(values) != count:
+            raise IndexError()
+        self.int_pos += count
+        return values
+
+    def float(self) -> float:
+        value = self.floats[self.float_pos]
+        self.float_pos += 1
+        return value
+
+    def done(self) -> bool:
+        return self.int_pos == len(self.ints) and self.float_pos == len(self.floats)
+
+
+class _String:
+    def encode(self, encoder: _Encoder, value):
+        encoder.ints.append(encoder.string(value))
+
+    def decode(self, decoder: _Decoder):
+        return decoder.strings[decoder.int()]
+
+
+class _Number:
+    """Float, or int that a float holds exactly. Stored as a flag for whether it's an int, so that
+    uploaded plans with e.g. `"fO2": 1` come back the same, and the value as a float."""
+
+    def encode(self, encoder: _Encoder, value):
+        if type(value) is int and abs(value) <= 2**53:
+            encoder.ints.append(1)
+        elif type(value) is float:
+            encoder.ints.append(0)
+        else:
+            raise _SchemaMismatch()
+        encoder.floats.append(float(value))
+
+    def decode(self, decoder: _Decoder):
+        is_int = decoder.int()
+        value = decoder.float()
+        return int(value) if is_int else value
+
+
+class _Enum:
+    """One of a known list of strings, stored as its index plus one. Anything else is stored as 0
+    followed by the string, so that the list can grow without breaking old URLs as long as it's only
+    appended to."""
+
+    def __init__(self, choices):
+        self.choices = [None] + list(choices)
+        self.index = {choice: i for i, choice in enumerate(self.choices) if i > 0}
+
+    def encode(self, encoder: _Encoder, value):
+        index = self.index.get(value, 0)
+        encoder.ints.append(index)
+        if index == 0:
+            encoder.ints.append(encoder.string(value))
+
+    def decode(self, decoder: _Decoder):
+        index = decoder.int()
+        return self.choices[index] if index else decoder.strings[decoder.int()]
+
+
+class _Struct:
+    """Dict with a fixed set of keys, any of which may be missing. Stored as a mask of the keys that
+    are present followed by their values in schema order."""
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.keys = {key for key, _ in fields}
+        self.full_mask = (1 << len(fields)) - 1
+
+    def encode(self, encoder: _Encoder, value):
+        if not isinstance(value, dict) or not value.keys() <= self.keys:
+            raise _SchemaMismatch()
+        mask_pos = len(encoder.ints)
+        encoder.ints.append(0)
+        for i, (key, node) in enumerate(self.fields):
+            if key in value:
+                encoder.ints[mask_pos] |= 1 << i
+                node.encode(encoder, value[key])
+
+    def decode(self, decoder: _Decoder):
+        mask = decoder.int()
+        # usually every key is there
+        if mask == self.full_mask:
+            return {key: node.decode(decoder) for key, node in self.fields}
+        return {
+            key: node.decode(decoder)
+            for i, (key, node) in enumerate(self.fields)
+            if mask & (1 << i)
+        }
 
 
-def base64_from_json(blob: str) -> bytes:
-    return base64.b64encode(minify_json(blob).encode("utf-8"))
+class _Table:
+    """List of dicts with a fixed set of string keys, any of which may be missing. Stored one column
+    at a time, as the length followed by the string index of each row for each key, where 0 means
+    missing."""
+
+    def __init__(self, *keys):
+        self.keys = keys
+
+    def encode(self, encoder: _Encoder, value):
+        if not isinstance(value, list):
+            raise _SchemaMismatch()
+        keys = set(self.keys)
+        for row in value:
+            if not isinstance(row, dict) or not row.keys() <= keys:
+                raise _SchemaMismatch()
+        encoder.ints.append(len(value))
+        for key in self.keys:
+            encoder.ints.extend(
+                [0 if key not in row else encoder.string(row[key]) for row in value]
+            )
+
+    def decode(self, decoder: _Decoder):
+        count = decoder.int()
+        strings = decoder.strings
+        columns = [[strings[i] for i in decoder.int_slice(count)] for _ in self.keys]
+        rows = [dict(zip(self.keys, row)) for row in zip(*columns)]
+        for key, column in zip(self.keys, columns):
+            if not all(column):
+                for row, cell in zip(rows, column):
+                    if cell is None:
+                        del row[key]
+        return rows
+
+
+class _Map:
+    """Dict of string keys to values, in order."""
+
+    def __init__(self, item):
+        self.item = item
+
+    def encode(self, encoder: _Encoder, value):
+        if not isinstance(value, dict):
+            raise _SchemaMismatch()
+        encoder.ints.append(len(value))
+        for key, item in value.items():
+            encoder.ints.append(encoder.string(key))
+            self.item.encode(encoder, item)
+
+    def decode(self, decoder: _Decoder):
+        return {
+            decoder.strings[decoder.int()]: self.item.decode(decoder) for _ in range(decoder.int())
+        }
 
 
-def json_from_base64(blob: str) -> str:
-    return base64.b64decode(blob)
+# Layout of version 1 bodies, matching `State.to_dict`. Only ever append to the fields of a
+# `_Struct` and to the choices of an `_Enum`; anything else needs a new `STATE_VERSION`.
+STATE_SCHEMA = _Struct(
+    (
+        "config",
+        _Struct(
+            (
+                "unit",
+                _Struct(
+                    ("time", _Enum(plan.TIME_UNITS)),
+                    ("depth", _Enum(plan.DEPTH_UNITS)),
+                    ("pressure", _Enum(plan.PRESSURE_UNITS)),
+                    ("volume_rate", _Enum(plan.VOLUME_RATE_UNITS)),
+                ),
+            ),
+        ),
+    ),
+    (
+        "plan",
+        _Struct(
+            ("water", _Enum(bungee.Water(i).name for i in range(bungee.Water.COUNT.value))),
+            ("gf", _Struct(("low", _Number()), ("high", _Number()))),
+            ("scr", _Struct(("work", _String()), ("deco", _String()))),
+            (
+                "tanks",
+                _Map(
+                    _Struct(
+                        (
+                            "type",
+                            _Enum(bungee.Tank(i).name for i in range(bungee.Tank.COUNT.value)),
+                        ),
+                        ("pressure", _String()),
+                        ("mix", _Struct(("fO2", _Number()))),
+                    )
+                ),
+            ),
+            ("profile", _Table("tank", "duration", "depth")),
+        ),
+    ),
+)
+
+
+def encode_state(data: dict) -> str:
+    """Encode a state dict for use in a URL."""
+    encoder = _Encoder()
+    try:
+        STATE_SCHEMA.encode(encoder, data)
+        version = STATE_VERSION
+        body = encoder.body()
+    except _SchemaMismatch:
+        version = _JSON_VERSION
+        body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    blob = bytes([version]) + zlib.compress(body, 9)
+    return base64.urlsafe_b64encode(blob).rstrip(b"=").decode("ascii")
+
+
+def decode_state(blob: str) -> dict:
+    """Inverse of `encode_state`. Also takes legacy base64 JSON."""
+    try:
+        # the legacy format is standard base64, which urlsafe decoding also takes
+        data = base64.urlsafe_b64decode(blob + "=" * (-len(blob) % 4))
+    except binascii.Error as e:
+        raise ValueError("state is not base64") from e
+    if data[:1] == b"{":
+        return json.loads(data)
+    if not data:
+        raise ValueError("state is empty")
+    try:
+        body = zlib.decompress(data[1:])
+    except zlib.error as e:
+        raise ValueError("state is not compressed") from e
+    if data[0] == _JSON_VERSION:
+        return json.loads(body)
+    if data[0] != STATE_VERSION:
+        raise ValueError("unknown state version {}".format(data[0]))
+    decoder = _Decoder(body)
+    try:
+        state = STATE_SCHEMA.decode(decoder)
+    except IndexError as e:
+        raise ValueError("state is truncated") from e
+    if not decoder.done():
+        raise ValueError("state has trailing data")
+    return state
 
 
 class State:
@@ -28,7 +337,7 @@ class State:
 
     Stores everything needed to replicate web app state, including the user plan and app config
 
-    TODO: turn this into protobuf, along with input to bungee
+    TODO: share a schema with the input to bungee
     """
 
     def __init__(self, config: dict, plan: dict):
@@ -36,7 +345,7 @@ class State:
         self.plan = plan
 
     def __str__(self):
-        return prettify_json(self.to_json_str())
+        return json.dumps(self.to_dict(), indent=4, sort_keys=True)
 
     @staticmethod
     def from_dict(data: dict):
@@ -48,7 +357,7 @@ class State:
 
     @staticmethod
     def from_b64_str(b64_str: str):
-        return State.from_json_str(json_from_base64(b64_str))
+        return State.from_dict(decode_state(b64_str))
 
     @staticmethod
     def from_forms(plan_form: plan.PlanForm):
@@ -105,7 +414,6 @@ class State:
             for segment in plan_form.profile
         ]
 
-        pprint.pprint(data)
         return State.from_dict(data)
 
     def to_dict(self) -> dict:
@@ -115,11 +423,10 @@ class State:
         }
 
     def to_json_str(self) -> str:
-        # FIXME: json dump/parse/dump can be simplified to be faster
-        return minify_json(json.dumps(self.to_dict()))
+        return json.dumps(self.to_dict(), separators=(",", ":"))
 
     def to_b64_str(self) -> str:
-        return base64_from_json(self.to_json_str())
+        return encode_state(self.to_dict())
 
     def to_forms(self, plan_form: plan.PlanForm):
         ## Config
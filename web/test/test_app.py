@@ -0,0 +1,82 @@
+import copy
+import gzip
+import json
+import os
+import sys
+import unittest
+
+WEB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, WEB_DIR)
+
+import app
+import flask
+from state import State
+
+EXAMPLE = os.path.join(WEB_DIR, "examples", "big.json")
+UNITS = {
+    "time": "minute",
+    "depth": "foot",
+    "pressure": "psi",
+    "volume_rate": "cubic foot per minute",
+}
+
+
+class TestPlot(unittest.TestCase):
+    def setUp(self):
+        webapp = app.Webapp()
+        webapp.app.config["WTF_CSRF_ENABLED"] = False
+        self.client = webapp.app.test_client()
+        with open(EXAMPLE, "r") as f:
+            self.data = json.load(f)
+        self.data["config"] = {"unit": UNITS}
+
+    def get(self, data: dict):
+        return self.client.get("/plot/" + State.from_dict(data).to_b64_str())
+
+    def test_plot(self):
+        response = self.get(self.data)
+        self.assertEqual(response.status_code, 200)
+        page = response.data.decode()
+        self.assertIn('id="plot-units">', page)
+        self.assertNotIn("There&#39;s a problem with your dive plan", page)
+
+    def test_bad_plan(self):
+        # a hypoxic bottom gas and nothing else can't be offgassed on at the shallow stops
+        data = copy.deepcopy(self.data)
+        data["plan"]["gf"] = {"low": 0.1, "high": 0.1}
+        data["plan"]["tanks"] = {"Sidemount": data["plan"]["tanks"]["Sidemount"]}
+        data["plan"]["tanks"]["Sidemount"]["mix"]["fO2"] = 0.1
+        response = self.get(data)
+        self.assertEqual(response.status_code, 200)
+        page = response.data.decode()
+        self.assertIn("There&#39;s a problem with your dive plan", page)
+        self.assertIn("can never be cleared", page)
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        # csrf stays enabled, the token is what this is about
+        webapp = app.Webapp()
+        webapp.app.add_url_rule("/test/json", "test_json", lambda: flask.jsonify(["x" * 4096]))
+        webapp.app.add_url_rule("/test/html", "test_html", lambda: "<p>{}</p>".format("x" * 4096))
+        self.client = webapp.app.test_client()
+        with open(EXAMPLE, "r") as f:
+            data = json.load(f)
+        data["config"] = {"unit": UNITS}
+        self.state = State.from_dict(data).to_b64_str()
+
+    def get(self, url: str):
+        return self.client.get(url, headers={"Accept-Encoding": "gzip"})
+
+    def test_page_with_csrf_token(self):
+        response = self.get("/plot/" + self.state)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIn("csrf_token", response.data.decode())
+
+    def test_compressed(self):
+        for url, mimetype in [("/test/json", "application/json"), ("/test/html", "text/html")]:
+            response = self.get(url)
+            self.assertEqual(response.mimetype, mimetype)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertIn(b"x" * 4096, gzip.decompress(response.data))
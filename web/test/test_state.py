@@ -0,0 +1,124 @@
+import base64
+import json
+import os
+import sys
+import unittest
+import zlib
+
+WEB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, WEB_DIR)
+
+import state
+from state import State, decode_state, encode_state
+
+EXAMPLE = os.path.join(WEB_DIR, "examples", "big.json")
+UNITS = {
+    "time": "minute",
+    "depth": "foot",
+    "pressure": "psi",
+    "volume_rate": "cubic foot per minute",
+}
+
+
+def version(blob: str) -> int:
+    return base64.urlsafe_b64decode(blob + "=" * (-len(blob) % 4))[0]
+
+
+def blob_of(version: int, body: bytes) -> str:
+    return base64.urlsafe_b64encode(bytes([version]) + zlib.compress(body)).decode("ascii")
+
+
+class TestStateCodec(unittest.TestCase):
+    def setUp(self):
+        with open(EXAMPLE, "r") as f:
+            self.data = json.load(f)
+        self.data["config"] = {"unit": UNITS}
+
+    def assertRoundTrip(self, data: dict, expected_version: int):
+        blob = encode_state(data)
+        self.assertEqual(version(blob), expected_version)
+        decoded = decode_state(blob)
+        self.assertEqual(decoded, data)
+        # ints and floats are told apart, not just equal
+        self.assertEqual(json.dumps(decoded, sort_keys=True), json.dumps(data, sort_keys=True))
+
+    def test_round_trip(self):
+        self.assertRoundTrip(self.data, state.STATE_VERSION)
+        state_obj = State.from_dict(self.data)
+        self.assertEqual(State.from_b64_str(state_obj.to_b64_str()).to_dict(), self.data)
+
+    def test_numbers(self):
+        tank = next(iter(self.data["plan"]["tanks"].values()))
+        for fO2 in [1, 0, 0.32, 1.0, -0.5]:
+            tank["mix"]["fO2"] = fO2
+            self.assertRoundTrip(self.data, state.STATE_VERSION)
+
+    def test_legacy(self):
+        legacy = base64.b64encode(json.dumps(self.data).encode("utf-8")).decode("ascii")
+        self.assertEqual(decode_state(legacy), self.data)
+        self.assertEqual(decode_state(legacy.rstrip("=")), self.data)
+
+    def test_json_fallback(self):
+        # extra keys don't fit the schema
+        self.data["plan"]["notes"] = "bring a light"
+        self.assertRoundTrip(self.data, state._JSON_VERSION)
+        # and neither do values of the wrong type
+        del self.data["plan"]["notes"]
+        self.data["plan"]["gf"]["low"] = "30"
+        self.assertRoundTrip(self.data, state._JSON_VERSION)
+
+    def test_unknown_enum(self):
+        self.data["plan"]["water"] = "BRACKISH"
+        tank = next(iter(self.data["plan"]["tanks"].values()))
+        tank["type"] = "AL100"
+        self.data["config"]["unit"]["depth"] = "fathom"
+        self.assertRoundTrip(self.data, state.STATE_VERSION)
+
+    def test_missing_tank(self):
+        profile = self.data["plan"]["profile"]
+        self.assertGreater(len(profile), 1)
+        for segment in profile[1:]:
+            segment.pop("tank", None)
+        self.assertRoundTrip(self.data, state.STATE_VERSION)
+        del profile[0]["tank"]
+        self.assertRoundTrip(self.data, state.STATE_VERSION)
+        self.data["plan"]["profile"] = []
+        self.assertRoundTrip(self.data, state.STATE_VERSION)
+
+    def test_malformed(self):
+        for bad in [
+            "",
+            "!!!",
+            "A",
+            blob_of(state._JSON_VERSION, b"{not json"),
+            blob_of(state.STATE_VERSION + 1, b""),
+            blob_of(state.STATE_VERSION, b"x"),
+            base64.urlsafe_b64encode(bytes([state.STATE_VERSION]) + b"not zlib").decode("ascii"),
+        ]:
+            with self.subTest(bad=bad):
+                with self.assertRaises(ValueError):
+                    decode_state(bad)
+
+    def test_truncated(self):
+        blob = encode_state(self.data)
+        for end in range(len(blob)):
+            with self.subTest(end=end):
+                with self.assertRaises(ValueError):
+                    decode_state(blob[:end])
+
+    def test_body_too_short(self):
+        encoder = state._Encoder()
+        state.STATE_SCHEMA.encode(encoder, self.data)
+        encoder.ints = encoder.ints[:-3]
+        with self.assertRaisesRegex(ValueError, "truncated"):
+            decode_state(blob_of(state.STATE_VERSION, encoder.body()))
+        # and the other way around
+        encoder = state._Encoder()
+        state.STATE_SCHEMA.encode(encoder, self.data)
+        encoder.ints.append(0)
+        with self.assertRaisesRegex(ValueError, "trailing"):
+            decode_state(blob_of(state.STATE_VERSION, encoder.body()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+"""Production entry point for the web app, for a wsgi server like gunicorn:
+
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+`gunicorn.conf.py` has the server settings. The app is built here at import time, so with
+`preload_app` on this module is imported once in the parent process before it forks the workers,
+and they all share the already-loaded `bungee`, `cenote` and plotting modules.
+"""
+
+# the plotting deps are imported lazily by the app to keep the dev server quick to start, but when
+# preloading it's better to pay for them once in the parent than once per worker on its first plot
+import bokeh.embed
+import bokeh.resources
+import bokeh.themes
+import pretty_html_table
+
+import bungee
+import cenote
+import plot
+
+import assets
+from app import Webapp
+
+assets.bokeh_theme()
+app = Webapp().app